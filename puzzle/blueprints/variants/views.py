@@ -1,39 +1,57 @@
 # -*- coding: utf-8 -*-
-from flask import (abort, current_app as app, Blueprint, render_template,
-                   request)
+from flask import (abort, current_app as app, Blueprint, flash,
+                   render_template, request)
 
-from puzzle.constants import INHERITANCE_MODELS_SHORT, SO_TERMS, SV_TYPES
+from puzzle.constants import (INHERITANCE_MODELS_SHORT, SO_TERMS, SV_TYPES,
+                              SORT_KEYS)
+from puzzle.utils import parse_region
 
 BP_NAME = __name__.split('.')[-2]
 blueprint = Blueprint(BP_NAME, __name__, url_prefix='/variants',
                       template_folder='templates', static_folder='static',
                       static_url_path="/{}/static".format(BP_NAME))
 
+PAGE_SIZE = 30
+
 
 @blueprint.route('/<case_id>')
 def variants(case_id):
     """Show all variants for a case."""
     filters = parse_filters()
-    variants = app.db.variants(
+    variant_filters = {
+        'gene_ids': filters['gene_symbols'],
+        'frequency': filters.get('frequency'),
+        'cadd': filters.get('cadd'),
+        'sv_len': filters.get('sv_len'),
+        'consequence': filters['selected_consequences'],
+        'genetic_models': filters['selected_models'],
+        'sv_types': filters['selected_sv_types'],
+        'gene_lists': filters['gene_lists'],
+        'region': None if filters['region_error'] else filters['region']
+    }
+    # One extra variant is read to see if there is a next page
+    variants = list(app.db.variants(
         case_id,
         skip=filters['skip'],
-        filters={
-            'gene_ids': filters['gene_symbols'],
-            'frequency': filters.get('frequency'),
-            'cadd': filters.get('cadd'),
-            'sv_len': filters.get('sv_len'),
-            'consequence': filters['selected_consequences'],
-            'genetic_models': filters['selected_models'],
-            'sv_types': filters['selected_sv_types'],
-            'gene_lists': filters['gene_lists']
-        }
-    )
+        count=PAGE_SIZE + 1,
+        filters=dict(variant_filters),
+        sort=filters['sort']
+    ))
+    has_next = len(variants) > PAGE_SIZE
+    variants = variants[:PAGE_SIZE]
+    # The total is only shown if it can be found without reading all variants
+    nr_variants = app.db.quick_count_variants(case_id,
+                                              filters=variant_filters)
+    sort_keys = [(sort_key, sort_label) for sort_key, sort_label in SORT_KEYS
+                 if sort_key in app.db.sort_keys]
     gene_lists = ([gene_list.list_id for gene_list in app.db.gene_lists()]
                   if app.config['STORE_ENABLED'] else [])
     kwargs = dict(variants=variants, case_id=case_id, db=app.db,
                   filters=filters, consequences=SO_TERMS,
                   inheritance_models=INHERITANCE_MODELS_SHORT,
-                  gene_lists=gene_lists)
+                  gene_lists=gene_lists, sort_keys=sort_keys,
+                  nr_variants=nr_variants, has_next=has_next,
+                  page_size=PAGE_SIZE)
     if app.db.variant_type == 'sv':
         return render_template('sv_variants.html', sv_types=SV_TYPES, **kwargs)
     else:
@@ -72,9 +90,24 @@ def parse_filters():
     filters['selected_sv_types'] = request.args.getlist('sv_types')
     filters['skip'] = int(request.args.get('skip', 0))
     filters['gene_lists'] = request.args.getlist('gene_lists')
+    # An invalid region is not used but kept in the form so it can be fixed
+    filters['region'] = request.args.get('region') or None
+    filters['region_error'] = None
+    if filters['region']:
+        try:
+            parse_region(filters['region'])
+        except ValueError as error:
+            filters['region_error'] = str(error)
+            flash("{0}, use chrom:start-end".format(error), 'danger')
+
+    sort = request.args.get('sort')
+    filters['sort'] = sort if sort in dict(SORT_KEYS) else None
 
     filters['query_dict'] = {key: request.args.getlist(key) for key
                              in request.args.keys()}
-    filters['query_dict'].update({'skip': (filters['skip'] + 30)})
+    filters['query_dict'].update({'skip': (filters['skip'] + PAGE_SIZE)})
+    filters['prev_query_dict'] = dict(filters['query_dict'],
+                                      skip=max(filters['skip'] - PAGE_SIZE, 0))
+    filters['first_query_dict'] = dict(filters['query_dict'], skip=0)
 
     return filters
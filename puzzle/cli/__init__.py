@@ -3,4 +3,5 @@ from .utils import (version, family_file, family_type, verbose, root,
 
 from .base import base
 from .store import init
-from .view import view
\ No newline at end of file
+from .view import view
+from .index import index
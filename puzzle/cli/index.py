@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import click
+
+from . import base
+
+try:
+    from puzzle.plugins.gemini.indexes import add_missing_indexes
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+
+@base.command()
+@click.argument('gemini-db',
+    type=click.Path(exists=True)
+)
+@click.pass_context
+def index(ctx, gemini_db):
+    """Add the indexes used by the filters to a gemini database.
+
+        The database is written, stop any puzzle that is viewing it first.
+    """
+    try:
+        added = add_missing_indexes(gemini_db)
+    except NameError:
+        logger.error("Need to have gemini installed to use gemini plugin")
+        ctx.abort()
+
+    if added:
+        logger.info("Added indexes {0}".format(", ".join(added)))
+    else:
+        logger.info("No indexes were added to {0}".format(gemini_db))
@@ -72,14 +72,29 @@ def init(ctx, reset, root):
 @root
 @mode
 @variant_type
+@click.option('--materialize',
+    is_flag=True,
+    help="Store the variants in the database, only for vcf files"
+)
+@click.option('--processes',
+    default=1,
+    show_default=True,
+    help="Number of processes used to parse the vcf files in a directory"
+)
 @click.pass_context
 def load(ctx, variant_source, family_file, family_type, root, mode,
-        variant_type):
+        variant_type, materialize, processes):
     """
     Load a case into the database.
 
     This can be done with a config file or from command line.
     If no database was found run puzzle init first.
+
+    If variant-source is a directory all vcf files in it are loaded, the
+    cases are added in one transaction.
+
+    With --materialize the variants are stored in the database as well and
+    the case is shown from there instead of from the vcf.
     """
     if root is None:
         root = expanduser("~")
@@ -101,6 +116,10 @@ def load(ctx, variant_source, family_file, family_type, root, mode,
 
     logger.debug('Set variant type to {0}'.format(variant_type))
 
+    if materialize and mode != 'vcf':
+        logger.error("Only variants from vcf files can be materialized")
+        ctx.abort()
+
     if mode == 'vcf':
         logger.info("Initialzing VCF plugin")
 
@@ -109,7 +128,8 @@ def load(ctx, variant_source, family_file, family_type, root, mode,
                 root_path=variant_source,
                 case_lines=family_file,
                 case_type=family_type,
-                vtype=variant_type
+                vtype=variant_type,
+                processes=processes
             )
         except SyntaxError as e:
             logger.error(e.message)
@@ -131,6 +151,10 @@ def load(ctx, variant_source, family_file, family_type, root, mode,
     # from gemini can create multiple cases
     store = SqlStore(db_path)
 
+    if not materialize:
+        store.add_cases(plugin.cases(), vtype=variant_type, mode=mode)
+        return
+
     for case_obj in plugin.cases():
         if store.case(case_id=case_obj.case_id).case_id == case_obj.case_id:
             logger.warn("{} already exists in the database"
@@ -139,7 +163,15 @@ def load(ctx, variant_source, family_file, family_type, root, mode,
 
         # extract case information
         logger.debug("adding case: {}".format(case_obj.case_id))
-        store.add_case(case_obj, vtype=variant_type, mode=mode)
+        new_case = store.add_case(case_obj, vtype=variant_type, mode='sql')
+        try:
+            store.add_variants(new_case,
+                               plugin.all_variants(case_obj.case_id))
+        except Exception:
+            logger.error("Could not store the variants of {0}".format(
+                case_obj.case_id))
+            store.delete_case(new_case)
+            raise
 
 @base.command()
 @click.option('-f', '--family_id',
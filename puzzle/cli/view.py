@@ -39,6 +39,19 @@ logger = logging.getLogger(__name__)
     default='*.vcf',
     show_default=True,
 )
+@click.option('--processes',
+    default=1,
+    show_default=True,
+    help="Number of processes used to scan bgzipped vcf files"
+)
+@click.option('--column-cache',
+    is_flag=True,
+    help="Filter variants with a columnar cache, requires numpy"
+)
+@click.option('--carrier-index',
+    is_flag=True,
+    help="Only read the variants carried by a case in gemini databases"
+)
 @family_file
 @family_type
 @version
@@ -46,8 +59,8 @@ logger = logging.getLogger(__name__)
 @mode
 @variant_type
 @click.pass_context
-def view(ctx, host, port, debug, pattern, family_file, family_type,
-         variant_source, variant_type, root, mode):
+def view(ctx, host, port, debug, pattern, processes, column_cache,
+         carrier_index, family_file, family_type, variant_source, variant_type, root, mode):
     """Visualize DNA variant resources.
 
     1. Look for variant source(s) to visualize and inst. the right plugin
@@ -82,7 +95,9 @@ def view(ctx, host, port, debug, pattern, family_file, family_type,
                 case_lines=family_file,
                 case_type=family_type,
                 pattern=pattern,
-                vtype=variant_type
+                vtype=variant_type,
+                processes=processes,
+                column_cache=column_cache
             )
         except SyntaxError as e:
             logger.error(e.message)
@@ -91,7 +106,8 @@ def view(ctx, host, port, debug, pattern, family_file, family_type,
     elif mode == 'gemini':
         logger.info("Initialzing GEMINI plugin")
         try:
-            plugin = GeminiPlugin(db=variant_source, vtype=variant_type)
+            plugin = GeminiPlugin(db=variant_source, vtype=variant_type,
+                                  carrier_index=carrier_index)
         except NameError:
             logger.error("Need to have gemini installed to use gemini plugin")
             ctx.abort()
@@ -108,4 +124,7 @@ def view(ctx, host, port, debug, pattern, family_file, family_type,
 
     app = create_app(config_obj=BaseConfig)
 
-    app.run(host=host, port=port, debug=debug)
+    try:
+        app.run(host=host, port=port, debug=debug)
+    finally:
+        plugin.close()
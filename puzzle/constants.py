@@ -26,6 +26,12 @@ INHERITANCE_MODELS = (
 
 INHERITANCE_MODELS_SHORT = [model[0] for model in INHERITANCE_MODELS]
 
+# Variants can be sorted on these keys, highest first
+SORT_KEYS = (
+    ('rank_score', 'Rank score'),
+    ('cadd_score', 'CADD score'),
+)
+
 SO_TERMS = (
     'transcript_ablation',
     'splice_donor_variant',
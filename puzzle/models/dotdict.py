@@ -18,6 +18,10 @@ class DotDict(dict):
                 self[key] = value
 
     def __getattr__(self, attr):
+        # Special methods are looked up by pickle and copy and must not be
+        # mistaken for missing keys
+        if attr.startswith('__') and attr.endswith('__'):
+            raise AttributeError(attr)
         return self.get(attr)
 
     def __setattr__(self, key, value):
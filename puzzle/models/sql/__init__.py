@@ -1,4 +1,5 @@
 from .models import Case, Individual, BASE
 from .phenotypeterm import PhenotypeTerm
-from .genelist import GeneList, CaseGenelistLink
+from .genelist import GeneList, GeneListMember, CaseGenelistLink
 from .resource import Resource
+from .variant import Variant, Transcript, Genotype
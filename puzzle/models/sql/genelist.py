@@ -18,6 +18,22 @@ class CaseGenelistLink(BASE):
     genelist_id = Column(Integer, ForeignKey('gene_list.id'))
 
 
+class GeneListMember(BASE):
+
+    """A gene in a gene list."""
+
+    __tablename__ = 'gene_list_member'
+    __table_args__ = (UniqueConstraint('genelist_id', 'gene_id',
+                                       name='_genelist_gene_uc'),)
+
+    id = Column(Integer, primary_key=True)
+    genelist_id = Column(Integer, ForeignKey('gene_list.id'), nullable=False)
+    gene_id = Column(String(32), nullable=False)
+
+    def __repr__(self):
+        return "GeneListMember(gene_id={this.gene_id})".format(this=self)
+
+
 class GeneList(BASE):
 
     """Represent a list of gene identifiers."""
@@ -26,20 +42,34 @@ class GeneList(BASE):
 
     id = Column(Integer, primary_key=True)
     list_id = Column(String(32), nullable=False, unique=True)
-    # comma separated list of gene ids
+    # comma separated list of gene ids, only read from databases created
+    # before the genes were stored in gene_list_member
     _gene_ids = Column(String(1024))
 
+    members = relationship('GeneListMember', order_by='GeneListMember.id',
+                           cascade='all, delete-orphan')
     cases = relationship('Case', secondary='case_genelist_link',
                          backref='gene_lists')
 
     @property
     def gene_ids(self):
         """Return a list of gene ids."""
-        return self._gene_ids.split(',') if self._gene_ids else []
+        if self._gene_ids and not self.members:
+            return self._gene_ids.split(',')
+        return [member.gene_id for member in self.members]
 
     @gene_ids.setter
     def gene_ids(self, value):
-        self._gene_ids = ','.join(value)
+        # keep the members of genes that stay in the list, a gene that is
+        # deleted and added again in the same flush breaks the unique key
+        old_members = dict((member.gene_id, member)
+                           for member in self.members)
+        new_members = []
+        for gene_id in unique_gene_ids(value):
+            new_members.append(old_members.get(gene_id) or
+                               GeneListMember(gene_id=gene_id))
+        self.members = new_members
+        self._gene_ids = None
 
     def delete_gene(self, *gene_ids):
         """Delete one or more gene ids form the list."""
@@ -48,3 +78,14 @@ class GeneList(BASE):
 
     def __repr__(self):
         return "PhenotypeTerm(list_id={this.list_id})".format(this=self)
+
+
+def unique_gene_ids(gene_ids):
+    """Return the gene ids without duplicates, in the same order."""
+    seen = set()
+    unique_ids = []
+    for gene_id in gene_ids:
+        if gene_id not in seen:
+            seen.add(gene_id)
+            unique_ids.append(gene_id)
+    return unique_ids
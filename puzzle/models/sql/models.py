@@ -24,7 +24,7 @@ class Case(BASE):
     name = Column(String(32)) # This is the display name
     variant_source = Column(String)
     variant_type = Column(String) # snv or sv
-    variant_mode = Column(String) # vcf or gemini
+    variant_mode = Column(String) # vcf, gemini or sql
     pedigree = Column(String) # For storing madeline info
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
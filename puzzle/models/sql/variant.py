@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import (Column, Float, ForeignKey, Index, Integer, String,
+                        Text)
+
+from .models import BASE
+
+
+class Variant(BASE):
+
+    """A variant of a case that is stored in the database.
+
+    The columns are used to filter and sort the variants, ``data`` holds
+    the variant as it is shown (JSON) without transcripts and genotypes.
+    """
+
+    __tablename__ = 'variant'
+    __table_args__ = (
+        Index('_variant_case_index_idx', 'case_id', 'variant_index'),
+        Index('_variant_case_position_idx', 'case_id', 'chrom', 'start'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    case_id = Column(Integer, ForeignKey('case.id'), nullable=False)
+    # position of the variant in the variant source
+    variant_index = Column(Integer, nullable=False)
+    variant_id = Column(Text, nullable=False)
+
+    chrom = Column(String(32))
+    start = Column(Integer)
+    # last position covered by the variant, used by the region filter
+    end = Column(Integer)
+    sv_type = Column(String(32))
+    # translocations are stored without length
+    sv_len = Column(Float)
+    is_translocation = Column(Integer, default=0)
+
+    max_freq = Column(Float)
+    cadd_score = Column(Float)
+    rank_score = Column(Float)
+    # comma separated with leading and trailing commas, ',AD,AR_hom,'
+    genetic_models = Column(Text)
+    consequences = Column(Text)
+
+    data = Column(Text)
+
+    def __repr__(self):
+        return ("Variant(variant_id={this.variant_id}, "
+                "variant_index={this.variant_index})".format(this=self))
+
+
+class Transcript(BASE):
+
+    """A transcript annotation of a stored variant."""
+
+    __tablename__ = 'transcript'
+    __table_args__ = (
+        Index('_transcript_case_index_idx', 'case_id', 'variant_index'),
+        Index('_transcript_case_symbol_idx', 'case_id', 'hgnc_symbol'),
+        Index('_transcript_case_ensembl_idx', 'case_id', 'ensembl_id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    case_id = Column(Integer, ForeignKey('case.id'), nullable=False)
+    variant_index = Column(Integer, nullable=False)
+
+    hgnc_symbol = Column(String(64))
+    transcript_id = Column(String(64))
+    ensembl_id = Column(String(64))
+    biotype = Column(String(64))
+    consequence = Column(Text)
+    strand = Column(String(8))
+    sift = Column(String(64))
+    polyphen = Column(String(64))
+    exon = Column(String(32))
+    HGVSc = Column(Text)
+    HGVSp = Column(Text)
+
+    def __repr__(self):
+        return "Transcript(transcript_id={this.transcript_id})".format(
+            this=self)
+
+
+class Genotype(BASE):
+
+    """The genotype call of an individual for a stored variant."""
+
+    __tablename__ = 'genotype'
+    __table_args__ = (
+        Index('_genotype_case_index_idx', 'case_id', 'variant_index'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    case_id = Column(Integer, ForeignKey('case.id'), nullable=False)
+    variant_index = Column(Integer, nullable=False)
+
+    sample_id = Column(String(32))
+    case_name = Column(String(32))
+    phenotype = Column(String(32))
+    genotype = Column(String(32))
+    ref_depth = Column(String(32))
+    alt_depth = Column(String(32))
+    genotype_quality = Column(String(32))
+    depth = Column(String(32))
+    supporting_evidence = Column(String(32))
+    pe_support = Column(String(32))
+    sr_support = Column(String(32))
+
+    def __repr__(self):
+        return "Genotype(sample_id={this.sample_id})".format(this=self)
@@ -21,24 +21,50 @@ class Plugin(object):
             can_filter_consequence=False,
             can_filter_gene=False,
             can_filter_inheritance=False,
-            can_filter_sv=False
+            can_filter_sv=False,
+            can_filter_sv_len=False,
+            can_filter_region=False
         )
+        # The keys of puzzle.constants.SORT_KEYS that variants() can sort on
+        self.sort_keys = []
 
     def init_app(self, app):
         """Initialize plugin via Flask."""
         self.root_path = app.config['PUZZLE_ROOT']
         self.pattern = app.config['PUZZLE_PATTERN']
 
+    def close(self):
+        """Release the resources of the plugin."""
+        pass
+
     def cases(self, pattern=None):
         """Return all cases."""
         raise NotImplementedError
 
-    def variants(self, case_id, skip=0, count=30, filters=None):
+    def variants(self, case_id, skip=0, count=30, filters=None, sort=None):
         """Return count variants for a case.
 
+            If sort is given the variants are sorted on that key, highest
+            first. The keys a plugin supports are listed in self.sort_keys.
+        """
+        raise NotImplementedError
+
+    def count_variants(self, case_id, filters=None):
+        """Return the number of variants for a case that follow the filters.
+
+            The filters are the same as for variants(). Implementations
+            should count without formatting the variants.
         """
         raise NotImplementedError
 
+    def quick_count_variants(self, case_id, filters=None):
+        """Return the number of variants if it is cheap to get.
+
+            This is used to show the total in the variant list. None is
+            returned if the variants would have to be read to count them.
+        """
+        return None
+
     def variant(self, variant_id):
         """Return a specific variant."""
         raise NotImplementedError
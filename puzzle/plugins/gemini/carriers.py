@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import sqlite3
+
+import numpy as np
+
+from puzzle.plugins.vcf.index import get_sidecar_path
+
+from .pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+CARRIERS_SUFFIX = '.puzzle.carriers.sqlite3'
+
+# Genotype types in gemini, 0 is HOM_REF and 2 is UNKNOWN
+CARRIER_GT_TYPES = (1, 3)
+
+# Number of variants whose genotypes are checked at once
+CARRIER_BATCH_SIZE = 1000
+
+# Seconds to wait for a concurrent build to release the index
+CARRIER_INDEX_TIMEOUT = 5
+
+SCHEMA = """
+create table if not exists meta (
+    key               text primary key,
+    value             text
+);
+
+create table if not exists carrier (
+    case_id           text not null,
+    variant_id        integer not null,
+    primary key (case_id, variant_id)
+);
+"""
+
+
+def get_gt_type_columns(sample_ids):
+    """Return the gemini columns with the genotype type of each sample
+
+        Gemini only decodes the selected samples of gt_types.<sample>
+        columns, not the whole cohort.
+
+        Args:
+            sample_ids (list(str)): The gemini sample names
+
+        Returns:
+            columns (list(str)): The gt_types.<sample> columns
+    """
+    return ["gt_types.{0}".format(sample_id) for sample_id in sample_ids]
+
+
+def get_carrier_mask(gemini_variants, sample_ids):
+    """Return which variants are carried by any of the samples
+
+        The genotype types of all variants are put into one array so that
+        the samples are checked for all variants at once.
+
+        Args:
+            gemini_variants (list(GeminiQueryRow)): Variants with the
+                                                    gt_types.<sample> columns
+            sample_ids (list(str)): The gemini sample names
+
+        Returns:
+            mask (numpy.ndarray): A boolean array with one value per variant
+    """
+    if not gemini_variants:
+        return np.zeros(0, dtype=bool)
+
+    gt_columns = get_gt_type_columns(sample_ids)
+    gt_types = np.array([[gemini_variant[column] for column in gt_columns]
+                         for gemini_variant in gemini_variants],
+                        dtype=int).reshape(len(gemini_variants),
+                                           len(gt_columns))
+    return np.in1d(gt_types, CARRIER_GT_TYPES).reshape(
+        gt_types.shape).any(axis=1)
+
+
+class CarrierIndex(object):
+    """Persistent table with the variants that each case carries
+
+        A variant is carried by a case if any of its individuals is
+        heterozygous or homozygous alternative. The table is a sqlite
+        database stored next to the gemini database, it is rebuilt when the
+        size or modification time of the gemini database changes.
+
+        The database uses write-ahead logging so that reading the index does
+        not wait for a build. sqlite3.OperationalError is raised if another
+        build holds the index for longer than CARRIER_INDEX_TIMEOUT.
+
+        Args:
+            gemini_db (str): Path to a gemini database
+            index_path (str): Path to the carrier database
+    """
+
+    def __init__(self, gemini_db, index_path=None):
+        super(CarrierIndex, self).__init__()
+        self.gemini_db = gemini_db
+        self.index_path = index_path or get_sidecar_path(gemini_db,
+                                                          CARRIERS_SUFFIX)
+        stat = os.stat(gemini_db)
+        self.signature = "{0}:{1}".format(stat.st_mtime, stat.st_size)
+        self.db = self._connect()
+
+    def _connect(self):
+        """Connect to the index and clear it if the gemini db has changed"""
+        logger.debug("Connecting to carrier index {0}".format(
+            self.index_path))
+        db = sqlite3.connect(self.index_path, timeout=CARRIER_INDEX_TIMEOUT)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            signature = self._get_meta(db, 'signature')
+            if signature != self.signature:
+                if signature:
+                    logger.info("{0} has changed, clearing carrier "
+                                "index".format(self.gemini_db))
+                with db:
+                    db.execute("delete from meta")
+                    db.execute("delete from carrier")
+                    db.execute("insert into meta values ('signature', ?)",
+                               (self.signature,))
+        except sqlite3.Error:
+            db.close()
+            raise
+        return db
+
+    def _get_meta(self, db, key):
+        """Return a value from the meta table"""
+        row = db.execute("select value from meta where key = ?",
+                         (key,)).fetchone()
+        return row[0] if row else None
+
+    def is_built(self, case_id):
+        """Check if the carriers of a case have been indexed"""
+        return self._get_meta(self.db, "built:{0}".format(case_id)) == '1'
+
+    def build(self, case_id, sample_ids):
+        """Index the variants that are carried by a case
+
+            Args:
+                case_id (str): A case id
+                sample_ids (list(str)): The gemini sample names of the
+                                        individuals in the case
+        """
+        logger.info("Indexing carriers of case {0} in {1}".format(
+            case_id, self.gemini_db))
+        with get_pool(self.gemini_db).gemini_query() as gq, self.db:
+            gq.run("SELECT {0} FROM variants".format(", ".join(
+                ['variant_id'] + get_gt_type_columns(sample_ids))))
+            self.db.execute("delete from carrier where case_id = ?",
+                            (case_id,))
+            self.db.executemany(
+                "insert into carrier values (?, ?)",
+                ((case_id, variant_id) for variant_id
+                 in self._get_carriers(gq, sample_ids))
+            )
+            self.db.execute("insert or replace into meta values (?, '1')",
+                            ("built:{0}".format(case_id),))
+
+    def _get_carriers(self, gemini_variants, sample_ids):
+        """Yield the ids of the variants carried by any of the samples"""
+        batch = []
+        for gemini_variant in gemini_variants:
+            batch.append(gemini_variant)
+            if len(batch) >= CARRIER_BATCH_SIZE:
+                for variant_id in self._get_batch_carriers(batch,
+                                                           sample_ids):
+                    yield variant_id
+                batch = []
+        for variant_id in self._get_batch_carriers(batch, sample_ids):
+            yield variant_id
+
+    def _get_batch_carriers(self, batch, sample_ids):
+        """Return the ids of the carried variants in a batch"""
+        mask = get_carrier_mask(batch, sample_ids)
+        return [gemini_variant['variant_id'] for gemini_variant, carried
+                in zip(batch, mask) if carried]
+
+    def close(self):
+        """Close the connection to the index"""
+        self.db.close()
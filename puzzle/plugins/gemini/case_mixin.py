@@ -1,10 +1,11 @@
 import os
 import logging
 
-from gemini import GeminiQuery
 
 from puzzle.models import (Case, Individual)
 
+from .pool import get_pool
+
 
 logger = logging.getLogger(__name__)
 
@@ -108,14 +109,16 @@ class CaseMixin(object):
 
         """
         individuals = []
-        gq = GeminiQuery(self.db)
+        pool = get_pool(self.db)
         #Dictionaru with sample to index in the gemini database
-        sample_to_idx = gq.sample_to_idx
+        sample_to_idx = pool.sample_to_idx
 
         query = "SELECT * from samples"
-        gq.run(query)
+        with pool.gemini_query() as gq:
+            gq.run(query)
+            samples = list(gq)
 
-        for individual in gq:
+        for individual in samples:
             logger.info("Found individual {0} with family id {1}".format(
                 individual['name'], individual['family_id']))
             
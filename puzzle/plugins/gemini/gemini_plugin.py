@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 import logging
 
-from gemini import GeminiQuery
-
 from puzzle.plugins import Plugin
 from . import (CaseMixin, VariantMixin)
+from .indexes import add_missing_indexes, get_missing_indexes
+from .pool import get_pool
 
 logger = logging.getLogger(__name__)
 
@@ -15,18 +15,29 @@ class GeminiPlugin(CaseMixin, VariantMixin, Plugin):
         Args:
             db(str): Path to gemini database
             vtype: Variant type (snv or sv)
+            carrier_index (bool): Only read the variants that are carried
+                                  by a case, using a precomputed table
+            add_indexes (bool): Add the indexes used by the filters to the
+                                database if they are missing, this writes
+                                to the database
 
     """
 
-    def __init__(self, db, vtype='snv'):
+    def __init__(self, db, vtype='snv', carrier_index=False,
+                 add_indexes=False):
         super(GeminiPlugin, self).__init__()
         logger.debug("Setting self.db to {0}".format(db))
         self.db = db
         logger.debug("Setting variant type to {0}".format(vtype))
         self.variant_type = vtype
+        self.carrier_index = carrier_index
 
         logger.info("Check if database is in correct format")
         self.test_gemini_db()
+        if add_indexes:
+            add_missing_indexes(self.db)
+        else:
+            self.check_indexes()
 
         self.individuals = self._get_individuals()
         self.case_objs = self._get_cases(self.individuals)
@@ -35,11 +46,24 @@ class GeminiPlugin(CaseMixin, VariantMixin, Plugin):
         self.filters.can_filter_frequency = True
         self.filters.can_filter_cadd = True
         self.filters.can_filter_consequence = True
+        self.filters.can_filter_region = True
+        self.filters.can_filter_sv = vtype == 'sv'
+        self.filters.can_filter_sv_len = vtype == 'sv'
+        self.sort_keys = ['cadd_score']
 
     def test_gemini_db(self):
         """Check if self.db is a valid gemini database"""
-        gq = GeminiQuery(self.db)
-        return
+        with get_pool(self.db).gemini_query():
+            return
+
+    def check_indexes(self):
+        """Log a hint if the indexes used by the filters are missing"""
+        with get_pool(self.db).connection() as connection:
+            missing = get_missing_indexes(connection)
+        if missing:
+            logger.warning("{0} is missing the indexes {1}, run 'puzzle index "
+                           "{0}' to speed up the filters".format(
+                               self.db, ", ".join(name for name, _ in missing)))
 
     def init_app(self, app):
         """Initialize plugin via Flask."""
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Indexes on the variants table that the filters rely on, as
+# (name, columns). An index is only added if no index starts with the
+# same columns.
+INDEXES = (
+    ('puzzle_chrom_start_idx', ('chrom', 'start', 'end')),
+)
+
+
+def get_missing_indexes(connection):
+    """Return the indexes used by the filters that are missing
+
+        Args:
+            connection (sqlite3.Connection): A connection to a gemini database
+
+        Returns:
+            missing (list(tuple)): The (name, columns) of the missing indexes
+    """
+    existing = get_index_columns(connection, 'variants')
+    return [(name, columns) for name, columns in INDEXES
+            if not any(index_columns[:len(columns)] == columns
+                       for index_columns in existing)]
+
+
+def add_missing_indexes(gemini_db):
+    """Add the indexes used by the region filter if they are missing
+
+        This is the only place where a gemini database is written, it is
+        run with 'puzzle index' or when a plugin is created with
+        add_indexes=True. Adding an index changes the modification time of
+        the database, so pools and carrier indexes are reopened afterwards.
+        If the database can not be written a warning is logged and the
+        filters still work, without the indexes.
+
+        Args:
+            gemini_db (str): Path to a gemini database
+
+        Returns:
+            added (list(str)): The names of the indexes that were added
+    """
+    added = []
+    connection = sqlite3.connect(gemini_db)
+    try:
+        for name, columns in get_missing_indexes(connection):
+            logger.info("Adding index {0} to {1}".format(name, gemini_db))
+            with connection:
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS {0} ON variants ({1})".format(
+                        name, ", ".join('"{0}"'.format(column)
+                                        for column in columns)))
+            added.append(name)
+    except sqlite3.OperationalError as error:
+        logger.warning("Could not add indexes to {0}: {1}".format(
+            gemini_db, error))
+    finally:
+        connection.close()
+    return added
+
+
+def get_index_columns(connection, table):
+    """Return the columns of each index on a table
+
+        Args:
+            connection (sqlite3.Connection): A database connection
+            table (str): The table name
+
+        Returns:
+            index_columns (list(tuple)): The columns of each index, in order
+    """
+    index_columns = []
+    for index_row in connection.execute(
+            "PRAGMA index_list({0})".format(table)).fetchall():
+        columns = connection.execute(
+            "PRAGMA index_info(\"{0}\")".format(index_row[1])).fetchall()
+        index_columns.append(tuple(
+            column[2] for column in sorted(columns)))
+    return index_columns
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    from queue import Queue, Empty, Full
+except ImportError:
+    from Queue import Queue, Empty, Full
+
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url
+
+from gemini import GeminiQuery
+
+logger = logging.getLogger(__name__)
+
+# Number of idle connections and gemini queries kept for each database
+POOL_SIZE = 4
+
+# Applied to every sqlite connection, the databases are only read
+PRAGMAS = (
+    ('mmap_size', 268435456),
+    ('cache_size', -65536),
+    ('temp_store', 'MEMORY'),
+)
+
+# Pools with the absolute path of the database as key
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+
+
+def get_pool(gemini_db):
+    """Return the pool for a gemini database
+
+        The pool is shared by all plugins and threads. A new pool is created
+        if the database has changed since the pool was opened.
+
+        Args:
+            gemini_db (str): Path to a gemini database
+
+        Returns:
+            pool (GeminiPool): The pool of the database
+    """
+    abs_path = os.path.abspath(gemini_db)
+    stat = os.stat(abs_path)
+    signature = (stat.st_mtime, stat.st_size)
+
+    with POOLS_LOCK:
+        pool = POOLS.get(abs_path)
+        if pool is None or pool.signature != signature:
+            if pool is not None:
+                logger.info("{0} has changed, reopening".format(gemini_db))
+                pool.close()
+            pool = GeminiPool(abs_path, signature=signature)
+            POOLS[abs_path] = pool
+    return pool
+
+
+class GeminiPool(object):
+    """Reusable connections to a gemini database
+
+        Connections and gemini queries are borrowed with a with statement
+        and returned to the pool afterwards, so they are never used by two
+        threads at the same time. New ones are opened when all are in use.
+
+        Args:
+            gemini_db (str): Path to a gemini database
+            signature (tuple): Modification time and size of the database
+            size (int): The number of idle connections and queries to keep
+    """
+
+    def __init__(self, gemini_db, signature=None, size=POOL_SIZE):
+        super(GeminiPool, self).__init__()
+        self.gemini_db = gemini_db
+        self.signature = signature
+        self.connections = Queue(maxsize=size)
+        self.gemini_queries = Queue(maxsize=size)
+        self._sample_to_idx = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a sqlite connection to the database
+
+            Writes to temporary tables open a transaction that holds a
+            shared lock on the database, it is rolled back before the
+            connection is returned.
+        """
+        connection = self._borrow(self.connections, self._connect)
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+            self._return(self.connections, connection, connection.close)
+
+    @contextmanager
+    def gemini_query(self):
+        """Borrow a GeminiQuery for the database
+
+            The results of a query have to be read before the next query is
+            run on the same GeminiQuery.
+        """
+        gemini_query = self._borrow(self.gemini_queries,
+                                    lambda: GeminiQuery(self.gemini_db))
+        try:
+            yield gemini_query
+        finally:
+            self._return(self.gemini_queries, gemini_query, lambda: None)
+
+    @property
+    def sample_to_idx(self):
+        """Return the sample name -> genotype index of the database"""
+        with self._lock:
+            if self._sample_to_idx is None:
+                with self.gemini_query() as gq:
+                    self._sample_to_idx = dict(gq.sample_to_idx)
+            return self._sample_to_idx
+
+    def _connect(self):
+        """Open a connection to the database
+
+            The database is opened with a read only URI if sqlite3 supports
+            it. Python 2 does not, there the connection can write to the
+            database. PRAGMA query_only can not be used instead since the
+            gene filter needs a temporary table, puzzle only writes to
+            temporary tables.
+        """
+        logger.debug("Connecting to {0}".format(self.gemini_db))
+        try:
+            connection = sqlite3.connect(
+                "file:{0}?mode=ro".format(pathname2url(
+                    os.path.abspath(self.gemini_db))),
+                uri=True, check_same_thread=False)
+        except TypeError:
+            connection = sqlite3.connect(self.gemini_db,
+                                         check_same_thread=False)
+
+        for pragma, value in PRAGMAS:
+            connection.execute("PRAGMA {0} = {1}".format(pragma, value))
+        return connection
+
+    def _borrow(self, queue, create):
+        """Return an idle item from the queue or a new one"""
+        try:
+            return queue.get_nowait()
+        except Empty:
+            return create()
+
+    def _return(self, queue, item, close):
+        """Put an item back in the queue or close it if the queue is full"""
+        try:
+            queue.put_nowait(item)
+        except Full:
+            close()
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except Empty:
+                break
+        while True:
+            try:
+                self.gemini_queries.get_nowait()
+            except Empty:
+                break
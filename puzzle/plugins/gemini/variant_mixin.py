@@ -1,21 +1,51 @@
 import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
 
-from gemini import GeminiQuery
+import numpy as np
 
 from puzzle.models import (Compound, Variant, Gene, Genotype, Transcript,)
 
 from puzzle.utils import (get_most_severe_consequence, get_omim_number,
-                          get_cytoband_coord, get_gene_info)
+                          get_cytoband_coord, get_gene_info, parse_region)
+
+from .carriers import (CarrierIndex, CARRIER_BATCH_SIZE,
+                       get_carrier_mask, get_gt_type_columns)
+from .pool import get_pool
 
 
 logger = logging.getLogger(__name__)
 
+# Number of variants that are read, and whose transcripts are fetched, in
+# one query
+BATCH_SIZE = 100
+
+# Columns needed for the variants in the variant list, gt_types.<sample> is
+# selected as well when the genotypes of the case are checked
+SUMMARY_COLUMNS = (
+    'variant_id', 'chrom', 'start', 'end', 'rs_ids', 'ref', 'alt', 'qual',
+    'filter', 'impact_so', 'sub_type', 'cadd_scaled', 'polyphen_pred',
+    'sift_pred', 'aaf_1kg_all', 'aaf_exac_all', 'aaf_esp_all', 'max_aaf_all',
+)
+
+# Where the unsorted variant pages of a case and filters start, see
+# _get_checkpoint. The least recently used key is dropped when the cache is
+# full
+CHECKPOINTS = OrderedDict()
+CHECKPOINTS_LOCK = threading.Lock()
+MAX_CHECKPOINT_KEYS = 128
+
 class VariantMixin(object):
     """Class to store variant specific functions for gemini plugin"""
 
-    def variants(self, case_id, skip=0, count=30, filters=None):
+    def variants(self, case_id, skip=0, count=30, filters=None, sort=None):
         """Return count variants for a case.
 
+            The filters are evaluated in SQLite and only the variants that
+            follow them are read with gemini.
+
             Args:
                 case_id (str): A gemini db
                 skip (int): Skip first variants
@@ -28,71 +58,378 @@ class VariantMixin(object):
                     consequence: [] (list of consequences),
                     is_lof: None (Bool),
                     genetic_models [] (list of genetic models)
+                    sv_len: None (float),
+                    sv_types: [] (list of sv types),
+                    region: str (chrom:start-end),
+                    regions: [] (list of chrom:start-end),
                 }
+                sort (str): Sort the variants on 'cadd_score', highest first
 
         """
         filters = filters or {}
         logger.debug("Looking for variants in {0}".format(case_id))
 
         limit = count + skip
+        carrier_index_path = self._get_carrier_index_path(case_id)
+
+        if sort == 'cadd_score':
+            filtered_variants = self._variants(
+                case_id=case_id,
+                variant_ids=self._get_variant_ids(
+                    case_id, filters, sort=sort,
+                    carrier_index_path=carrier_index_path),
+                check_genotypes=carrier_index_path is None
+            )
+
+            for index, variant_obj in enumerate(filtered_variants):
+                if index >= skip:
+                    if index < limit:
+                        yield variant_obj
+                    else:
+                        break
+            return
+
+        if sort:
+            logger.warning("Gemini variants can not be sorted on {0}".format(
+                sort))
+
+        # Continue from the closest page start before skip so that earlier
+        # rows are not read again
+        checkpoint_key = self._get_checkpoint_key(case_id, filters)
+        position, last_variant_id, index = self._get_checkpoint(
+            checkpoint_key, skip)
+
+        filtered_variants = self._variants(
+            case_id=case_id,
+            variant_ids=self._get_variant_ids(
+                case_id, filters, last_variant_id=last_variant_id,
+                carrier_index_path=carrier_index_path),
+            index=index,
+            check_genotypes=carrier_index_path is None
+        )
+
+        previous_variant = None
+        for variant_obj in filtered_variants:
+            if position >= skip:
+                if position == limit - 1 and previous_variant is not None:
+                    # The last variant starts the next page if one extra
+                    # variant was asked for to see if there are more
+                    self._add_checkpoint(checkpoint_key, position,
+                                         previous_variant['variant_id'],
+                                         previous_variant['index'])
+                yield variant_obj
+
+            previous_variant = variant_obj
+            position += 1
+            if position >= limit:
+                self._add_checkpoint(checkpoint_key, position,
+                                     variant_obj['variant_id'],
+                                     variant_obj['index'])
+                break
+
+    def count_variants(self, case_id, filters=None):
+        """Return the number of variants that follow the filters
+
+            With the carrier index the variants are counted with a single
+            SELECT COUNT(*). Otherwise only the genotype types of the case
+            samples are read for the variants that follow the filters, to
+            count the ones carried by the case like variants() does.
+
+            Args:
+                case_id (str): A gemini db
+                filters (dict): A dictionary with filters, see variants()
+
+            Returns:
+                nr_variants (int): The number of variants
+        """
+        filters = filters or {}
+        logger.debug("Counting variants in {0}".format(case_id))
+
+        carrier_index_path = self._get_carrier_index_path(case_id)
+        if carrier_index_path is None:
+            sample_ids = [individual.ind_id for case in self.cases()
+                          if case.name == case_id
+                          for individual in case.individuals]
+            gemini_variants = self._get_gemini_variants(
+                self._get_variant_ids(case_id, filters),
+                columns=['variant_id'] + get_gt_type_columns(sample_ids),
+                batch_size=CARRIER_BATCH_SIZE
+            )
+            return sum(
+                int(get_carrier_mask(batch, sample_ids).sum())
+                for batch in self._get_batches(gemini_variants,
+                                               CARRIER_BATCH_SIZE)
+            )
 
-        gemini_query = "SELECT * from variants"
+        return self._count_carried_variants(case_id, filters,
+                                            carrier_index_path)
 
-        any_filter = False
+    def quick_count_variants(self, case_id, filters=None):
+        """Return the number of variants if the carrier index is used
+
+            Without the carrier index the genotypes would have to be read.
+        """
+        carrier_index_path = self._get_carrier_index_path(case_id)
+        if carrier_index_path is None:
+            return None
+        return self._count_carried_variants(case_id, filters or {},
+                                            carrier_index_path)
+
+    def _count_carried_variants(self, case_id, filters, carrier_index_path):
+        """Count the variants that follow the filters with the carrier index"""
+        with get_pool(self.db).connection() as connection:
+            filter_clauses, args = self._get_filter_clauses(
+                case_id, filters, connection, carrier_index_path)
+            count_query = "SELECT COUNT(*) FROM variants"
+            if filter_clauses:
+                count_query += " WHERE " + " AND ".join(filter_clauses)
+            return connection.execute(count_query, args).fetchone()[0]
+
+    def _get_variant_ids(self, case_id, filters, sort=None,
+                         last_variant_id=0, batch_size=BATCH_SIZE,
+                         carrier_index_path=None):
+        """Yield the ids of the variants that follow the filters
+
+            Unsorted variants are read in order of variant id with one query
+            per batch that starts after the last id of the previous batch.
+
+            Args:
+                case_id (str): The case to get variants for
+                filters (dict): A dictionary with filters
+                sort (str): Sort the variants on 'cadd_score', highest first
+                last_variant_id (int): Start after this variant id, only
+                                       used for unsorted variants
+                batch_size (int): The number of ids read per query
+                carrier_index_path (str): Only select the variants carried
+                                          by the case in this carrier index
+
+            Yields:
+                variant_id (int): The gemini variant ids
+        """
+        with get_pool(self.db).connection() as connection:
+            filter_clauses, args = self._get_filter_clauses(
+                case_id, filters, connection, carrier_index_path)
+
+            if sort == 'cadd_score':
+                query = "SELECT variant_id FROM variants"
+                if filter_clauses:
+                    query += " WHERE " + " AND ".join(filter_clauses)
+                query += " ORDER BY cadd_scaled DESC, variant_id"
+
+                cursor = connection.execute(query, args)
+                rows = cursor.fetchmany(batch_size)
+                while rows:
+                    for row in rows:
+                        yield row[0]
+                    rows = cursor.fetchmany(batch_size)
+                return
+
+            query = ("SELECT variant_id FROM variants WHERE {0} "
+                     "ORDER BY variant_id LIMIT ?".format(" AND ".join(
+                         filter_clauses + ["variant_id > ?"])))
+            while True:
+                rows = connection.execute(
+                    query, args + [int(last_variant_id), batch_size]
+                ).fetchall()
+                for row in rows:
+                    yield row[0]
+
+                if len(rows) < batch_size:
+                    break
+                last_variant_id = rows[-1][0]
+
+    def _get_gemini_variants(self, variant_ids, columns=None,
+                             batch_size=BATCH_SIZE):
+        """Yield the gemini variants with the ids, in the same order
+
+            Args:
+                variant_ids (Iterable(int)): Gemini variant ids
+                columns (list(str)): The columns to select, all if not given
+                batch_size (int): The number of variants read per query
+
+            Yields:
+                gemini_variant (GeminiQueryRow): The gemini variants
+        """
+        select = ", ".join(columns) if columns else "*"
+        for batch in self._get_batches(variant_ids, batch_size):
+            gemini_query = "SELECT {0} from variants WHERE variant_id IN "\
+                           "({1})".format(select, ", ".join(
+                               str(int(variant_id)) for variant_id in batch))
+            with get_pool(self.db).gemini_query() as gq:
+                gq.run(gemini_query)
+                gemini_variants = dict((gemini_variant['variant_id'],
+                                        gemini_variant)
+                                       for gemini_variant in gq)
+            for variant_id in batch:
+                yield gemini_variants[variant_id]
+
+    def _get_filter_clauses(self, case_id, filters, connection,
+                            carrier_index_path=None):
+        """Return the sql conditions for the filters
+
+            Genes are stored in a temporary table on the connection so that
+            any number of genes can be used. Regions are compared on chrom,
+            start and end so that the index from add_missing_indexes is
+            used. If the carrier index is used, only the variants carried by
+            the case are selected.
+
+            Args:
+                case_id (str): The case to get variants for
+                filters (dict): A dictionary with filters
+                connection (sqlite3.Connection): The connection the
+                                                 conditions will be used on
+
+            Returns:
+                (filter_clauses, args): Conditions to join with AND and the
+                values of their parameters
+        """
+        filter_clauses = []
+        args = []
+
+        if carrier_index_path:
+            attached = set(row[1] for row in
+                           connection.execute("PRAGMA database_list"))
+            if 'carriers' not in attached:
+                connection.execute("ATTACH DATABASE ? AS carriers",
+                                   (carrier_index_path,))
+            filter_clauses.append("variant_id IN (SELECT variant_id FROM "
+                                  "carriers.carrier WHERE case_id = ?)")
+            args.append(case_id)
 
         if filters.get('frequency'):
-            frequency = filters['frequency']
-            gemini_query += " WHERE (max_aaf_all < {0} or max_aaf_all is"\
-                            " Null)".format(frequency)
-            any_filter = True
+            filter_clauses.append("(max_aaf_all < ? or max_aaf_all is Null)")
+            args.append(float(filters['frequency']))
 
         if filters.get('cadd'):
-            cadd_score = filters['cadd']
-            if any_filter:
-                gemini_query += " AND (cadd_scaled > {0})".format(cadd_score)
-            else:
-                gemini_query += " WHERE (cadd_scaled > {0})".format(cadd_score)
-            any_filter = True
+            filter_clauses.append("(cadd_scaled > ?)")
+            args.append(float(filters['cadd']))
 
         if filters.get('gene_ids'):
-            gene_list = [gene_id.strip() for gene_id in filters['gene_ids']]
-            gene_string = "("
-            for index, gene_id in enumerate(gene_list):
-                if index == 0:
-                    gene_string += "'{0}'".format(gene_id)
-                else:
-                    gene_string += ", '{0}'".format(gene_id)
-            gene_string += ")"
-
-            if any_filter:
-                gemini_query += " AND gene in " + gene_string
-            else:
-                gemini_query += " WHERE gene in " + gene_string
-
-            any_filter = True
-
-        filtered_variants = self._variants(
-            case_id=case_id,
-            gemini_query=gemini_query
-        )
+            gene_ids = set(gene_id.strip() for gene_id in filters['gene_ids'])
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS gene_filter "
+                               "(gene text primary key)")
+            connection.execute("DELETE FROM temp.gene_filter")
+            connection.executemany("INSERT INTO temp.gene_filter VALUES (?)",
+                                   ((gene_id,) for gene_id in gene_ids))
+            filter_clauses.append("gene IN (SELECT gene FROM temp.gene_filter)")
 
         if filters.get('consequence'):
-            consequences = set(filters['consequence'])
-            cons_variants = []
-            for variant in filtered_variants:
-                for transcript in variant.get('transcripts', []):
-                    if transcript['consequence'] in consequences:
-                        cons_variants.append(variant)
-                        break
+            consequences = sorted(set(filters['consequence']))
+            filter_clauses.append(
+                "EXISTS (SELECT 1 FROM variant_impacts WHERE "
+                "variant_impacts.variant_id = variants.variant_id AND "
+                "variant_impacts.impact_so IN ({0}))".format(
+                    ", ".join("?" for _ in consequences)))
+            args.extend(consequences)
+
+        regions = []
+        if filters.get('region'):
+            regions.append(parse_region(filters['region']))
+        for region in filters.get('regions') or []:
+            regions.append(parse_region(region))
+        if regions:
+            region_clauses = []
+            for chrom, start, end in regions:
+                # Gemini starts are 0-based and ends are 1-based
+                region_clause = 'chrom IN (?, ?) AND "end" >= ?'
+                args.extend(['chr' + chrom, chrom, start])
+                if end is not None:
+                    region_clause += " AND start < ?"
+                    args.append(end)
+                region_clauses.append("(" + region_clause + ")")
+            filter_clauses.append("(" + " OR ".join(region_clauses) + ")")
+
+        # Translocations have infinite length, as in _format_variant
+        if filters.get('sv_len'):
+            filter_clauses.append(
+                "(\"end\" - start >= ? OR alt LIKE '%:%')")
+            args.append(float(filters['sv_len']))
+
+        if filters.get('sv_types'):
+            sv_types = sorted(set(filters['sv_types']))
+            sv_type_clause = "(alt NOT LIKE '%:%' AND sub_type IN ({0}))"\
+                             .format(", ".join("?" for _ in sv_types))
+            args.extend(sv_types)
+            if 'BND' in sv_types:
+                sv_type_clause += " OR alt LIKE '%:%'"
+            filter_clauses.append("(" + sv_type_clause + ")")
+
+        return filter_clauses, args
+
+    def _get_carrier_index_path(self, case_id):
+        """Return the path to the carrier index, built for the case
 
-            filtered_variants = cons_variants
+            Returns:
+                index_path (str): The path or None if the carrier index is
+                not used or is locked by another build, the genotypes are
+                then checked for each variant instead
+        """
+        if not self.carrier_index:
+            return None
+
+        try:
+            carrier_index = CarrierIndex(self.db)
+            try:
+                if not carrier_index.is_built(case_id):
+                    sample_ids = [individual.ind_id for individual
+                                  in self.case(case_id).individuals]
+                    carrier_index.build(case_id, sample_ids)
+            finally:
+                carrier_index.close()
+        except sqlite3.OperationalError as error:
+            logger.warning("Could not use carrier index for {0}, checking "
+                           "genotypes instead: {1}".format(case_id, error))
+            return None
+        return carrier_index.index_path
+
+    def _get_checkpoint_key(self, case_id, filters):
+        """Return the key of the checkpoints for a case and filters
+
+            The modification time of the database is part of the key so that
+            checkpoints are not used after the database has changed.
+        """
+        abs_path = os.path.abspath(self.db)
+        filter_values = []
+        for key in ('frequency', 'cadd', 'gene_ids', 'consequence', 'region',
+                    'regions', 'sv_len', 'sv_types'):
+            value = filters.get(key)
+            if isinstance(value, (list, set, tuple)):
+                value = tuple(sorted(set(value)))
+            filter_values.append(value or None)
+        return (abs_path, os.path.getmtime(abs_path), case_id,
+                bool(self.carrier_index), tuple(filter_values))
+
+    def _get_checkpoint(self, checkpoint_key, skip):
+        """Return the closest checkpoint at or before skip
 
-        for index, variant_obj in enumerate(filtered_variants):
-            if index >= skip:
-                if index < limit:
-                    yield variant_obj
-                else:
-                    break
+            Returns:
+                (position, last_variant_id, index): Where to continue reading
+        """
+        with CHECKPOINTS_LOCK:
+            checkpoints = CHECKPOINTS.pop(checkpoint_key, None)
+            if checkpoints is None:
+                return 0, 0, 0
+            CHECKPOINTS[checkpoint_key] = checkpoints
+            checkpoints = dict(checkpoints)
+
+        positions = [position for position in checkpoints if position <= skip]
+        if not positions:
+            return 0, 0, 0
+
+        position = max(positions)
+        last_variant_id, index = checkpoints[position]
+        logger.debug("Resuming from checkpoint at {0}".format(position))
+        return position, last_variant_id, index
+
+    def _add_checkpoint(self, checkpoint_key, position, last_variant_id,
+                        index):
+        """Store the variant id and index of the variant before a position"""
+        with CHECKPOINTS_LOCK:
+            checkpoints = CHECKPOINTS.pop(checkpoint_key, {})
+            checkpoints[position] = (int(last_variant_id), index)
+            CHECKPOINTS[checkpoint_key] = checkpoints
+            while len(CHECKPOINTS) > MAX_CHECKPOINT_KEYS:
+                CHECKPOINTS.popitem(last=False)
 
     def variant(self, case_id, variant_id):
         """Return a specific variant.
@@ -119,11 +456,11 @@ class VariantMixin(object):
                 for individual in case['individuals']:
                     individuals.append(individual)
 
-        gq = GeminiQuery(self.db)
-
-        gq.run(gemini_query)
+        with get_pool(self.db).gemini_query() as gq:
+            gq.run(gemini_query)
+            gemini_variants = list(gq)
 
-        for gemini_variant in gq:
+        for gemini_variant in gemini_variants:
             variant = self._format_variant(
                 gemini_variant=gemini_variant,
                 individual_objs=individuals,
@@ -137,6 +474,9 @@ class VariantMixin(object):
     def _get_genotypes(self, gemini_variant, individual_objs):
         """Add the genotypes for a variant for all individuals
 
+            The values of the individuals are picked from each genotype
+            array with one index operation.
+
             Args:
                 gemini_variant (GeminiQueryRow): The gemini variant
                 individual_objs (list(dict)): A list of Individuals
@@ -144,18 +484,24 @@ class VariantMixin(object):
             Returns:
                 individuals (list) A list of Genotypes
         """
+        indexes = [ind.index for ind in individual_objs]
+        genotypes = dict(
+            (key, np.asarray(gemini_variant[key])[indexes].tolist())
+            for key in ('gts', 'gt_ref_depths', 'gt_alt_depths', 'gt_depths',
+                        'gt_quals')
+        )
+
         individuals = []
-        for ind in individual_objs:
-            index = ind.index
+        for position, ind in enumerate(individual_objs):
             individuals.append(Genotype(
                 sample_id=ind.ind_id,
-                genotype=gemini_variant['gts'][index],
+                genotype=genotypes['gts'][position],
                 case_id=ind.case_id,
                 phenotype=ind.phenotype,
-                ref_depth=gemini_variant['gt_ref_depths'][index],
-                alt_depth=gemini_variant['gt_alt_depths'][index],
-                depth=gemini_variant['gt_depths'][index],
-                genotype_quality=gemini_variant['gt_quals'][index]
+                ref_depth=genotypes['gt_ref_depths'][position],
+                alt_depth=genotypes['gt_alt_depths'][position],
+                depth=genotypes['gt_depths'][position],
+                genotype_quality=genotypes['gt_quals'][position]
             ))
 
         return individuals
@@ -188,43 +534,66 @@ class VariantMixin(object):
                 transcripts list: List of affected transcripts
 
         """
-        query = "SELECT * from variant_impacts WHERE variant_id = {0}".format(
-            gemini_variant['variant_id']
-        )
-        gq = GeminiQuery(self.db)
-        gq.run(query)
-
-        transcripts = []
-        for transcript in gq:
-            transcripts.append(Transcript(
-                hgnc_symbol = transcript['gene'],
-                transcript_id = transcript['transcript'],
-                consequence=transcript['impact_so'],
-                biotype = transcript['biotype'],
-                polyphen = transcript['polyphen_pred'],
-                sift = transcript['sift_pred'],
-                HGVSc = transcript['codon_change'],
-                HGVSp = transcript['aa_change']
+        batch_transcripts = self._get_batch_transcripts(
+            [gemini_variant['variant_id']])
+        return batch_transcripts.get(gemini_variant['variant_id'], [])
+
+    def _get_batch_transcripts(self, variant_ids):
+        """Return the transcripts for a batch of variants
+
+            The impacts of all variants are fetched with one query.
+
+            Args:
+                variant_ids (list(int)): Gemini variant ids
+
+            Returns:
+                transcripts (dict): Variant id -> list of Transcripts
+        """
+        transcripts = {}
+        if not variant_ids:
+            return transcripts
+
+        query = "SELECT * from variant_impacts WHERE variant_id IN ({0})"\
+                .format(", ".join(str(int(variant_id)) for variant_id
+                                  in variant_ids))
+        with get_pool(self.db).gemini_query() as gq:
+            gq.run(query)
+            impacts = list(gq)
+
+        for transcript in impacts:
+            transcripts.setdefault(transcript['variant_id'], []).append(
+                Transcript(
+                    hgnc_symbol = transcript['gene'],
+                    transcript_id = transcript['transcript'],
+                    consequence=transcript['impact_so'],
+                    biotype = transcript['biotype'],
+                    polyphen = transcript['polyphen_pred'],
+                    sift = transcript['sift_pred'],
+                    HGVSc = transcript['codon_change'],
+                    HGVSp = transcript['aa_change']
                 )
             )
 
         return transcripts
 
-    def _variants(self, case_id, gemini_query):
+    def _variants(self, case_id, variant_ids, index=0, check_genotypes=True):
         """Return variants found in the gemini database
 
+            Only the columns shown in the variant list are read. The variants
+            are read in batches, the genotypes of the case are checked for
+            the whole batch at once and the transcripts of a batch are
+            fetched with one query.
+
             Args:
                 case_id (str): The case for which we want to see information
-                gemini_query (str): What variants should be chosen
+                variant_ids (Iterable(int)): The gemini variant ids
+                index (int): The index of the variant before the first one
+                check_genotypes (bool): If the variants carried by the case
+                                        have not been selected already
 
             Yields:
                 variant_obj (dict): A Variant formatted doctionary
         """
-
-        gq = GeminiQuery(self.db)
-
-        gq.run(gemini_query)
-
         individuals = []
         # Get the individuals for the case
         for case in self.cases():
@@ -232,29 +601,59 @@ class VariantMixin(object):
                 for individual in case.individuals:
                     individuals.append(individual)
 
-        indexes = [individual.index for individual in individuals]
-
-        index = 0
-        for gemini_variant in gq:
-            # Check if variant is non ref in the individuals
-            if self._is_variant(gemini_variant, indexes):
+        columns = list(SUMMARY_COLUMNS)
+        sample_ids = [individual.ind_id for individual in individuals]
+        # Check if variant is non ref in the individuals, this is already
+        # done by the query if the carrier index is used
+        if check_genotypes:
+            columns.extend(get_gt_type_columns(sample_ids))
+
+        gemini_variants = self._get_gemini_variants(variant_ids, columns)
+        for batch in self._get_batches(gemini_variants, BATCH_SIZE):
+            if check_genotypes:
+                carrier_mask = get_carrier_mask(batch, sample_ids)
+                batch = [gemini_variant for gemini_variant, carried
+                         in zip(batch, carrier_mask) if carried]
+            batch_transcripts = self._get_batch_transcripts(
+                [gemini_variant['variant_id'] for gemini_variant in batch])
+
+            for gemini_variant in batch:
                 index += 1
                 logger.debug("Updating index to: {0}".format(index))
 
                 variant = self._format_variant(
                     gemini_variant=gemini_variant,
                     individual_objs=individuals,
-                    index=index
+                    index=index,
+                    transcripts=batch_transcripts.get(
+                        gemini_variant['variant_id'], []),
+                    summary=True
                 )
                 yield variant
 
-    def _format_variant(self, gemini_variant, individual_objs, index=0):
+    def _get_batches(self, items, batch_size):
+        """Yield lists with up to batch_size items"""
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _format_variant(self, gemini_variant, individual_objs, index=0,
+                        transcripts=None, summary=False):
         """Make a puzzle variant from a gemini variant
 
             Args:
                 gemini_variant (GeminiQueryRow): The gemini variant
                 individual_objs (list(dict)): A list of Individuals
                 index(int): The index of the variant
+                transcripts (list(Transcript)): The transcripts of the
+                    variant, they are fetched from the database if not given
+                summary (bool): Leave out the genotypes, the variant only
+                    needs the columns in SUMMARY_COLUMNS
 
             Returns:
                 variant (dict): A Variant object
@@ -275,16 +674,20 @@ class VariantMixin(object):
         # Use the gemini id for fast search
         variant.update_variant_id(gemini_variant['variant_id'])
         # Update the individuals
-        individual_genotypes = self._get_genotypes(
-            gemini_variant=gemini_variant,
-            individual_objs=individual_objs
-            )
+        if not summary:
+            individual_genotypes = self._get_genotypes(
+                gemini_variant=gemini_variant,
+                individual_objs=individual_objs
+                )
+
+            for individual in individual_genotypes:
+                # Add the genotype calls to the variant
+                variant.add_individual(individual)
 
-        for individual in individual_genotypes:
-            # Add the genotype calls to the variant
-            variant.add_individual(individual)
+        if transcripts is None:
+            transcripts = self._get_transcripts(gemini_variant)
 
-        for transcript in self._get_transcripts(gemini_variant):
+        for transcript in transcripts:
             variant.add_transcript(transcript)
 
         #Add the most severe consequence
@@ -361,21 +764,3 @@ class VariantMixin(object):
             variant.set_max_freq(max_freq)
 
         return variant
-
-
-    def _is_variant(self, gemini_variant, indexes):
-        """Check if the variants is a variation in any of the individuals
-
-            Args:
-                gemini_variant (GeminiQueryRow): The gemini variant
-                indexes (list(int)): A list of indexes for the individuals
-
-            Returns:
-                bool : If any of the individuals has the variant
-        """
-
-        for index in indexes:
-            if gemini_variant['gts'][index] != 0:
-                return True
-
-        return False
@@ -3,28 +3,52 @@
 puzzle.plugins.sql.store
 ~~~~~~~~~~~~~~~~~~
 """
-import itertools
+import copy
 import logging
 import os
+import threading
+from collections import OrderedDict
 
 import phizz
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy.sql.expression import ClauseElement
+from sqlalchemy.orm import defer, scoped_session, selectinload, sessionmaker
+from sqlalchemy.sql.expression import ClauseElement, select
 
 from puzzle.models import Case as BaseCase
 from puzzle.models import Individual as BaseIndividual
 from puzzle.models.sql import (BASE, Case, Individual, PhenotypeTerm, GeneList,
-                               CaseGenelistLink, Resource)
+                               GeneListMember, CaseGenelistLink, Resource,
+                               Variant, Transcript, Genotype)
+from puzzle.models.sql.genelist import unique_gene_ids
 from puzzle.plugins import VcfPlugin, Plugin
 try:
     from puzzle.plugins import GeminiPlugin
 except ImportError as e:
     pass
+from .variants import SqlVariantPlugin, get_variant_rows, INSERT_BATCH_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Number of initialized plugins kept by a store, see select_plugin
+MAX_CACHED_PLUGINS = 32
+
+# Applied to every sqlite connection. With WAL the web app can read while
+# cases are loaded.
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 268435456),
+    ('cache_size', -65536),
+)
+
+# Number of cases looked up and inserted per statement, see add_cases
+CASE_ID_BATCH_SIZE = 500
+
+# Connection pool of MySQL and PostgreSQL engines
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+
 
 class Store(Plugin):
 
@@ -35,19 +59,26 @@ class Store(Plugin):
     Args:
         uri (Optional[str]): path/URI to the database to connect to
         debug (Optional[bool]): whether to output logging information
+        max_plugins (Optional[int]): number of initialized plugins to keep
+        connect_options: engine tuning passed on to ``connect``
     Attributes:
         uri (str): path/URI to the database to connect to
         engine (class): SQLAlchemy engine, defines what database to use
         session (class): SQLAlchemy ORM session, manages persistance
         query (method): SQLAlchemy ORM query builder method
         classes (dict): bound ORM classes
+        plugins (OrderedDict): initialized plugins, least recently used first
     """
 
-    def __init__(self, uri=None, debug=False, vtype='snv'):
+    def __init__(self, uri=None, debug=False, vtype='snv',
+                 max_plugins=MAX_CACHED_PLUGINS, **connect_options):
         super(Store, self).__init__()
         self.uri = uri
+        self.max_plugins = max_plugins
+        self.plugins = OrderedDict()
+        self._plugins_lock = threading.Lock()
         if uri:
-            self.connect(uri, debug=debug)
+            self.connect(uri, debug=debug, **connect_options)
         self.variant_type = vtype
 
         # ORM class shortcuts to enable fetching models dynamically
@@ -57,23 +88,45 @@ class Store(Plugin):
     def init_app(self, app):
         pass
 
-    def connect(self, db_uri, debug=False):
+    def connect(self, db_uri, debug=False, sqlite_pragmas=SQLITE_PRAGMAS,
+                pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                pool_pre_ping=True):
         """Configure connection to a SQL database.
 
+        Sqlite connections are set up with ``sqlite_pragmas``, by default WAL
+        journal mode so that readers are not blocked by a writer. Other
+        databases use a connection pool that checks connections before
+        they are used.
+
         Args:
             db_uri (str): path/URI to the database to connect to
             debug (Optional[bool]): whether to output logging information
+            sqlite_pragmas (Optional[tuple]): (pragma, value) pairs set on
+                each sqlite connection
+            pool_size (Optional[int]): connections kept open, not sqlite
+            max_overflow (Optional[int]): connections opened on top of
+                pool_size when all are in use, not sqlite
+            pool_pre_ping (Optional[bool]): test connections before use,
+                not sqlite
         """
         kwargs = {'echo': debug, 'convert_unicode': True}
         # connect to the SQL database
-        if 'mysql' in db_uri:
-            kwargs['pool_recycle'] = 3600
-        elif '://' not in db_uri:
+        if '://' not in db_uri:
             logger.debug("detected sqlite path URI: {}".format(db_uri))
             db_path = os.path.abspath(os.path.expanduser(db_uri))
             db_uri = "sqlite:///{}".format(db_path)
 
+        is_sqlite = db_uri.startswith('sqlite')
+        if not is_sqlite:
+            kwargs['pool_size'] = pool_size
+            kwargs['max_overflow'] = max_overflow
+            kwargs['pool_pre_ping'] = pool_pre_ping
+        if 'mysql' in db_uri:
+            kwargs['pool_recycle'] = 3600
+
         self.engine = create_engine(db_uri, **kwargs)
+        if is_sqlite and sqlite_pragmas:
+            self._add_sqlite_pragmas(self.engine, sqlite_pragmas)
         logger.debug('connection established successfully')
         # make sure the same engine is propagated to the BASE classes
         BASE.metadata.bind = self.engine
@@ -83,6 +136,15 @@ class Store(Plugin):
         self.query = self.session.query
         return self
 
+    def _add_sqlite_pragmas(self, engine, pragmas):
+        """Set the pragmas on every new connection of a sqlite engine."""
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma, value in pragmas:
+                cursor.execute("PRAGMA {0} = {1}".format(pragma, value))
+            cursor.close()
+
     @property
     def dialect(self):
         """Return database dialect name used for the current connection.
@@ -131,15 +193,86 @@ class Store(Plugin):
         Args:
             case_obj (puzzle.models.Case): initialized case model
         """
-        new_case = Case(case_id=case_obj['case_id'],
-                        name=case_obj['name'],
-                        variant_source=case_obj['variant_source'],
-                        variant_type=vtype,
-                        variant_mode=mode,
-                        pedigree=ped_svg)
+        new_case = self._build_case(case_obj, vtype=vtype, mode=mode,
+                                    ped_svg=ped_svg)
+        self.session.add(new_case)
+        self.save()
+        return new_case
 
-        # build individuals
-        inds = [Individual(
+    def add_cases(self, case_objs, vtype='snv', mode='vcf'):
+        """Load many cases with individuals in one transaction.
+
+        Cases whose case id is already in the database are skipped. The
+        existing case ids are looked up, and the cases and individuals are
+        inserted, with one statement per CASE_ID_BATCH_SIZE cases.
+
+        Args:
+            case_objs (Iterable): initialized case models
+            vtype (Optional[str]): 'snv' or 'sv'
+            mode (Optional[str]): the variant mode of the cases
+
+        Returns:
+            list: the case ids of the new cases
+        """
+        case_objs = list(case_objs)
+        case_table = Case.__table__
+
+        # make sure that the session does not hold an open transaction
+        self.session.commit()
+        with self.engine.begin() as connection:
+            existing_ids = set()
+            for batch in self._get_batches(case_objs):
+                existing_ids.update(case_id for case_id, in connection.execute(
+                    select([case_table.c.case_id]).where(
+                        case_table.c.case_id.in_(
+                            [case_obj['case_id'] for case_obj in batch]))))
+
+            new_cases = []
+            for case_obj in case_objs:
+                if case_obj['case_id'] in existing_ids:
+                    logger.warning("{} already exists in the database"
+                                   .format(case_obj['case_id']))
+                    continue
+                # the same case id can be found twice in the new cases
+                existing_ids.add(case_obj['case_id'])
+                new_cases.append(case_obj)
+
+            for batch in self._get_batches(new_cases):
+                connection.execute(case_table.insert(), [
+                    {'case_id': case_obj['case_id'],
+                     'name': case_obj['name'],
+                     'variant_source': case_obj['variant_source'],
+                     'variant_type': vtype,
+                     'variant_mode': mode}
+                    for case_obj in batch
+                ])
+                case_pks = dict(
+                    (case_id, case_pk) for case_id, case_pk in
+                    connection.execute(
+                        select([case_table.c.case_id, case_table.c.id])
+                        .where(case_table.c.case_id.in_(
+                            [case_obj['case_id'] for case_obj in batch]))))
+
+                ind_rows = [
+                    dict(self._get_individual_values(ind),
+                         case_id=case_pks[case_obj['case_id']])
+                    for case_obj in batch for ind in case_obj['individuals']
+                ]
+                if ind_rows:
+                    connection.execute(Individual.__table__.insert(),
+                                       ind_rows)
+
+        logger.info("Added {0} cases".format(len(new_cases)))
+        return [case_obj['case_id'] for case_obj in new_cases]
+
+    def _get_batches(self, items):
+        """Yield lists with up to CASE_ID_BATCH_SIZE items."""
+        for start in range(0, len(items), CASE_ID_BATCH_SIZE):
+            yield items[start:start + CASE_ID_BATCH_SIZE]
+
+    def _get_individual_values(self, ind):
+        """Return the column values of a database individual."""
+        return dict(
             ind_id=ind['ind_id'],
             mother=ind['mother'],
             father=ind['father'],
@@ -148,11 +281,22 @@ class Store(Plugin):
             ind_index=ind['index'],
             variant_source=ind['variant_source'],
             bam_path=ind['bam_path'],
-        ) for ind in case_obj['individuals']]
+        )
+
+    def _build_case(self, case_obj, vtype='snv', mode='vcf', ped_svg=None):
+        """Return a database case with individuals for a case model."""
+        new_case = Case(case_id=case_obj['case_id'],
+                        name=case_obj['name'],
+                        variant_source=case_obj['variant_source'],
+                        variant_type=vtype,
+                        variant_mode=mode,
+                        pedigree=ped_svg)
+
+        # build individuals
+        inds = [Individual(**self._get_individual_values(ind))
+                for ind in case_obj['individuals']]
 
         new_case.individuals = inds
-        self.session.add(new_case)
-        self.save()
         return new_case
 
     def delete_case(self, case_obj):
@@ -163,11 +307,58 @@ class Store(Plugin):
         """
         for ind_obj in case_obj.individuals:
             self.delete_individual(ind_obj)
+        self.clear_plugins(case_obj.case_id)
+        for model in (Variant, Transcript, Genotype):
+            self.query(model).filter(model.case_id == case_obj.id).delete(
+                synchronize_session=False)
         logger.info("Deleting case {0} from database".format(case_obj.case_id))
         self.session.delete(case_obj)
         self.save()
         return case_obj
 
+    def add_variants(self, case_obj, variant_objs,
+                     batch_size=INSERT_BATCH_SIZE):
+        """Store the variants of a case, for variant mode 'sql'.
+
+        The rows are inserted with batched executemany statements in one
+        transaction, so a failed load leaves no variants behind.
+
+        Args:
+            case_obj (puzzle.models.sql.Case): the case in the database
+            variant_objs (Iterable): variants with transcripts and genotypes,
+                                     see VcfPlugin.all_variants
+            batch_size (Optional[int]): number of rows per insert
+
+        Returns:
+            int: the number of stored variants
+        """
+        tables = (Variant.__table__, Transcript.__table__,
+                  Genotype.__table__)
+        nr_variants = 0
+        with self.engine.begin() as connection:
+            batches = ([], [], [])
+            for variant_obj in variant_objs:
+                rows = get_variant_rows(case_obj.id, variant_obj)
+                batches[0].append(rows[0])
+                batches[1].extend(rows[1])
+                batches[2].extend(rows[2])
+                nr_variants += 1
+
+                if len(batches[0]) >= batch_size:
+                    self._insert_batches(connection, tables, batches)
+            self._insert_batches(connection, tables, batches)
+
+        logger.info("Stored {0} variants for case {1}".format(
+            nr_variants, case_obj.case_id))
+        return nr_variants
+
+    def _insert_batches(self, connection, tables, batches):
+        """Insert and empty the batches of rows, one per table."""
+        for table, batch in zip(tables, batches):
+            if batch:
+                connection.execute(table.insert(), batch)
+                del batch[:]
+
     def delete_individual(self, ind_obj):
         """Delete a case from the database
 
@@ -179,9 +370,22 @@ class Store(Plugin):
         self.save()
         return ind_obj
 
+    def _case_load_options(self):
+        """Return loader options that fetch the relations of cases.
+
+        The individuals with their phenotypes and resources and the gene
+        lists of all cases are read with one query each, instead of one
+        query per case and individual.
+        """
+        individuals = selectinload('individuals')
+        return [individuals.selectinload('phenotypes'),
+                individuals.selectinload('resources'),
+                selectinload('gene_lists')]
+
     def case(self, case_id):
         """Fetch a case from the database."""
-        case_obj = self.query(Case).filter_by(case_id=case_id).first()
+        case_obj = (self.query(Case).options(*self._case_load_options())
+                                    .filter_by(case_id=case_id).first())
         if case_obj is None:
             case_obj = BaseCase(case_id='unknown')
         return case_obj
@@ -194,35 +398,60 @@ class Store(Plugin):
         return ind_obj
 
     def cases(self):
-        """Fetch all cases from the database."""
-        return self.query(Case)
+        """Fetch all cases from the database.
+
+        The pedigree is only read if it is used.
+        """
+        return self.query(Case).options(defer('pedigree'),
+                                        *self._case_load_options())
 
     def get_individuals(self, ind_ids=None):
         """Fetch all individuals from the database."""
-        query = self.query(Individual)
+        query = self.query(Individual).options(
+            selectinload('case'), selectinload('phenotypes'),
+            selectinload('resources'))
         if ind_ids:
             query = query.filter(Individual.ind_id.in_(ind_ids))
         return query
 
-    def variants(self, case_id, skip=0, count=30, filters=None):
+    def variants(self, case_id, skip=0, count=30, filters=None, sort=None):
         """Fetch variants for a case."""
         filters = filters or {}
         logger.debug("Fetching case with case_id:{0}".format(case_id))
         case_obj = self.case(case_id)
         plugin, case_id = self.select_plugin(case_obj)
         self.filters = plugin.filters
+        self.sort_keys = plugin.sort_keys
+        filters = self._add_gene_list_ids(filters)
+        variants = plugin.variants(case_id, skip, count, filters, sort=sort)
+        return variants
 
-        gene_lists = (self.gene_list(list_id) for list_id
-                      in filters.get('gene_lists', []))
-        nested_geneids = (gene_list.gene_ids for gene_list in gene_lists)
-        gene_ids = set(itertools.chain.from_iterable(nested_geneids))
+    def count_variants(self, case_id, filters=None):
+        """Count the variants for a case that follow the filters."""
+        filters = filters or {}
+        case_obj = self.case(case_id)
+        plugin, case_id = self.select_plugin(case_obj)
+        filters = self._add_gene_list_ids(filters)
+        return plugin.count_variants(case_id, filters)
+
+    def quick_count_variants(self, case_id, filters=None):
+        """Count the variants for a case if the plugin can do it cheaply."""
+        filters = filters or {}
+        case_obj = self.case(case_id)
+        plugin, case_id = self.select_plugin(case_obj)
+        filters = self._add_gene_list_ids(filters)
+        return plugin.quick_count_variants(case_id, filters)
+
+    def _add_gene_list_ids(self, filters):
+        """Return a copy of the filters with the genes of the gene lists."""
+        gene_ids = self.genelist_gene_ids(filters.get('gene_lists', []))
 
+        filters = dict(filters)
         if filters.get('gene_ids'):
-            filters['gene_ids'].extend(gene_ids)
+            filters['gene_ids'] = list(filters['gene_ids']) + list(gene_ids)
         else:
             filters['gene_ids'] = gene_ids
-        variants = plugin.variants(case_id, skip, count, filters)
-        return variants
+        return filters
 
     def variant(self, case_id, variant_id):
         """Fetch a single variant from variant source."""
@@ -277,14 +506,43 @@ class Store(Plugin):
         """Return all gene lists from the database."""
         return self.query(GeneList)
 
+    def genelist_gene_ids(self, list_ids):
+        """Return the set of gene ids in any of the gene lists."""
+        list_ids = list(list_ids)
+        if not list_ids:
+            return set()
+
+        members = (self.query(GeneListMember.gene_id)
+                       .join(GeneList, GeneList.id == GeneListMember.genelist_id)
+                       .filter(GeneList.list_id.in_(list_ids))
+                       .distinct())
+        gene_ids = set(gene_id for gene_id, in members)
+
+        # lists from before the genes were stored in gene_list_member
+        legacy_lists = self.query(GeneList._gene_ids).filter(
+            GeneList.list_id.in_(list_ids),
+            GeneList._gene_ids != None,
+            ~GeneList.members.any()
+        )
+        for legacy_ids, in legacy_lists:
+            gene_ids.update(legacy_ids.split(','))
+        return gene_ids
+
     def add_genelist(self, list_id, gene_ids, case_obj=None):
-        """Create a new gene list and optionally link to cases."""
+        """Create a new gene list and optionally link to cases.
+
+        The genes are inserted with one bulk insert.
+        """
         new_genelist = GeneList(list_id=list_id)
-        new_genelist.gene_ids = gene_ids
         if case_obj:
             new_genelist.cases.append(case_obj)
 
         self.session.add(new_genelist)
+        self.session.flush()
+        members = [{'genelist_id': new_genelist.id, 'gene_id': gene_id}
+                   for gene_id in unique_gene_ids(gene_ids)]
+        if members:
+            self.session.execute(GeneListMember.__table__.insert(), members)
         self.save()
         return new_genelist
 
@@ -298,6 +556,9 @@ class Store(Plugin):
         else:
             # remove all links and the list itself
             case_ids = [case.id for case in gene_list.cases]
+            self.query(GeneListMember).filter_by(
+                genelist_id=gene_list.id).delete(synchronize_session=False)
+            self.session.expire(gene_list, ['members'])
             self.session.delete(gene_list)
 
         case_links = self.query(CaseGenelistLink).filter(
@@ -322,21 +583,67 @@ class Store(Plugin):
         return gene_list
 
     def select_plugin(self, case_obj):
-        """Select and initialize the correct plugin for the case."""
+        """Select and initialize the correct plugin for the case.
+
+            Initialized plugins are kept in an LRU cache with the case id,
+            variant source, modification time of the source and variant
+            type as key, so that the source is only read again if it has
+            changed.
+        """
+        key = self._get_plugin_key(case_obj)
+        with self._plugins_lock:
+            plugin = self.plugins.pop(key, None)
+            if plugin is not None:
+                self.plugins[key] = plugin
+
+        if plugin is None:
+            plugin = self._init_plugin(case_obj)
+            with self._plugins_lock:
+                self.plugins[key] = plugin
+                while len(self.plugins) > self.max_plugins:
+                    self.plugins.popitem(last=False)
+
+        if case_obj.variant_mode == 'vcf':
+            # Use the case of this session, the cached plugin is shared
+            plugin = copy.copy(plugin)
+            plugin.case_objs = [case_obj]
+
+        self.variant_type = case_obj.variant_type
+
+        case_id = case_obj.case_id
+        return plugin, case_id
+
+    def _get_plugin_key(self, case_obj):
+        """Return the key of the plugin of a case in the plugin cache."""
+        try:
+            mtime = os.path.getmtime(case_obj.variant_source)
+        except OSError:
+            mtime = None
+        return (case_obj.case_id, case_obj.variant_mode,
+                case_obj.variant_source, mtime, case_obj.variant_type)
+
+    def _init_plugin(self, case_obj):
+        """Initialize the plugin for the variant mode of the case."""
         if case_obj.variant_mode == 'vcf':
             logger.debug("Using vcf plugin")
             plugin = VcfPlugin(root_path=case_obj.variant_source,
                                vtype=case_obj.variant_type)
-            plugin.case_objs = [case_obj]
         elif case_obj.variant_mode == 'gemini':
             logger.debug("Using gemini plugin")
             plugin = GeminiPlugin(db=case_obj.variant_source,
                                   vtype=case_obj.variant_type)
-
-        self.variant_type = case_obj.variant_type
-
-        case_id = case_obj.case_id
-        return plugin, case_id
+        elif case_obj.variant_mode == 'sql':
+            logger.debug("Using stored variants")
+            plugin = SqlVariantPlugin(store=self,
+                                      vtype=case_obj.variant_type)
+        return plugin
+
+    def clear_plugins(self, case_id=None):
+        """Remove the cached plugins of a case, or of all cases."""
+        with self._plugins_lock:
+            for key in list(self.plugins):
+                if case_id is None or key[0] == case_id:
+                    del self.plugins[key]
 
     def add_resource(self, name, file_path, ind_obj):
         """Link a resource to an individual."""
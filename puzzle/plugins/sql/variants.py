@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+puzzle.plugins.sql.variants
+~~~~~~~~~~~~~~~~~~
+Variants that are stored in the database, variant mode 'sql'.
+"""
+import json
+import logging
+import math
+
+from sqlalchemy import Column, MetaData, String, Table, and_, or_, select
+
+from puzzle.models import DotDict
+from puzzle.models import Genotype as BaseGenotype
+from puzzle.models import Transcript as BaseTranscript
+from puzzle.models import Variant as BaseVariant
+from puzzle.models.sql import Case, Genotype, Transcript, Variant
+from puzzle.plugins import Plugin
+from puzzle.utils import parse_region
+
+logger = logging.getLogger(__name__)
+
+# Number of rows inserted with each executemany
+INSERT_BATCH_SIZE = 1000
+
+# Columns of the sql models that are sorted on, see puzzle.constants
+SORT_COLUMNS = {
+    'rank_score': Variant.rank_score,
+    'cadd_score': Variant.cadd_score,
+}
+
+# Genes of the gene filter, filled for each query so that any number of
+# genes is bound with one parameter per row instead of in one statement
+GENE_FILTER = Table('puzzle_gene_filter', MetaData(),
+                    Column('gene_id', String(64), primary_key=True),
+                    prefixes=['TEMPORARY'])
+
+# Escape character for the LIKE patterns of the term filters
+LIKE_ESCAPE = '\\'
+
+VARIANT_COLUMNS = ('CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER')
+TRANSCRIPT_KEYS = ('hgnc_symbol', 'transcript_id', 'ensembl_id', 'biotype',
+                   'consequence', 'strand', 'sift', 'polyphen', 'exon',
+                   'HGVSc', 'HGVSp')
+GENOTYPE_KEYS = ('sample_id', 'genotype', 'phenotype', 'ref_depth',
+                 'alt_depth', 'genotype_quality', 'depth',
+                 'supporting_evidence', 'pe_support', 'sr_support')
+
+
+def get_variant_rows(case_pk, variant_obj):
+    """Return the rows to store for a formatted variant
+
+        Args:
+            case_pk (int): The database id of the case
+            variant_obj (puzzle.models.Variant): A variant with transcripts
+                                                 and genotypes
+
+        Returns:
+            (variant_row, transcript_rows, genotype_rows): Dicts with the
+            column values of each table
+    """
+    variant_index = variant_obj['index']
+    data = dict((key, value) for key, value in variant_obj.items()
+                if key not in ('transcripts', 'individuals'))
+
+    sv_len = variant_obj.get('sv_len')
+    is_translocation = sv_len is not None and math.isinf(sv_len)
+    start = int(variant_obj['start'])
+    if variant_obj.get('sv_type') and not is_translocation:
+        end = int(variant_obj['stop'])
+    else:
+        end = start + len(variant_obj['REF']) - 1
+
+    consequences = set()
+    for transcript in variant_obj['transcripts']:
+        if transcript.get('consequence'):
+            consequences.update(transcript['consequence'].split('&'))
+
+    variant_row = {
+        'case_id': case_pk,
+        'variant_index': variant_index,
+        'variant_id': variant_obj['variant_id'],
+        'chrom': variant_obj['CHROM'],
+        'start': start,
+        'end': end,
+        'sv_type': variant_obj.get('sv_type'),
+        'sv_len': None if is_translocation else sv_len,
+        'is_translocation': int(is_translocation),
+        'max_freq': variant_obj.get('max_freq'),
+        'cadd_score': variant_obj.get('cadd_score'),
+        'rank_score': variant_obj.get('rank_score'),
+        'genetic_models': _join_terms(variant_obj.get('genetic_models')),
+        'consequences': _join_terms(consequences),
+        'data': json.dumps(data),
+    }
+
+    transcript_rows = []
+    for transcript in variant_obj['transcripts']:
+        transcript_row = dict((key, transcript.get(key))
+                              for key in TRANSCRIPT_KEYS)
+        transcript_row.update(case_id=case_pk, variant_index=variant_index)
+        transcript_rows.append(transcript_row)
+
+    genotype_rows = []
+    for genotype in variant_obj['individuals']:
+        genotype_row = dict((key, genotype.get(key))
+                            for key in GENOTYPE_KEYS)
+        genotype_row.update(case_id=case_pk, variant_index=variant_index,
+                            case_name=genotype.get('case_id'))
+        genotype_rows.append(genotype_row)
+
+    return variant_row, transcript_rows, genotype_rows
+
+
+def _join_terms(terms):
+    """Join terms so that each can be matched with LIKE '%,term,%'"""
+    if not terms:
+        return None
+    return ',{0},'.format(','.join(sorted(set(terms))))
+
+
+def _like_term(term):
+    """Return a LIKE pattern that matches a term joined with _join_terms"""
+    for char in (LIKE_ESCAPE, '%', '_'):
+        term = term.replace(char, LIKE_ESCAPE + char)
+    return '%,{0},%'.format(term)
+
+
+class SqlVariantPlugin(Plugin):
+    """Read the variants of cases that are stored in the database
+
+        The variants are stored with Store.add_variants. Filters, counts
+        and sorting are done with indexed queries.
+
+        Args:
+            store (puzzle.plugins.sql.Store): The store with the variants
+            vtype (str): 'snv' or 'sv'
+    """
+
+    def __init__(self, store, vtype='snv'):
+        super(SqlVariantPlugin, self).__init__()
+        self.store = store
+        self.variant_type = vtype
+
+        self.filters.can_filter_gene = True
+        self.filters.can_filter_frequency = True
+        self.filters.can_filter_cadd = True
+        self.filters.can_filter_consequence = True
+        self.filters.can_filter_inheritance = True
+        self.filters.can_filter_region = True
+        self.filters.can_filter_sv = vtype == 'sv'
+        self.filters.can_filter_sv_len = vtype == 'sv'
+        self.sort_keys = list(SORT_COLUMNS)
+
+    def variants(self, case_id, skip=0, count=30, filters=None, sort=None):
+        """Return count variants for a case.
+
+            The variants hold the information shown in the variant list,
+            use variant() to get the genotypes and transcripts.
+
+            Args:
+                case_id (str): The case id
+                skip (int): Skip first variants
+                count (int): The number of variants to return
+                filters (dict): A dictionary with filters, the same as for
+                                the vcf plugin
+                sort (str): Sort the variants on 'rank_score' or
+                            'cadd_score', highest first. The variants are
+                            returned in file order if not given.
+        """
+        query = self._filtered_query(case_id, filters or {})
+
+        sort_column = SORT_COLUMNS.get(sort)
+        if sort and sort_column is None:
+            logger.warning("Stored variants can not be sorted on {0}".format(
+                sort))
+        if sort_column is not None:
+            # variants without a value are placed last, as in sort_page
+            query = query.order_by(sort_column.is_(None), sort_column.desc(),
+                                   Variant.variant_index)
+        else:
+            query = query.order_by(Variant.variant_index)
+
+        query = query.offset(skip)
+        if count != float('inf'):
+            query = query.limit(count)
+
+        for variant_row in query:
+            yield self._get_variant_obj(variant_row)
+
+    def count_variants(self, case_id, filters=None):
+        """Return the number of variants that follow the filters"""
+        return self._filtered_query(case_id, filters or {}).count()
+
+    def quick_count_variants(self, case_id, filters=None):
+        """Return the number of variants, counted with an indexed query"""
+        return self.count_variants(case_id, filters)
+
+    def variant(self, case_id, variant_id):
+        """Return a specific variant with genotypes and transcripts.
+
+            Args:
+                case_id (str): The case id
+                variant_id (str): A variant id
+
+            Returns:
+                variant (Variant): The variant object for the given id
+        """
+        case_pk = self._get_case_pk(case_id)
+        chrom, pos = variant_id.split('_')[:2]
+        candidates = self.store.query(Variant).filter(
+            Variant.case_id == case_pk,
+            Variant.chrom == chrom,
+            Variant.start == int(pos)
+        )
+        for variant_row in candidates:
+            if variant_row.variant_id != variant_id:
+                continue
+
+            variant_obj = self._get_variant_obj(variant_row)
+            transcripts = self.store.query(Transcript).filter_by(
+                case_id=case_pk, variant_index=variant_row.variant_index
+            ).order_by(Transcript.id)
+            for transcript in transcripts:
+                variant_obj.add_transcript(BaseTranscript(**dict(
+                    (key, getattr(transcript, key))
+                    for key in TRANSCRIPT_KEYS)))
+
+            genotypes = self.store.query(Genotype).filter_by(
+                case_id=case_pk, variant_index=variant_row.variant_index
+            ).order_by(Genotype.id)
+            for genotype in genotypes:
+                genotype_obj = BaseGenotype(**dict(
+                    (key, getattr(genotype, key)) for key in GENOTYPE_KEYS))
+                genotype_obj['case_id'] = genotype.case_name
+                variant_obj.add_individual(genotype_obj)
+            return variant_obj
+        return None
+
+    def _get_case_pk(self, case_id):
+        """Return the database id of a case"""
+        case_pk = self.store.query(Case.id).filter_by(case_id=case_id).scalar()
+        if case_pk is None:
+            raise ValueError("Unknown case {0}".format(case_id))
+        return case_pk
+
+    def _filtered_query(self, case_id, filters):
+        """Return a query with the variants of a case that follow the filters
+
+            Args:
+                case_id (str): The case id
+                filters (dict): A dictionary with filters
+
+            Returns:
+                query (sqlalchemy.orm.Query): A query on Variant
+        """
+        case_pk = self._get_case_pk(case_id)
+        query = self.store.query(Variant).filter(Variant.case_id == case_pk)
+
+        if filters.get('frequency'):
+            query = query.filter(or_(
+                Variant.max_freq.is_(None),
+                Variant.max_freq <= float(filters['frequency'])
+            ))
+
+        if filters.get('cadd'):
+            query = query.filter(Variant.cadd_score >= float(filters['cadd']))
+
+        if filters.get('sv_len'):
+            query = query.filter(or_(
+                Variant.sv_len >= float(filters['sv_len']),
+                Variant.is_translocation == 1
+            ))
+
+        if filters.get('sv_types'):
+            query = query.filter(Variant.sv_type.in_(
+                list(filters['sv_types'])))
+
+        if filters.get('genetic_models'):
+            query = query.filter(or_(*[
+                Variant.genetic_models.like(_like_term(model),
+                                            escape=LIKE_ESCAPE)
+                for model in filters['genetic_models']
+            ]))
+
+        if filters.get('consequence'):
+            query = query.filter(or_(*[
+                Variant.consequences.like(_like_term(consequence),
+                                          escape=LIKE_ESCAPE)
+                for consequence in filters['consequence']
+            ]))
+
+        if filters.get('gene_ids'):
+            self._set_gene_filter(filters['gene_ids'])
+            gene_ids = select([GENE_FILTER.c.gene_id])
+            gene_variants = self.store.query(Transcript.variant_index).filter(
+                Transcript.case_id == case_pk,
+                or_(Transcript.hgnc_symbol.in_(gene_ids),
+                    Transcript.ensembl_id.in_(gene_ids))
+            )
+            query = query.filter(Variant.variant_index.in_(
+                gene_variants.subquery()))
+
+        regions = []
+        if filters.get('region'):
+            regions.append(parse_region(filters['region']))
+        for region in filters.get('regions') or []:
+            regions.append(parse_region(region))
+        if regions:
+            region_clauses = []
+            for chrom, start, end in regions:
+                region_clause = and_(Variant.chrom == chrom,
+                                     Variant.end >= start)
+                if end is not None:
+                    region_clause = and_(region_clause, Variant.start <= end)
+                region_clauses.append(region_clause)
+            query = query.filter(or_(*region_clauses))
+
+        return query
+
+    def _set_gene_filter(self, gene_ids):
+        """Store the genes of the gene filter in a temporary table
+
+            The table belongs to the connection of the session, the query
+            that uses it has to run in the same transaction.
+
+            Args:
+                gene_ids (list(str)): Gene symbols or ensembl ids
+        """
+        connection = self.store.session.connection()
+        GENE_FILTER.create(connection, checkfirst=True)
+        connection.execute(GENE_FILTER.delete())
+        connection.execute(GENE_FILTER.insert(), [
+            {'gene_id': gene_id} for gene_id in
+            set(gene_id.strip() for gene_id in gene_ids)
+        ])
+
+    def _get_variant_obj(self, variant_row):
+        """Return the variant object of a stored variant"""
+        data = json.loads(variant_row.data)
+        variant_obj = BaseVariant(**dict((column, data.get(column))
+                                         for column in VARIANT_COLUMNS))
+        for key, value in data.items():
+            if isinstance(value, list):
+                value = [DotDict(item) if isinstance(item, dict) else item
+                         for item in value]
+            variant_obj[str(key)] = value
+        variant_obj['transcripts'] = []
+        variant_obj['individuals'] = []
+        return variant_obj
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import tempfile
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from puzzle.constants import INHERITANCE_MODELS_SHORT, SO_TERMS
+from puzzle.utils import get_seekable_handle, parse_region
+
+from .index import get_sidecar_path
+from .raw_variant import get_annotation_columns, parse_raw_variant
+
+logger = logging.getLogger(__name__)
+
+COLUMNS_SUFFIX = '.puzzle.npz'
+
+# Loaded caches with the absolute path of the vcf as key
+COLUMN_CACHES = {}
+COLUMN_CACHES_LOCK = threading.Lock()
+
+CONSEQUENCE_BITS = dict((term, bit) for bit, term in enumerate(SO_TERMS))
+GENETIC_MODEL_BITS = dict((model, bit) for bit, model in
+                          enumerate(INHERITANCE_MODELS_SHORT))
+
+
+def get_column_cache(vcf_file_path, head, variant_type='snv'):
+    """Return the column cache for a vcf
+
+        The cache is loaded from disk, or built if it is missing or if the
+        vcf has changed.
+
+        Args:
+            vcf_file_path (str): Path to a vcf file
+            head (vcftoolbox.HeaderParser): The parsed header of the vcf
+            variant_type (str): 'snv' or 'sv'
+
+        Returns:
+            column_cache (ColumnCache): The cache or None if numpy is not
+            installed or the vcf can not be read with random access
+    """
+    if np is None:
+        return None
+
+    abs_path = os.path.abspath(vcf_file_path)
+    column_cache = ColumnCache(vcf_file_path, variant_type=variant_type)
+
+    with COLUMN_CACHES_LOCK:
+        cached = COLUMN_CACHES.get(abs_path)
+        if cached and cached.signature == column_cache.signature:
+            return cached
+
+        if not (column_cache.load() or column_cache.build(head)):
+            return None
+
+        COLUMN_CACHES[abs_path] = column_cache
+        return column_cache
+
+
+class ColumnCache(object):
+    """Columnar cache with the filterable values of all variants in a vcf
+
+        The values are stored as numpy arrays in a .npz file next to the vcf
+        so that filters can be evaluated without reading the vcf. Only the
+        variants that follow the filters are read and formatted.
+
+        Args:
+            vcf_file_path (str): Path to a vcf file
+            variant_type (str): 'snv' or 'sv'
+            cache_path (str): Path to the .npz file
+    """
+
+    def __init__(self, vcf_file_path, variant_type='snv', cache_path=None):
+        super(ColumnCache, self).__init__()
+        self.vcf_file_path = vcf_file_path
+        self.variant_type = variant_type
+        self.cache_path = cache_path or get_sidecar_path(vcf_file_path,
+                                                         COLUMNS_SUFFIX)
+        stat = os.stat(vcf_file_path)
+        self.signature = "{0}:{1}:{2}".format(
+            stat.st_mtime, stat.st_size, variant_type)
+        self.columns = {}
+
+    def load(self):
+        """Load the cache from disk
+
+            Returns:
+                bool: If a cache for the current vcf was found
+        """
+        if not os.path.exists(self.cache_path):
+            return False
+
+        try:
+            with np.load(self.cache_path) as data:
+                if data['signature'][()] != self.signature:
+                    logger.info("{0} has changed, rebuilding column "
+                                "cache".format(self.vcf_file_path))
+                    return False
+                self.columns = dict((key, data[key]) for key in data.files)
+        except (IOError, ValueError, KeyError) as error:
+            logger.warning("Could not load column cache {0}: {1}".format(
+                self.cache_path, error))
+            return False
+
+        logger.debug("Loaded column cache {0}".format(self.cache_path))
+        return True
+
+    def build(self, head):
+        """Parse the vcf and store the columns
+
+            Args:
+                head (vcftoolbox.HeaderParser): The parsed header of the vcf
+
+            Returns:
+                bool: If the vcf could be read with random access
+        """
+        handle = get_seekable_handle(self.vcf_file_path)
+        if handle is None:
+            return False
+
+        logger.info("Building column cache for {0}".format(
+            self.vcf_file_path))
+        annotation_columns = get_annotation_columns(head)
+
+        values = dict((key, []) for key in (
+            'offset', 'chrom', 'start', 'end', 'max_freq', 'cadd_score',
+            'rank_score', 'sv_len', 'sv_type', 'consequence',
+            'genetic_models', 'gene'))
+        gene_ptr = [0]
+        chrom_codes = {}
+        sv_type_codes = {}
+        gene_codes = {}
+
+        with handle:
+            offset = handle.tell()
+            variant_line = handle.readline()
+            while variant_line:
+                if not variant_line.startswith('#'):
+                    raw_variant = parse_raw_variant(
+                        variant_line, annotation_columns, self.variant_type)
+
+                    values['offset'].append(offset)
+                    values['chrom'].append(chrom_codes.setdefault(
+                        raw_variant['chrom'], len(chrom_codes)))
+                    values['start'].append(raw_variant['start'])
+                    values['end'].append(raw_variant['end'])
+                    for key in ('max_freq', 'cadd_score', 'rank_score',
+                                'sv_len'):
+                        value = raw_variant[key]
+                        values[key].append(
+                            float('nan') if value is None else value)
+
+                    sv_type = raw_variant['sv_type']
+                    values['sv_type'].append(-1 if sv_type is None else
+                        sv_type_codes.setdefault(sv_type, len(sv_type_codes)))
+
+                    values['consequence'].append(_get_bitmask(
+                        raw_variant['consequences'], CONSEQUENCE_BITS))
+                    values['genetic_models'].append(_get_bitmask(
+                        raw_variant['genetic_models'], GENETIC_MODEL_BITS))
+
+                    for gene in raw_variant['genes']:
+                        values['gene'].append(
+                            gene_codes.setdefault(gene, len(gene_codes)))
+                    gene_ptr.append(len(values['gene']))
+
+                offset = handle.tell()
+                variant_line = handle.readline()
+
+        self.columns = {
+            'signature': np.array(self.signature),
+            'offset': np.array(values['offset'], dtype=np.int64),
+            'chrom': np.array(values['chrom'], dtype=np.int32),
+            'chrom_names': _get_names(chrom_codes),
+            'start': np.array(values['start'], dtype=np.int64),
+            'end': np.array(values['end'], dtype=np.int64),
+            'max_freq': np.array(values['max_freq'], dtype=np.float64),
+            'cadd_score': np.array(values['cadd_score'], dtype=np.float64),
+            'rank_score': np.array(values['rank_score'], dtype=np.float64),
+            'sv_len': np.array(values['sv_len'], dtype=np.float64),
+            'sv_type': np.array(values['sv_type'], dtype=np.int32),
+            'sv_type_names': _get_names(sv_type_codes),
+            'consequence': np.array(values['consequence'], dtype=np.uint64),
+            'genetic_models': np.array(values['genetic_models'],
+                                       dtype=np.uint16),
+            'gene': np.array(values['gene'], dtype=np.int32),
+            'gene_ptr': np.array(gene_ptr, dtype=np.int64),
+            'gene_names': _get_names(gene_codes),
+        }
+
+        temp_path = None
+        try:
+            temp_fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.cache_path), suffix='.tmp')
+            with os.fdopen(temp_fd, 'wb') as handle:
+                np.savez(handle, **self.columns)
+            # mkstemp creates the file readable by the owner only
+            os.chmod(temp_path, 0o644)
+            os.rename(temp_path, self.cache_path)
+        except (IOError, OSError) as error:
+            logger.warning("Could not store column cache {0}: {1}".format(
+                self.cache_path, error))
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return True
+
+    @property
+    def offsets(self):
+        """Return the file offsets of the variants"""
+        return self.columns['offset']
+
+    def can_select(self, filters):
+        """Check if the filters can be evaluated on the cache
+
+            Consequences and genetic models that are not known when the cache
+            is built are not stored, variants can only be filtered on them by
+            scanning the vcf.
+
+            Args:
+                filters (dict): A dictionary with filters
+
+            Returns:
+                bool: If select() gives the same variants as a scan
+        """
+        for key, bits in (('consequence', CONSEQUENCE_BITS),
+                          ('genetic_models', GENETIC_MODEL_BITS)):
+            unknown = set(filters.get(key) or []).difference(bits)
+            if unknown:
+                logger.debug("{0} are not in the column cache, scanning "
+                             "the vcf".format(", ".join(sorted(unknown))))
+                return False
+        return True
+
+    def select(self, filters, sort=None):
+        """Return the variants that follow the filters
+
+            The variant index counts the variants that follow the region,
+            gene, consequence and sv type filters, in the same way as when
+            the vcf is scanned.
+
+            Args:
+                filters (dict): A dictionary with filters
+                sort (str): Sort the rows on 'rank_score' or 'cadd_score',
+                            highest first
+
+            Returns:
+                (rows, indexes): Arrays with the row of each variant that
+                follow the filters and its variant index
+        """
+        nr_rows = len(self.columns['offset'])
+        prefilter = np.ones(nr_rows, dtype=bool)
+
+        regions = []
+        if filters.get('region'):
+            regions.append(parse_region(filters['region']))
+        for region in filters.get('regions') or []:
+            regions.append(parse_region(region))
+        if regions:
+            prefilter &= self._region_mask(regions)
+
+        if filters.get('gene_ids'):
+            genes = set(gene_id.strip() for gene_id in filters['gene_ids'])
+            prefilter &= self._gene_mask(genes)
+
+        if filters.get('consequence'):
+            consequence_bits = _get_bitmask(filters['consequence'],
+                                            CONSEQUENCE_BITS)
+            prefilter &= (self.columns['consequence'] &
+                          np.uint64(consequence_bits)) != 0
+
+        if filters.get('sv_types'):
+            sv_type_codes = np.flatnonzero(np.in1d(
+                self.columns['sv_type_names'], list(filters['sv_types'])))
+            prefilter &= np.in1d(self.columns['sv_type'], sv_type_codes)
+
+        keep = prefilter.copy()
+        with np.errstate(invalid='ignore'):
+            if filters.get('frequency'):
+                max_freq = self.columns['max_freq']
+                keep &= (np.isnan(max_freq) |
+                         (max_freq <= float(filters['frequency'])))
+
+            if filters.get('cadd'):
+                keep &= self.columns['cadd_score'] >= float(filters['cadd'])
+
+            if filters.get('genetic_models'):
+                model_bits = _get_bitmask(filters['genetic_models'],
+                                          GENETIC_MODEL_BITS)
+                keep &= (self.columns['genetic_models'] &
+                         np.uint16(model_bits)) != 0
+
+            if filters.get('sv_len'):
+                keep &= self.columns['sv_len'] >= float(filters['sv_len'])
+
+        indexes = np.cumsum(prefilter)
+        rows = np.flatnonzero(keep)
+        if sort:
+            sort_values = self.columns[sort][rows]
+            sort_values = np.where(np.isnan(sort_values), -np.inf,
+                                   sort_values)
+            rows = rows[np.argsort(-sort_values, kind='mergesort')]
+        return rows, indexes[rows]
+
+    def _region_mask(self, regions):
+        """Return a mask with the variants that overlap any of the regions"""
+        chrom_names = list(self.columns['chrom_names'])
+        mask = np.zeros(len(self.columns['offset']), dtype=bool)
+        for chrom, start, end in regions:
+            if chrom not in chrom_names:
+                continue
+            region_mask = ((self.columns['chrom'] == chrom_names.index(chrom))
+                           & (self.columns['end'] >= start))
+            if end is not None:
+                region_mask &= self.columns['start'] <= end
+            mask |= region_mask
+        return mask
+
+    def _gene_mask(self, genes):
+        """Return a mask with the variants that are annotated with the genes"""
+        nr_rows = len(self.columns['offset'])
+        gene_codes = np.flatnonzero(np.in1d(self.columns['gene_names'],
+                                            list(genes)))
+        gene_rows = np.repeat(np.arange(nr_rows),
+                              np.diff(self.columns['gene_ptr']))
+        mask = np.zeros(nr_rows, dtype=bool)
+        mask[gene_rows[np.in1d(self.columns['gene'], gene_codes)]] = True
+        return mask
+
+
+def _get_bitmask(terms, bits):
+    """Return a bitmask with the bits of the known terms set"""
+    bitmask = 0
+    for term in terms:
+        if term in bits:
+            bitmask |= 1 << bits[term]
+    return bitmask
+
+
+def _get_names(codes):
+    """Return an array with the names ordered by their codes"""
+    names = sorted(codes, key=codes.get)
+    if not names:
+        return np.array([], dtype='U1')
+    return np.array(names)
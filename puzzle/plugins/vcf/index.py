@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+
+from puzzle.utils import get_seekable_handle
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.puzzle.sqlite3'
+
+# Opened indexes with the absolute path of the vcf as key
+VARIANT_INDEXES = {}
+VARIANT_INDEXES_LOCK = threading.Lock()
+
+SCHEMA = """
+create table if not exists meta (
+    key               text primary key,
+    value             text
+);
+
+create table if not exists variant_offset (
+    variant_id        text primary key,
+    file_offset       integer not null,
+    variant_index     integer not null
+);
+
+create table if not exists checkpoint (
+    case_id           text not null,
+    filter_signature  text not null,
+    position          integer not null,
+    file_offset       integer not null,
+    variant_index     integer not null,
+    primary key (case_id, filter_signature, position)
+);
+
+create table if not exists variant_count (
+    case_id           text not null,
+    filter_signature  text not null,
+    nr_variants       integer not null,
+    primary key (case_id, filter_signature)
+);
+"""
+
+
+def get_sidecar_path(vcf_file_path, suffix):
+    """Return a writable path for a file that belongs to a vcf
+
+        The file is stored next to the vcf. If that directory or an
+        existing file there is not writable the file is stored in the temp
+        directory.
+
+        Args:
+            vcf_file_path (str): Path to a vcf file
+            suffix (str): Suffix of the file
+
+        Returns:
+            sidecar_path (str): Path to the file
+    """
+    sidecar_path = vcf_file_path + suffix
+    sidecar_dir = os.path.dirname(os.path.abspath(sidecar_path))
+    if os.access(sidecar_dir, os.W_OK) and (
+            not os.path.exists(sidecar_path) or
+            os.access(sidecar_path, os.W_OK)):
+        return sidecar_path
+
+    path_hash = hashlib.sha1(
+        os.path.abspath(vcf_file_path).encode('utf-8')).hexdigest()
+    sidecar_dir = os.path.join(tempfile.gettempdir(), 'puzzle')
+    if not os.path.exists(sidecar_dir):
+        os.makedirs(sidecar_dir)
+    return os.path.join(sidecar_dir, path_hash + suffix)
+
+
+def get_variant_index(vcf_file_path):
+    """Return the variant index for a vcf
+
+        The index is opened once for each vcf and reopened if the vcf has
+        changed.
+
+        Args:
+            vcf_file_path (str): Path to a vcf file
+
+        Returns:
+            variant_index (VariantIndex): The index or None if it could not
+            be opened
+    """
+    abs_path = os.path.abspath(vcf_file_path)
+    stat = os.stat(abs_path)
+    signature = "{0}:{1}".format(stat.st_mtime, stat.st_size)
+
+    with VARIANT_INDEXES_LOCK:
+        variant_index = VARIANT_INDEXES.get(abs_path)
+        if variant_index is not None and variant_index.signature == signature:
+            return variant_index
+
+        if variant_index is not None:
+            variant_index.close()
+            del VARIANT_INDEXES[abs_path]
+
+        try:
+            variant_index = VariantIndex(vcf_file_path)
+        except sqlite3.Error as error:
+            logger.warning("Could not open variant index for {0}: {1}".format(
+                vcf_file_path, error))
+            return None
+
+        VARIANT_INDEXES[abs_path] = variant_index
+        return variant_index
+
+
+def get_variant_id(variant_line):
+    """Build the variant id from a raw vcf line
+
+        This gives the same id as puzzle.models.Variant
+
+        Args:
+            variant_line (str): A raw vcf line
+
+        Returns:
+            variant_id (str): CHROM_POS_REF_ALT
+    """
+    splitted_line = variant_line.split('\t', 5)
+    return '_'.join([
+        splitted_line[0].lstrip('chrCHR'),
+        splitted_line[1],
+        splitted_line[3],
+        splitted_line[4]
+    ])
+
+
+def get_filter_signature(filters, variant_type='snv'):
+    """Return a normalized string representation of filters
+
+        Filters that are not set are left out and lists are sorted so that
+        equal filters always give the same signature.
+
+        Args:
+            filters (dict): A dictionary with filters
+            variant_type (str): 'snv' or 'sv'
+
+        Returns:
+            signature (str): A json string
+    """
+    normalized = {'variant_type': variant_type}
+    for key, value in filters.items():
+        if value is None or value == '' or value == []:
+            continue
+        if isinstance(value, (list, set, tuple)):
+            if not value:
+                continue
+            value = sorted(set(value))
+        normalized[key] = value
+    return json.dumps(normalized, sort_keys=True)
+
+
+class VariantIndex(object):
+    """Persistent index with the file offset of every variant in a vcf
+
+        The index is a sqlite database stored next to the vcf. If that
+        directory is not writable the index is stored in the temp directory.
+        The index is rebuilt when the size or modification time of the vcf
+        changes. The connection can be used from several threads. Checkpoints
+        and counts that can not be stored are skipped with a warning.
+
+        Args:
+            vcf_file_path (str): Path to a vcf file
+            index_path (str): Path to the index database
+    """
+
+    def __init__(self, vcf_file_path, index_path=None):
+        super(VariantIndex, self).__init__()
+        self.vcf_file_path = vcf_file_path
+        self.index_path = index_path or get_sidecar_path(vcf_file_path,
+                                                          INDEX_SUFFIX)
+        stat = os.stat(vcf_file_path)
+        self.signature = "{0}:{1}".format(stat.st_mtime, stat.st_size)
+        self._lock = threading.Lock()
+        self.db = self._connect()
+
+    def _connect(self):
+        """Connect to the index and clear it if the vcf has changed"""
+        logger.debug("Connecting to index {0}".format(self.index_path))
+        db = sqlite3.connect(self.index_path, check_same_thread=False)
+        db.executescript(SCHEMA)
+        signature = self._get_meta(db, 'signature')
+        if signature != self.signature:
+            if signature:
+                logger.info("{0} has changed, clearing index".format(
+                    self.vcf_file_path))
+            with db:
+                db.execute("delete from meta")
+                db.execute("delete from variant_offset")
+                db.execute("delete from checkpoint")
+                db.execute("delete from variant_count")
+                db.execute("insert into meta values ('signature', ?)",
+                           (self.signature,))
+        return db
+
+    def _get_meta(self, db, key):
+        """Return a value from the meta table"""
+        row = db.execute("select value from meta where key = ?",
+                         (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def is_built(self):
+        """Check if the variant offsets have been indexed"""
+        with self._lock:
+            return self._get_meta(self.db, 'offsets_built') == '1'
+
+    def build(self):
+        """Index the file offset of all variants in the vcf
+
+            Returns:
+                bool: If the vcf could be indexed
+        """
+        handle = get_seekable_handle(self.vcf_file_path)
+        if handle is None:
+            return False
+
+        logger.info("Indexing variant offsets in {0}".format(
+            self.vcf_file_path))
+        try:
+            with handle, self._lock, self.db:
+                self.db.execute("delete from variant_offset")
+                self.db.executemany(
+                    "insert or ignore into variant_offset values (?, ?, ?)",
+                    self._get_offsets(handle)
+                )
+                self.db.execute(
+                    "insert or replace into meta values ('offsets_built', '1')")
+        except sqlite3.OperationalError as error:
+            logger.warning("Could not index {0}: {1}".format(
+                self.vcf_file_path, error))
+            return False
+        return True
+
+    def _get_offsets(self, handle):
+        """Yield the variant id, offset and index for every variant"""
+        index = 0
+        offset = handle.tell()
+        variant_line = handle.readline()
+        while variant_line:
+            if not variant_line.startswith('#'):
+                index += 1
+                yield (get_variant_id(variant_line), offset, index)
+            offset = handle.tell()
+            variant_line = handle.readline()
+
+    def lookup(self, variant_id):
+        """Return the position of a variant
+
+            Args:
+                variant_id (str): A variant id
+
+            Returns:
+                position (tuple): (file_offset, variant_index) or None
+        """
+        with self._lock:
+            return self.db.execute(
+                "select file_offset, variant_index from variant_offset "
+                "where variant_id = ?", (variant_id,)
+            ).fetchone()
+
+    def get_checkpoint(self, case_id, filter_signature, position):
+        """Return the closest checkpoint at or before a position
+
+            Args:
+                case_id (str): A case id
+                filter_signature (str): Signature of the filters used
+                position (int): Position among the filtered variants
+
+            Returns:
+                checkpoint (tuple): (position, file_offset, variant_index)
+                or None
+        """
+        with self._lock:
+            return self.db.execute(
+                "select position, file_offset, variant_index from checkpoint "
+                "where case_id = ? and filter_signature = ? and position <= ? "
+                "order by position desc limit 1",
+                (case_id, filter_signature, position)
+            ).fetchone()
+
+    def add_checkpoint(self, case_id, filter_signature, position, file_offset,
+                       variant_index):
+        """Store where a scan with some filters reached a position
+
+            Args:
+                case_id (str): A case id
+                filter_signature (str): Signature of the filters used
+                position (int): Position among the filtered variants
+                file_offset (int): File offset of the variant line
+                variant_index (int): Index of the variant before this line
+        """
+        try:
+            with self._lock, self.db:
+                self.db.execute(
+                    "insert or replace into checkpoint values (?, ?, ?, ?, ?)",
+                    (case_id, filter_signature, position, file_offset,
+                     variant_index)
+                )
+        except sqlite3.OperationalError as error:
+            logger.warning("Could not store checkpoint in {0}: {1}".format(
+                self.index_path, error))
+
+    def get_count(self, case_id, filter_signature):
+        """Return the stored number of variants that follow some filters
+
+            Args:
+                case_id (str): A case id
+                filter_signature (str): Signature of the filters used
+
+            Returns:
+                nr_variants (int): The number of variants or None
+        """
+        with self._lock:
+            row = self.db.execute(
+                "select nr_variants from variant_count "
+                "where case_id = ? and filter_signature = ?",
+                (case_id, filter_signature)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_count(self, case_id, filter_signature, nr_variants):
+        """Store the number of variants that follow some filters
+
+            Args:
+                case_id (str): A case id
+                filter_signature (str): Signature of the filters used
+                nr_variants (int): The number of variants
+        """
+        try:
+            with self._lock, self.db:
+                self.db.execute(
+                    "insert or replace into variant_count values (?, ?, ?)",
+                    (case_id, filter_signature, nr_variants)
+                )
+        except sqlite3.OperationalError as error:
+            logger.warning("Could not store count in {0}: {1}".format(
+                self.index_path, error))
+
+    def close(self):
+        """Close the connection to the index"""
+        self.db.close()
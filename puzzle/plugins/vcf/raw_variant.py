@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from vcftoolbox import get_info_dict
+
+logger = logging.getLogger(__name__)
+
+# Frequencies that are used as the max frequency of a variant
+FREQUENCY_KEYS = ('1000GAF', 'GMAF')
+
+
+def get_annotation_columns(head):
+    """Return the positions of the annotation fields used for filtering
+
+        Args:
+            head (vcftoolbox.HeaderParser): The parsed header of a vcf
+
+        Returns:
+            columns (dict): Annotation key -> dict with field positions
+    """
+    vep_columns = list(head.vep_columns)
+    snpeff_columns = list(head.snpeff_columns)
+
+    def position(columns, name):
+        return columns.index(name) if name in columns else None
+
+    return {
+        'CSQ': {
+            'consequence': position(vep_columns, 'Consequence'),
+            'genes': [position(vep_columns, name) for name in
+                      ('SYMBOL', 'Gene') if name in vep_columns],
+            'gmaf': position(vep_columns, 'GMAF'),
+        },
+        'ANN': {
+            'consequence': position(snpeff_columns, 'Annotation'),
+            'genes': [position(snpeff_columns, name) for name in
+                      ('Gene_Name', 'Gene_ID') if name in snpeff_columns],
+            'gmaf': None,
+        },
+    }
+
+
+def parse_raw_variant(variant_line, annotation_columns, variant_type='snv'):
+    """Parse the values that are used for filtering from a raw vcf line
+
+        No variant objects are built and no databases are queried. The
+        values are the same as the ones on a formatted Variant.
+
+        Args:
+            variant_line (str): A raw vcf line
+            annotation_columns (dict): Positions from get_annotation_columns
+            variant_type (str): 'snv' or 'sv'
+
+        Returns:
+            raw_variant (dict): A dictionary with the filterable values
+    """
+    splitted_line = variant_line.rstrip('\n\r').split('\t', 8)
+    info_dict = get_info_dict(splitted_line[7])
+
+    raw_variant = {
+        'chrom': splitted_line[0].lstrip('chrCHR'),
+        'start': int(splitted_line[1]),
+        'end': None,
+        'max_freq': None,
+        'cadd_score': get_float(info_dict, 'CADD'),
+        'rank_score': get_rank_score(info_dict),
+        'sv_len': get_sv_len(splitted_line, info_dict, variant_type),
+        'sv_type': info_dict.get('SVTYPE'),
+        'genetic_models': get_genetic_models(info_dict),
+        'consequences': set(),
+        'genes': set(),
+    }
+
+    end = info_dict.get('END')
+    if end and end is not True:
+        raw_variant['end'] = int(end)
+    else:
+        raw_variant['end'] = raw_variant['start'] + len(splitted_line[3]) - 1
+
+    consequences, genes = get_annotations(info_dict, annotation_columns)
+    raw_variant['consequences'] = consequences
+    raw_variant['genes'] = genes
+    raw_variant['max_freq'] = _get_max_freq(
+        info_dict, get_gmaf(info_dict, annotation_columns))
+
+    return raw_variant
+
+
+def get_filter_values(variant_line, annotation_columns, filters,
+                      variant_type='snv'):
+    """Parse the values needed by the frequency, cadd, genetic model and
+       sv length filters from a raw vcf line
+
+        Only the values for the filters that are used are parsed.
+
+        Args:
+            variant_line (str): A raw vcf line
+            annotation_columns (dict): Positions from get_annotation_columns
+            filters (dict): A dictionary with filters
+            variant_type (str): 'snv' or 'sv'
+
+        Returns:
+            filter_values (dict): The values with the same keys as a Variant
+    """
+    splitted_line = variant_line.rstrip('\n\r').split('\t', 8)
+    info_dict = get_info_dict(splitted_line[7])
+
+    filter_values = {}
+    if filters.get('frequency'):
+        filter_values['max_freq'] = _get_max_freq(
+            info_dict, get_gmaf(info_dict, annotation_columns))
+    if filters.get('cadd'):
+        filter_values['cadd_score'] = get_float(info_dict, 'CADD')
+    if filters.get('genetic_models'):
+        filter_values['genetic_models'] = get_genetic_models(info_dict)
+    if filters.get('sv_len'):
+        filter_values['sv_len'] = get_sv_len(splitted_line, info_dict,
+                                             variant_type)
+    return filter_values
+
+
+def get_sort_value(variant_line, sort_key):
+    """Return the value that variants are sorted on from a raw vcf line
+
+        Args:
+            variant_line (str): A raw vcf line
+            sort_key (str): 'rank_score' or 'cadd_score'
+
+        Returns:
+            value (float): The value or None
+    """
+    info_dict = get_info_dict(
+        variant_line.rstrip('\n\r').split('\t', 8)[7])
+    if sort_key == 'rank_score':
+        return get_rank_score(info_dict)
+    if sort_key == 'cadd_score':
+        return get_float(info_dict, 'CADD')
+    raise ValueError("Can not sort variants on {0}".format(sort_key))
+
+
+def has_value_filters(filters):
+    """Check if any filter needs the values from get_filter_values"""
+    return any(filters.get(key) for key in
+               ('frequency', 'cadd', 'genetic_models', 'sv_len'))
+
+
+def get_float(info_dict, key):
+    """Return an INFO value as a float or None"""
+    value = info_dict.get(key)
+    if value and value is not True:
+        return float(value)
+    return None
+
+
+def get_rank_score(info_dict):
+    """Return the rank score of the last family or None"""
+    rank_score_entry = info_dict.get('RankScore')
+    if rank_score_entry and rank_score_entry is not True:
+        return float(rank_score_entry.split(',')[-1].split(':')[-1])
+    return None
+
+
+def get_genetic_models(info_dict):
+    """Return all genetic models followed by a variant"""
+    genetic_models = []
+    genetic_models_entry = info_dict.get('GeneticModels')
+    if genetic_models_entry and genetic_models_entry is not True:
+        for family_annotation in genetic_models_entry.split(','):
+            genetic_models.extend(family_annotation.split(':')[-1].split('|'))
+    return genetic_models
+
+
+def get_sv_len(splitted_line, info_dict, variant_type='snv'):
+    """Return the length of a structural variant
+
+        Translocations have infinite length and snvs have no length.
+    """
+    if variant_type != 'sv':
+        return None
+
+    alt = splitted_line[4]
+    if ':' in alt and not '<' in alt:
+        return float('inf')
+    return int(info_dict.get('END', splitted_line[1])) - int(splitted_line[1])
+
+
+def get_gmaf(info_dict, annotation_columns):
+    """Return the GMAF from the vep annotation
+
+        The last transcript with a GMAF is used, as when formatting.
+    """
+    annotation_key, transcripts = _get_transcripts(info_dict)
+    gmaf_position = (annotation_columns[annotation_key]['gmaf']
+                     if transcripts else None)
+    gmaf = None
+    if gmaf_position is not None:
+        for fields in transcripts:
+            gmaf_raw = _get_field(fields, gmaf_position)
+            if gmaf_raw:
+                gmaf = float(gmaf_raw.split(':')[-1])
+    return gmaf
+
+
+def get_annotations(info_dict, annotation_columns):
+    """Return the consequences and genes from the transcript annotations
+
+        Args:
+            info_dict (dict): The parsed INFO field
+            annotation_columns (dict): Positions from get_annotation_columns
+
+        Returns:
+            (consequences, genes): Sets with the annotated consequence terms
+            and gene symbols and ids
+    """
+    consequences = set()
+    genes = set()
+    annotation_key, transcripts = _get_transcripts(info_dict)
+    if transcripts:
+        columns = annotation_columns[annotation_key]
+        for fields in transcripts:
+            consequence = _get_field(fields, columns['consequence'])
+            if consequence:
+                consequences.update(consequence.split('&'))
+            for gene_position in columns['genes']:
+                gene = _get_field(fields, gene_position)
+                if gene:
+                    genes.add(gene)
+    return consequences, genes
+
+
+class AnnotationMatcher(object):
+    """Match raw vcf lines against the gene, consequence and sv type filters
+
+        The annotations of a line are parsed once and looked up in the sets
+        of wanted values, so the time per line does not depend on the
+        number of genes in the filter. Only whole annotation fields are
+        matched.
+
+        Args:
+            annotation_columns (dict): Positions from get_annotation_columns
+            genes (Iterable): Gene symbols or ids
+            consequences (Iterable): Consequence terms
+            sv_types (Iterable): Structural variant types
+    """
+
+    def __init__(self, annotation_columns, genes=None, consequences=None,
+                 sv_types=None):
+        super(AnnotationMatcher, self).__init__()
+        self.annotation_columns = annotation_columns
+        self.genes = frozenset(genes or [])
+        self.consequences = frozenset(consequences or [])
+        self.sv_types = frozenset(sv_types or [])
+
+    def __bool__(self):
+        return bool(self.genes or self.consequences or self.sv_types)
+
+    __nonzero__ = __bool__
+
+    def matches(self, variant_line):
+        """Check if a raw vcf line follows the filters
+
+            Args:
+                variant_line (str): A raw vcf line
+
+            Returns:
+                bool: If the line follows all of the filters
+        """
+        info_dict = get_info_dict(
+            variant_line.rstrip('\n\r').split('\t', 8)[7])
+
+        if self.sv_types and info_dict.get('SVTYPE') not in self.sv_types:
+            return False
+
+        if self.genes or self.consequences:
+            consequences, genes = get_annotations(info_dict,
+                                                  self.annotation_columns)
+            if self.genes and self.genes.isdisjoint(genes):
+                return False
+            if (self.consequences and
+                    self.consequences.isdisjoint(consequences)):
+                return False
+
+        return True
+
+
+def _get_max_freq(info_dict, gmaf):
+    """Return the highest of the 1000G frequency and the GMAF"""
+    frequencies = [frequency for frequency in
+                   (get_float(info_dict, '1000GAF'), gmaf) if frequency]
+    return max(frequencies) if frequencies else None
+
+
+def _get_transcripts(info_dict):
+    """Return the annotation key and the splitted transcript annotations
+
+        Only one of the annotations is used, in the same way as when
+        formatting variants.
+    """
+    annotation_key = 'CSQ' if info_dict.get('CSQ') else 'ANN'
+    annotation = info_dict.get(annotation_key)
+    if not annotation or annotation is True:
+        return annotation_key, []
+    return annotation_key, [transcript.split('|') for transcript in
+                            annotation.split(',')]
+
+
+def _get_field(fields, position):
+    """Return the field at a position or None"""
+    if position is None or position >= len(fields):
+        return None
+    return fields[position]
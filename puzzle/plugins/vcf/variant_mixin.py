@@ -1,21 +1,77 @@
 import logging
+import re
+from collections import deque
+from itertools import islice
 
-from vcftoolbox import (get_variant_dict, HeaderParser, get_info_dict,
-                        get_vep_info, get_snpeff_info, get_vcf_handle)
+from vcftoolbox import (get_variant_dict, get_info_dict, get_vep_info,
+                        get_snpeff_info, get_vcf_handle)
 
 from puzzle.models import (Compound, Variant, Gene, Genotype, Transcript,)
 
 from puzzle.utils import (get_most_severe_consequence, get_omim_number,
-                          get_cytoband_coord, get_gene_info)
+                          get_cytoband_coord, get_gene_info, BgzfReader,
+                          TabixIndex, get_index_path, parse_region,
+                          get_seekable_handle, get_header, is_bgzf,
+                          split_bgzf, sort_page)
+
+from .columns import get_column_cache
+from .index import get_filter_signature, get_variant_id, get_variant_index
+from .raw_variant import (FREQUENCY_KEYS, AnnotationMatcher,
+                          get_annotation_columns, get_filter_values,
+                          get_sort_value, has_value_filters)
 
 logger = logging.getLogger(__name__)
 
+END_PATTERN = re.compile(r'(?:^|;)END=(\d+)')
+
+# Split files in more ranges than processes so that a page can be returned
+# before the whole file is scanned
+RANGES_PER_PROCESS = 4
+
+
+def scan_range(scan_args):
+    """Filter and format the variants in a range of a vcf
+
+        This runs in a separate process when a vcf is scanned in parallel.
+
+        Args:
+            scan_args (tuple): (plugin_class, variant_type, case_obj, filters,
+                                range_start, range_end)
+
+        Returns:
+            (nr_variants, variants): The number of variants read and a list
+            of (line_offset, index, variant_obj) for the variants that
+            follow the filters, index is counted from the start of the range
+    """
+    (plugin_class, variant_type, case_obj, filters, range_start,
+     range_end) = scan_args
+    plugin = plugin_class(vtype=variant_type)
+    head = plugin._get_header(case_obj.variant_source)
+    annotation_columns = get_annotation_columns(head)
+
+    index = 0
+    variants = []
+    for line_offset, variant_line in plugin._get_filtered_variants(
+            case_obj, filters, file_offset=range_start, end_offset=range_end):
+        index += 1
+        variant_obj = plugin._get_variant_obj(
+            variant_line, case_obj, head, index, filters, annotation_columns)
+
+        if variant_obj:
+            variants.append((line_offset, index, variant_obj))
+
+    return index, variants
+
+
 class VariantMixin(object):
     """Class to store variant specific functions for vcf plugin"""
 
     def variant(self, case_id, variant_id):
         """Return a specific variant.
 
+            The position of the variant is found in a persistent index so
+            that only one line has to be parsed.
+
             Args:
                 case_id (str): Path to vcf file
                 variant_id (str): A variant id
@@ -23,14 +79,60 @@ class VariantMixin(object):
             Returns:
                 variant (Variant): The variant object for the given id
         """
-        for variant_obj in self.variants(case_id, count=float('inf')):
-            if variant_obj['variant_id'] == variant_id:
+        case_obj = self.case(case_id=case_id)
+        vcf_file_path = case_obj.variant_source
+
+        variant_index = get_variant_index(vcf_file_path)
+        if variant_index and (variant_index.is_built or variant_index.build()):
+            position = variant_index.lookup(variant_id)
+            if position is None:
+                return None
+
+            file_offset, index = position
+            with get_seekable_handle(vcf_file_path) as handle:
+                handle.seek(file_offset)
+                variant_line = handle.readline()
+
+            for variant_obj in self._formated_variants(
+                    [variant_line], case_obj, index=index - 1):
                 return variant_obj
+
+        index = 0
+        for _, variant_line in self._get_variant_lines(vcf_file_path):
+            if not variant_line.startswith('#'):
+                index += 1
+                if get_variant_id(variant_line) == variant_id:
+                    for variant_obj in self._formated_variants(
+                            [variant_line], case_obj, index=index - 1):
+                        return variant_obj
         return None
 
-    def variants(self, case_id, skip=0, count=30, filters=None):
+    def all_variants(self, case_id):
+        """Yield every variant of a case with all information
+
+            The variants hold the genotypes, transcripts and genes, as from
+            variant(). This is used to store the variants of a case in a
+            database.
+
+            Args:
+                case_id (str): Path to a vcf file (for this adapter)
+
+            Yields:
+                variant_obj (Variant): The variants in file order
+        """
+        case_obj = self.case(case_id=case_id)
+        variant_lines = (variant_line for _, variant_line in
+                         self._get_variant_lines(case_obj.variant_source))
+        for variant_obj in self._formated_variants(variant_lines, case_obj):
+            yield variant_obj
+
+    def variants(self, case_id, skip=0, count=30, filters=None, sort=None):
         """Return all variants in the VCF.
 
+            The variants only hold the information shown in the variant list,
+            use variant() to get the genotypes, transcripts and full gene
+            information of a variant.
+
             Args:
                 case_id (str): Path to a vcf file (for this adapter)
                 skip (int): Skip first variants
@@ -45,44 +147,391 @@ class VariantMixin(object):
                     is_lof: None (Bool),
                     genetic_models [] (list of genetic models)
                     sv_type: List (list of sv types),
+                    region: str (chrom:start-end),
+                    regions: [] (list of chrom:start-end),
                 }
+                sort (str): Sort the variants on 'rank_score' or
+                            'cadd_score', highest first. The variants are
+                            returned in file order if not given.
         """
         filters = filters or {}
         case_obj = self.case(case_id=case_id)
         limit = count + skip
 
-        raw_variants = self._get_filtered_variants(case_obj, filters)
+        column_cache = self._get_column_cache(case_obj.variant_source,
+                                              filters)
+        if column_cache is not None:
+            for variant_obj in self._get_cached_variants(
+                    case_obj, column_cache, skip, count, filters, sort):
+                yield variant_obj
+            return
+
+        if sort:
+            for variant_obj in self._get_sorted_variants(
+                    case_obj, skip, count, filters, sort):
+                yield variant_obj
+            return
+
+        # Resume the scan from the closest checkpoint before skip
+        variant_index = get_variant_index(case_obj.variant_source)
+        filter_signature = get_filter_signature(filters, self.variant_type)
+        checkpoint = None
+        if variant_index:
+            checkpoint = variant_index.get_checkpoint(
+                case_id, filter_signature, skip)
+        if checkpoint:
+            logger.debug("Resuming from checkpoint at {0}".format(
+                checkpoint[0]))
+            position, file_offset, index = checkpoint
+        else:
+            position, file_offset, index = 0, None, 0
+
+        if self._can_scan_parallel(case_obj.variant_source, filters):
+            variant_objs = self._get_variant_objs_parallel(
+                case_obj, filters, file_offset=file_offset, index=index)
+        else:
+            variant_objs = self._get_variant_objs(
+                case_obj, filters, file_offset=file_offset, index=index)
+
+        for line_offset, index, variant_obj in variant_objs:
+            if position >= skip:
+                if (variant_index and position in (skip, limit - 1) and
+                        line_offset is not None):
+                    variant_index.add_checkpoint(case_id, filter_signature,
+                                                 position, line_offset,
+                                                 index - 1)
+                yield variant_obj
+
+            position += 1
+            if position >= limit:
+                break
+        else:
+            # The scan reached the end of the file, position is the count
+            if variant_index:
+                variant_index.add_count(case_id, filter_signature, position)
+
+    def count_variants(self, case_id, filters=None):
+        """Return the number of variants that follow the filters
+
+            No variants are formatted. The filters are evaluated on the
+            column cache if it is used, otherwise on the raw vcf lines. Counts
+            from scans are stored in the variant index.
+
+            Args:
+                case_id (str): Path to a vcf file (for this adapter)
+                filters (dict): A dictionary with filters, see variants()
+
+            Returns:
+                nr_variants (int): The number of variants
+        """
+        filters = filters or {}
+        nr_variants = self.quick_count_variants(case_id, filters)
+        if nr_variants is not None:
+            return nr_variants
+
+        case_obj = self.case(case_id=case_id)
+        vcf_file_path = case_obj.variant_source
+        annotation_columns = get_annotation_columns(
+            self._get_header(vcf_file_path))
+        nr_variants = sum(
+            1 for _, variant_line in
+            self._get_filtered_variants(case_obj, filters)
+            if self._passes_value_filters(variant_line, filters,
+                                          annotation_columns)
+        )
+        variant_index = get_variant_index(vcf_file_path)
+        if variant_index:
+            variant_index.add_count(
+                case_id, get_filter_signature(filters, self.variant_type),
+                nr_variants)
+
+        return nr_variants
+
+    def quick_count_variants(self, case_id, filters=None):
+        """Return the number of variants without scanning the vcf
+
+            The variants are counted on the column cache if it is used,
+            otherwise a count stored by an earlier scan is returned.
 
-        formated_variants = self._formated_variants(raw_variants, case_obj)
+            Args:
+                case_id (str): Path to a vcf file (for this adapter)
+                filters (dict): A dictionary with filters, see variants()
+
+            Returns:
+                nr_variants (int): The number of variants or None
+        """
+        filters = filters or {}
+        case_obj = self.case(case_id=case_id)
+        vcf_file_path = case_obj.variant_source
+
+        column_cache = self._get_column_cache(vcf_file_path, filters)
+        if column_cache is not None:
+            rows, _ = column_cache.select(filters)
+            return len(rows)
+
+        variant_index = get_variant_index(vcf_file_path)
+        if variant_index is None:
+            return None
+        return variant_index.get_count(
+            case_id, get_filter_signature(filters, self.variant_type))
+
+    def _get_column_cache(self, vcf_file_path, filters):
+        """Return the column cache if the filters can be evaluated on it
+
+            Args:
+                vcf_file_path (str): Path to a vcf file
+                filters (dict): A dictionary with filters
+
+            Returns:
+                column_cache (ColumnCache): The cache or None if the vcf
+                should be scanned
+        """
+        if not self.column_cache:
+            return None
+
+        column_cache = get_column_cache(
+            vcf_file_path, self._get_header(vcf_file_path),
+            self.variant_type
+        )
+        if column_cache is None or not column_cache.can_select(filters):
+            return None
+        return column_cache
+
+    def _get_cached_variants(self, case_obj, column_cache, skip, count,
+                             filters, sort=None):
+        """Yield the variants that follow the filters using a column cache
+
+            The filters are evaluated on the cached columns and only the
+            variants that are returned are read from the vcf.
+
+            Args:
+                case_obj (puzzle.models.Case): A case object
+                column_cache (ColumnCache): The column cache of the vcf
+                skip (int): Skip first variants
+                count (int): The number of variants to return
+                filters (dict): A dictionary with filters
+                sort (str): The key to sort the variants on
+
+            Yields:
+                variant_obj (Variant): A Variant object
+        """
+        rows, indexes = column_cache.select(filters, sort=sort)
+        end = None if count == float('inf') else skip + count
+
+        head = self._get_header(case_obj.variant_source)
+        with get_seekable_handle(case_obj.variant_source) as handle:
+            for row, index in zip(rows[skip:end], indexes[skip:end]):
+                handle.seek(int(column_cache.offsets[row]))
+                yield self._format_variant(handle.readline(), case_obj, head,
+                                           int(index), summary=True)
+
+    def _get_sorted_variants(self, case_obj, skip, count, filters, sort):
+        """Yield a page of the variants that follow the filters, sorted
+
+            The sort values are read from the raw lines and only the lines
+            on the page are kept in memory, deep pages are sorted on disk.
+            Only the variants on the page are formatted.
+
+            Args:
+                case_obj (puzzle.models.Case): A case object
+                skip (int): Skip first variants
+                count (int): The number of variants to return
+                filters (dict): A dictionary with filters
+                sort (str): The key to sort the variants on
+
+            Yields:
+                variant_obj (Variant): A Variant object
+        """
+        head = self._get_header(case_obj.variant_source)
+        annotation_columns = get_annotation_columns(head)
+
+        def get_raw_variants():
+            index = 0
+            for _, variant_line in self._get_filtered_variants(case_obj,
+                                                               filters):
+                index += 1
+                if self._passes_value_filters(variant_line, filters,
+                                              annotation_columns):
+                    yield index, variant_line
+
+        page = sort_page(
+            get_raw_variants(),
+            key=lambda raw_variant: get_sort_value(raw_variant[1], sort),
+            skip=skip,
+            count=count
+        )
+        for index, variant_line in page:
+            yield self._format_variant(variant_line, case_obj, head, index,
+                                       summary=True)
+
+    def _get_variant_objs(self, case_obj, filters, file_offset=None, index=0):
+        """Yield the formatted variants that follow the filters
+
+            Args:
+                case_obj (puzzle.models.Case): A case object
+                filters (dict): A dictionary with filters
+                file_offset (int): Start reading from this file offset
+                index (int): The index of the variant before file_offset
+
+            Yields:
+                (line_offset, index, variant_obj)
+        """
+        raw_variants = self._get_filtered_variants(
+            case_obj, filters, file_offset=file_offset)
+
+        head = self._get_header(case_obj.variant_source)
+        annotation_columns = get_annotation_columns(head)
+
+        for line_offset, variant_line in raw_variants:
+            index += 1
+            variant_obj = self._get_variant_obj(
+                variant_line, case_obj, head, index, filters,
+                annotation_columns)
+
+            if variant_obj:
+                yield line_offset, index, variant_obj
+
+    def _get_variant_obj(self, variant_line, case_obj, head, index, filters,
+                         annotation_columns):
+        """Return a summary variant if the line follows the filters
+
+            The frequency, cadd, genetic model and sv length filters are
+            checked on the raw line before the variant is formatted.
+
+            Args:
+                variant_line (str): A raw vcf line
+                case_obj (puzzle.models.Case): A case object
+                head (vcftoolbox.HeaderParser): The parsed header of the vcf
+                index (int): The index of the variant
+                filters (dict): A dictionary with filters
+                annotation_columns (dict): Positions of annotation fields
+
+            Returns:
+                variant_obj (Variant): A Variant object or None
+        """
+        if not self._passes_value_filters(variant_line, filters,
+                                          annotation_columns):
+            return None
 
+        return self._format_variant(variant_line, case_obj, head, index,
+                                    summary=True)
+
+    def _passes_value_filters(self, variant_line, filters,
+                              annotation_columns):
+        """Check the value filters on a raw vcf line
+
+            Args:
+                variant_line (str): A raw vcf line
+                filters (dict): A dictionary with filters
+                annotation_columns (dict): Positions of annotation fields
+
+            Returns:
+                bool: If the variant should be kept
+        """
+        if not has_value_filters(filters):
+            return True
+
+        filter_values = get_filter_values(
+            variant_line, annotation_columns, filters, self.variant_type)
+        return self._passes_filters(filter_values, filters)
+
+    def _can_scan_parallel(self, vcf_file_path, filters):
+        """Check if a vcf can be scanned with several processes
+
+            Region queries already use the tabix index and are read in one
+            process.
+        """
+        if self.processes <= 1:
+            return False
+        if filters.get('region') or filters.get('regions'):
+            return False
+        return is_bgzf(vcf_file_path)
+
+    def _get_variant_objs_parallel(self, case_obj, filters, file_offset=None,
+                                   index=0):
+        """Yield the formatted variants that follow the filters
+
+            The bgzipped vcf is split in ranges of blocks that are filtered
+            and formatted in a pool of processes. The variants are yielded in
+            the same order as in the file.
+
+            Args:
+                case_obj (puzzle.models.Case): A case object
+                filters (dict): A dictionary with filters
+                file_offset (int): Start reading from this file offset
+                index (int): The index of the variant before file_offset
+
+            Yields:
+                (line_offset, index, variant_obj)
+        """
+        vcf_file_path = case_obj.variant_source
+        file_ranges = split_bgzf(vcf_file_path,
+                                 self.processes * RANGES_PER_PROCESS,
+                                 start_offset=file_offset)
+        logger.info("Scanning {0} in {1} ranges with {2} processes".format(
+            vcf_file_path, len(file_ranges), self.processes))
+
+        scan_args = [
+            (self.__class__, self.variant_type, case_obj, filters,
+             range_start, range_end)
+            for range_start, range_end in file_ranges
+        ]
+
+        # Only self.processes ranges are scanned ahead so that little work
+        # is left in the shared pool when a page is complete
+        pool = self._get_process_pool()
+        scan_args = iter(scan_args)
+        pending = deque(pool.apply_async(scan_range, (range_args,))
+                        for range_args in islice(scan_args, self.processes))
+        while pending:
+            nr_variants, variants = pending.popleft().get()
+            for range_args in islice(scan_args, 1):
+                pending.append(pool.apply_async(scan_range, (range_args,)))
+
+            for line_offset, range_index, variant_obj in variants:
+                variant_obj['index'] = index + range_index
+                yield line_offset, index + range_index, variant_obj
+            index += nr_variants
+
+    def _passes_filters(self, variant_obj, filters):
+        """Check if a variant follows the value filters
+
+            Args:
+                variant_obj (dict): A formatted variant or the values from
+                                    get_filter_values
+                filters (dict): A dictionary with filters
+
+            Returns:
+                bool: If the variant should be kept
+        """
         if filters.get('frequency'):
             frequency = float(filters['frequency'])
-            formated_variants = (variant for variant in formated_variants
-                                 if variant['max_freq'] <= frequency)
+            max_freq = variant_obj['max_freq']
+            if max_freq is not None and max_freq > frequency:
+                return False
 
         if filters.get('cadd'):
             cadd_score = float(filters['cadd'])
-            formated_variants = (variant for variant in formated_variants
-                                 if variant['max_freq'] <= cadd_score)
+            if (variant_obj['cadd_score'] is None or
+                    variant_obj['cadd_score'] < cadd_score):
+                return False
 
         if filters.get('genetic_models'):
             genetic_models = set(filters['genetic_models'])
-            formated_variants = (variant for variant in formated_variants
-            if set(variant.get('genetic_models',[])).intersection(genetic_models))
+            if not set(variant_obj.get('genetic_models', [])).intersection(
+                    genetic_models):
+                return False
 
         if filters.get('sv_len'):
             sv_len = float(filters['sv_len'])
-            formated_variants = (variant for variant in formated_variants
-                                    if variant.get('sv_len') >= sv_len)
-
-        for index, variant_obj in enumerate(formated_variants):
-            if index >= skip:
-                if index <= limit:
-                    yield variant_obj
-                else:
-                    break
+            if (variant_obj.get('sv_len') is None or
+                    variant_obj['sv_len'] < sv_len):
+                return False
+
+        return True
 
-    def _get_filtered_variants(self, case_obj, filters={}):
+    def _get_filtered_variants(self, case_obj, filters={}, file_offset=None,
+                               end_offset=None):
         """Check if variants follows the filters
 
             This function will try to make filters faster for the vcf adapter
@@ -90,11 +539,16 @@ class VariantMixin(object):
             Args:
                 case_obj (puzzle.models.Case): A case object
                 filters (dict): A dictionary with filters
+                file_offset (int): Start reading from this file offset
+                end_offset (int): Stop reading at this file offset
+
+            Yields:
+                (line_offset, variant_line): The file offset of the line is
+                None if the vcf can not be used with random access
         """
 
         genes = set()
-        consequences = set()
-        sv_types = set()
+        regions = []
 
         vcf_file_path = case_obj.variant_source
         logger.info("Parsing file {0}".format(vcf_file_path))
@@ -102,42 +556,182 @@ class VariantMixin(object):
         if filters.get('gene_ids'):
             genes = set([gene_id.strip() for gene_id in filters['gene_ids']])
 
-        if filters.get('consequence'):
-            consequences = set(filters['consequence'])
+        matcher = AnnotationMatcher(
+            annotation_columns=get_annotation_columns(
+                self._get_header(vcf_file_path)),
+            genes=genes,
+            consequences=filters.get('consequence'),
+            sv_types=filters.get('sv_types'),
+        )
+
+        if filters.get('region'):
+            regions.append(parse_region(filters['region']))
 
-        if filters.get('sv_types'):
-            sv_types = set(filters['sv_types'])
+        for region in filters.get('regions') or []:
+            regions.append(parse_region(region))
 
-        handle = get_vcf_handle(infile=vcf_file_path)
+        handle = self._get_variant_lines(vcf_file_path, regions, file_offset,
+                                         end_offset)
 
-        for variant_line in handle:
+        for line_offset, variant_line in handle:
             if not variant_line.startswith('#'):
                 keep_variant = True
 
-                if genes and keep_variant:
-                    keep_variant = False
-                    for gene in genes:
-                        if "|{0}|".format(gene) in variant_line:
-                            keep_variant = True
-                            break
+                if regions:
+                    keep_variant = self._in_regions(variant_line, regions)
 
-                if consequences and keep_variant:
-                    keep_variant = False
-                    for consequence in consequences:
-                        if consequence in variant_line:
-                            keep_variant = True
-                            break
+                if matcher and keep_variant:
+                    keep_variant = matcher.matches(variant_line)
 
-                if sv_types and keep_variant:
-                    keep_variant = False
-                    for sv_type in sv_types:
-                        if sv_type in variant_line:
-                            keep_variant = True
+                if keep_variant:
+                    yield line_offset, variant_line
+
+    def _get_variant_lines(self, vcf_file_path, regions=None,
+                           file_offset=None, end_offset=None):
+        """Return the raw lines of a vcf together with their file offsets
+
+            If regions are given and the vcf is bgzipped with a tabix or csi
+            index only the blocks that overlap the regions are read.
+
+            Args:
+                vcf_file_path (str): Path to a vcf file
+                regions (list): List of (chrom, start, end) tuples
+                file_offset (int): Start reading from this file offset
+                end_offset (int): Stop reading at this file offset
+
+            Yields:
+                (line_offset, variant_line): The file offset of the line is
+                None if the vcf can not be used with random access
+        """
+        index_path = get_index_path(vcf_file_path) if regions else None
+        if index_path:
+            logger.info("Using index {0}".format(index_path))
+            chunks = TabixIndex(index_path).region_chunks(regions)
+            if file_offset is not None:
+                chunks = [(max(chunk_start, file_offset), chunk_end) for
+                          chunk_start, chunk_end in chunks
+                          if chunk_end > file_offset]
+
+            with BgzfReader(vcf_file_path) as reader:
+                for chunk_start, chunk_end in chunks:
+                    reader.seek(chunk_start)
+                    line_offset = reader.tell()
+                    while line_offset < chunk_end:
+                        variant_line = reader.readline()
+                        if not variant_line:
                             break
+                        yield line_offset, variant_line
+                        line_offset = reader.tell()
+            return
+
+        handle = get_seekable_handle(vcf_file_path)
+        if handle is None:
+            for variant_line in get_vcf_handle(infile=vcf_file_path):
+                yield None, variant_line
+            return
+
+        with handle:
+            if file_offset is not None:
+                handle.seek(file_offset)
+            line_offset = handle.tell()
+            variant_line = handle.readline()
+            while variant_line:
+                if end_offset is not None and line_offset >= end_offset:
+                    break
+                yield line_offset, variant_line
+                line_offset = handle.tell()
+                variant_line = handle.readline()
 
-                if keep_variant:
-                    yield variant_line
+    def _in_regions(self, variant_line, regions):
+        """Check if a raw variant line overlaps any of the regions
+
+            Args:
+                variant_line (str): A raw vcf line
+                regions (list): List of (chrom, start, end) tuples
+
+            Returns:
+                bool: If the variant overlaps a region
+        """
+        splitted_line = variant_line.split('\t', 8)
+        chrom = splitted_line[0].lstrip('chrCHR')
+        start = int(splitted_line[1])
+        end_match = END_PATTERN.search(splitted_line[7])
+        if end_match:
+            end = int(end_match.group(1))
+        else:
+            end = start + len(splitted_line[3]) - 1
+
+        for region_chrom, region_start, region_end in regions:
+            if chrom == region_chrom and end >= region_start:
+                if region_end is None or start <= region_end:
+                    return True
+        return False
+
+
+    def _add_gmaf(self, variant, vep_info):
+        """Add the GMAF from the vep annotation as a frequency
+
+            GMAF is used as thousand_g if 1000GAF is missing.
+
+            Args:
+                variant (Variant): A variant object
+                vep_info (list): A list with vep info dicts
+        """
+        gmaf = None
+        for transcript_info in vep_info:
+            gmaf_raw = transcript_info.get('GMAF')
+            if gmaf_raw:
+                gmaf = float(gmaf_raw.split(':')[-1])
+
+        if gmaf:
+            variant.add_frequency('GMAF', gmaf)
+            if not variant.thousand_g:
+                variant.thousand_g = gmaf
+
+    def _set_max_freq(self, variant):
+        """Set the highest population frequency as max_freq
+
+            Args:
+                variant (Variant): A variant object
+        """
+        frequencies = [frequency['value'] for frequency in
+                       variant['frequencies']
+                       if frequency['label'] in FREQUENCY_KEYS]
+        if frequencies:
+            variant.set_max_freq(max(frequencies))
+
+    def _add_summary_annotations(self, variant, vep_info, snpeff_info):
+        """Add the consequence and genes shown in the variant list
 
+            The raw annotations are used directly instead of building
+            transcript objects and looking up genes in the gene database.
+
+            Args:
+                variant (Variant): A variant object
+                vep_info (list): A list with vep info dicts
+                snpeff_info (list): A list with snpeff info dicts
+        """
+        consequences = []
+        hgnc_symbols = set()
+        for transcript_info in vep_info:
+            consequences.append(transcript_info.get('Consequence'))
+            hgnc_symbols.add(transcript_info.get('SYMBOL'))
+        self._add_gmaf(variant, vep_info)
+
+        for transcript_info in snpeff_info:
+            consequences.append(transcript_info.get('Annotation'))
+            hgnc_symbols.add(transcript_info.get('Gene_Name'))
+
+        variant['most_severe_consequence'] = get_most_severe_consequence(
+            [{'consequence': consequence} for consequence in consequences
+             if consequence]
+        )
+
+        for hgnc_symbol in sorted(symbol for symbol in hgnc_symbols if symbol):
+            variant.add_gene(Gene(
+                symbol=hgnc_symbol,
+                omim_number=get_omim_number(hgnc_symbol)
+            ))
 
     def _add_compounds(self, variant, info_dict):
         """Check if there are any compounds and add them to the variant
@@ -220,32 +814,54 @@ class VariantMixin(object):
             )
         return transcript
 
-    def _formated_variants(self, raw_variants, case_obj):
+    def _formated_variants(self, raw_variants, case_obj, index=0):
         """Return variant objects
 
             Args:
                 raw_variants (Iterable): An iterable with variant lines
                 case_obj (puzzle.nodels.Case): A case object
+                index (int): The index of the variant before the first line
 
         """
-        vcf_file_path = case_obj.variant_source
+        head = self._get_header(case_obj.variant_source)
 
-        logger.info("Parsing file {0}".format(vcf_file_path))
-        head = HeaderParser()
-        handle = get_vcf_handle(infile=vcf_file_path)
-        # Parse the header
-        for line in handle:
-            line = line.rstrip()
-            if line.startswith('#'):
-                if line.startswith('##'):
-                    head.parse_meta_data(line)
-                else:
-                    head.parse_header_line(line)
-            else:
-                break
+        for variant_line in raw_variants:
+            if not variant_line.startswith('#'):
+                index += 1
+                yield self._format_variant(variant_line, case_obj, head, index)
 
-        handle.close()
+    def _get_header(self, vcf_file_path):
+        """Return the parsed header of a vcf
+
+            The header is only parsed again if the vcf has changed.
+
+            Args:
+                vcf_file_path (str): Path to a vcf file
 
+            Returns:
+                head (vcftoolbox.HeaderParser): The parsed header
+        """
+        return get_header(vcf_file_path)
+
+    def _format_variant(self, variant_line, case_obj, head, index,
+                        summary=False):
+        """Return a variant object
+
+            A summary variant only holds what is shown in the variant list.
+            Genotypes, transcripts and compounds are left out and the genes
+            are built from the transcript symbols without querying the gene
+            database.
+
+            Args:
+                variant_line (str): A raw vcf line
+                case_obj (puzzle.nodels.Case): A case object
+                head (vcftoolbox.HeaderParser): The parsed header of the vcf
+                index (int): The index of the variant
+                summary (bool): If a summary variant should be returned
+
+            Returns:
+                variant (Variant): A Variant object
+        """
         header_line = head.header
 
         # Get the individual ids for individuals in vcf file
@@ -256,177 +872,178 @@ class VariantMixin(object):
         vep_header = head.vep_columns
         snpeff_header = head.snpeff_columns
 
-        index = 0
-        for variant_line in raw_variants:
-            if not variant_line.startswith('#'):
-                index += 1
-                #Create a variant dict:
-                variant_dict =  get_variant_dict(
-                    variant_line = variant_line,
-                    header_line = header_line
-                )
-                variant_dict['CHROM'] = variant_dict['CHROM'].lstrip('chrCHR')
-                #Crreate a info dict:
-                info_dict = get_info_dict(
-                    info_line = variant_dict['INFO']
-                )
-                #Check if vep annotation:
-                vep_string = info_dict.get('CSQ')
-
-                #Check if snpeff annotation:
-                snpeff_string = info_dict.get('ANN')
-
-                if vep_string:
-                    #Get the vep annotations
-                    vep_info = get_vep_info(
-                        vep_string = vep_string,
-                        vep_header = vep_header
-                    )
-
-                elif snpeff_string:
-                    #Get the vep annotations
-                    snpeff_info = get_snpeff_info(
-                        snpeff_string = snpeff_string,
-                        snpeff_header = snpeff_header
-                    )
-
-                variant = Variant(
-                    **{column: variant_dict.get(column, '.')
-                        for column in variant_columns}
-                    )
-
-                logger.debug("Creating a variant object of variant {0}".format(
-                    variant.get('variant_id')))
-
-                variant['index'] = index
-                logger.debug("Updating index to: {0}".format(
-                    index))
-
-                variant['start'] = int(variant_dict['POS'])
-
-
-                if self.variant_type == 'sv':
-                    other_chrom = variant['CHROM']
-                    # If we have a translocation:
-                    if ':' in variant_dict['ALT'] and not '<' in variant_dict['ALT']:
-                        other_coordinates = variant_dict['ALT'].strip('ACGTN[]').split(':')
-                        other_chrom = other_coordinates[0].lstrip('chrCHR')
-                        other_position = other_coordinates[1]
-                        variant['stop'] = other_position
-
-                        #Set 'infinity' to length if translocation
-                        variant['sv_len'] = float('inf')
-                    else:
-                        variant['stop'] = int(info_dict.get('END', variant_dict['POS']))
-                        variant['sv_len'] = variant['stop'] - variant['start']
-
-                    variant['stop_chrom'] = other_chrom
-
-                else:
-                    variant['stop'] = int(variant_dict['POS']) + \
-                        (len(variant_dict['REF']) - len(variant_dict['ALT']))
-
-                variant['sv_type'] = info_dict.get('SVTYPE')
-                variant['cytoband_start'] = get_cytoband_coord(
-                                                chrom=variant['CHROM'],
-                                                pos=variant['start'])
-                if variant.get('stop_chrom'):
-                    variant['cytoband_stop'] = get_cytoband_coord(
-                                                chrom=variant['stop_chrom'],
-                                                pos=variant['stop'])
-
-                # It would be easy to update these keys...
-                thousand_g = info_dict.get('1000GAF')
-                if thousand_g:
-                    logger.debug("Updating thousand_g to: {0}".format(
-                        thousand_g))
-                    variant['thousand_g'] = float(thousand_g)
-                    variant.add_frequency('1000GAF', variant.get('thousand_g'))
-
-                #SV specific tag for number of occurances
-                occurances = info_dict.get('OCC')
-                if occurances:
-                    logger.debug("Updating occurances to: {0}".format(
-                        occurances))
-                    variant['occurances'] = float(occurances)
-                    variant.add_frequency('OCC', occurances)
-
-                cadd_score = info_dict.get('CADD')
-                if cadd_score:
-                    logger.debug("Updating cadd_score to: {0}".format(
-                        cadd_score))
-                    variant['cadd_score'] = float(cadd_score)
-
-                rank_score_entry = info_dict.get('RankScore')
-                if rank_score_entry:
-                    for family_annotation in rank_score_entry.split(','):
-                        rank_score = family_annotation.split(':')[-1]
-                    logger.debug("Updating rank_score to: {0}".format(
-                        rank_score))
-                    variant['rank_score'] = float(rank_score)
-
-                genetic_models_entry = info_dict.get('GeneticModels')
-                if genetic_models_entry:
-                    genetic_models = []
-                    for family_annotation in genetic_models_entry.split(','):
-                        for genetic_model in family_annotation.split(':')[-1].split('|'):
-                            genetic_models.append(genetic_model)
-                    logger.debug("Updating rank_score to: {0}".format(
-                        rank_score))
-                    variant['genetic_models'] = genetic_models
-
-                #Add genotype calls:
-                for individual in case_obj.individuals:
-                    sample_id = individual.ind_id
-
-                    if sample_id in vcf_individuals:
-
-                        raw_call = dict(zip(
-                            variant_dict['FORMAT'].split(':'),
-                            variant_dict[sample_id].split(':'))
-                        )
-                        variant.add_individual(Genotype(
-                            sample_id = sample_id,
-                            genotype = raw_call.get('GT', './.'),
-                            case_id = individual.case_name,
-                            phenotype = individual.phenotype,
-                            ref_depth = raw_call.get('AD', ',').split(',')[0],
-                            alt_depth = raw_call.get('AD', ',').split(',')[1],
-                            genotype_quality = raw_call.get('GQ', '.'),
-                            depth = raw_call.get('DP', '.'),
-                            supporting_evidence = raw_call.get('SU', '0'),
-                            pe_support = raw_call.get('PE', '0'),
-                            sr_support = raw_call.get('SR', '0'),
-                        ))
-
-                # Add transcript information:
-                gmaf = None
-                if vep_string:
-                    for transcript_info in vep_info:
-                        transcript = self._get_vep_transcripts(transcript_info)
-                        gmaf_raw = transcript_info.get('GMAF')
-                        if gmaf_raw:
-                            gmaf = float(gmaf_raw.split(':')[-1])
-                        variant.add_transcript(transcript)
-
-                if gmaf:
-                    variant.add_frequency('GMAF', gmaf)
-                    if not variant.thousand_g:
-                        variant.thousand_g = gmaf
-
-                elif snpeff_string:
-                    for transcript_info in snpeff_info:
-                        transcript = self._get_snpeff_transcripts(transcript_info)
-                        variant.add_transcript(transcript)
-
-                variant['most_severe_consequence'] = get_most_severe_consequence(
-                    variant['transcripts']
-                )
+        #Create a variant dict:
+        variant_dict =  get_variant_dict(
+            variant_line = variant_line,
+            header_line = header_line
+        )
+        variant_dict['CHROM'] = variant_dict['CHROM'].lstrip('chrCHR')
+        #Crreate a info dict:
+        info_dict = get_info_dict(
+            info_line = variant_dict['INFO']
+        )
+        #Check if vep annotation:
+        vep_string = info_dict.get('CSQ')
+
+        #Check if snpeff annotation:
+        snpeff_string = info_dict.get('ANN')
+
+        if vep_string:
+            #Get the vep annotations
+            vep_info = get_vep_info(
+                vep_string = vep_string,
+                vep_header = vep_header
+            )
 
-                for gene in self._get_genes(variant):
-                    variant.add_gene(gene)
+        elif snpeff_string:
+            #Get the vep annotations
+            snpeff_info = get_snpeff_info(
+                snpeff_string = snpeff_string,
+                snpeff_header = snpeff_header
+            )
 
-                self._add_compounds(variant=variant, info_dict=info_dict)
+        variant = Variant(
+            **{column: variant_dict.get(column, '.')
+                for column in variant_columns}
+            )
+
+        logger.debug("Creating a variant object of variant {0}".format(
+            variant.get('variant_id')))
+
+        variant['index'] = index
+        logger.debug("Updating index to: {0}".format(
+            index))
+
+        variant['start'] = int(variant_dict['POS'])
+
+
+        if self.variant_type == 'sv':
+            other_chrom = variant['CHROM']
+            # If we have a translocation:
+            if ':' in variant_dict['ALT'] and not '<' in variant_dict['ALT']:
+                other_coordinates = variant_dict['ALT'].strip('ACGTN[]').split(':')
+                other_chrom = other_coordinates[0].lstrip('chrCHR')
+                other_position = other_coordinates[1]
+                variant['stop'] = other_position
 
-                yield variant
+                #Set 'infinity' to length if translocation
+                variant['sv_len'] = float('inf')
+            else:
+                variant['stop'] = int(info_dict.get('END', variant_dict['POS']))
+                variant['sv_len'] = variant['stop'] - variant['start']
+
+            variant['stop_chrom'] = other_chrom
+
+        else:
+            variant['stop'] = int(variant_dict['POS']) + \
+                (len(variant_dict['REF']) - len(variant_dict['ALT']))
+
+        variant['sv_type'] = info_dict.get('SVTYPE')
+        # Cytobands are only shown in the list of structural variants
+        if not summary or self.variant_type == 'sv':
+            variant['cytoband_start'] = get_cytoband_coord(
+                                            chrom=variant['CHROM'],
+                                            pos=variant['start'])
+            if variant.get('stop_chrom'):
+                variant['cytoband_stop'] = get_cytoband_coord(
+                                            chrom=variant['stop_chrom'],
+                                            pos=variant['stop'])
+
+        # It would be easy to update these keys...
+        thousand_g = info_dict.get('1000GAF')
+        if thousand_g:
+            logger.debug("Updating thousand_g to: {0}".format(
+                thousand_g))
+            variant['thousand_g'] = float(thousand_g)
+            variant.add_frequency('1000GAF', variant.get('thousand_g'))
+
+        #SV specific tag for number of occurances
+        occurances = info_dict.get('OCC')
+        if occurances:
+            logger.debug("Updating occurances to: {0}".format(
+                occurances))
+            variant['occurances'] = float(occurances)
+            variant.add_frequency('OCC', occurances)
+
+        cadd_score = info_dict.get('CADD')
+        if cadd_score:
+            logger.debug("Updating cadd_score to: {0}".format(
+                cadd_score))
+            variant['cadd_score'] = float(cadd_score)
+
+        rank_score_entry = info_dict.get('RankScore')
+        if rank_score_entry:
+            for family_annotation in rank_score_entry.split(','):
+                rank_score = family_annotation.split(':')[-1]
+            logger.debug("Updating rank_score to: {0}".format(
+                rank_score))
+            variant['rank_score'] = float(rank_score)
+
+        genetic_models_entry = info_dict.get('GeneticModels')
+        if genetic_models_entry:
+            genetic_models = []
+            for family_annotation in genetic_models_entry.split(','):
+                for genetic_model in family_annotation.split(':')[-1].split('|'):
+                    genetic_models.append(genetic_model)
+            logger.debug("Updating rank_score to: {0}".format(
+                rank_score))
+            variant['genetic_models'] = genetic_models
+
+        if summary:
+            self._add_summary_annotations(
+                variant=variant,
+                vep_info=vep_info if vep_string else [],
+                snpeff_info=snpeff_info if snpeff_string else [],
+            )
+            self._set_max_freq(variant)
+            return variant
+
+        #Add genotype calls:
+        for individual in case_obj.individuals:
+            sample_id = individual.ind_id
+
+            if sample_id in vcf_individuals:
+
+                raw_call = dict(zip(
+                    variant_dict['FORMAT'].split(':'),
+                    variant_dict[sample_id].split(':'))
+                )
+                variant.add_individual(Genotype(
+                    sample_id = sample_id,
+                    genotype = raw_call.get('GT', './.'),
+                    case_id = individual.case_name,
+                    phenotype = individual.phenotype,
+                    ref_depth = raw_call.get('AD', ',').split(',')[0],
+                    alt_depth = raw_call.get('AD', ',').split(',')[1],
+                    genotype_quality = raw_call.get('GQ', '.'),
+                    depth = raw_call.get('DP', '.'),
+                    supporting_evidence = raw_call.get('SU', '0'),
+                    pe_support = raw_call.get('PE', '0'),
+                    sr_support = raw_call.get('SR', '0'),
+                ))
+
+        # Add transcript information:
+        if vep_string:
+            for transcript_info in vep_info:
+                transcript = self._get_vep_transcripts(transcript_info)
+                variant.add_transcript(transcript)
+            self._add_gmaf(variant, vep_info)
+
+        elif snpeff_string:
+            for transcript_info in snpeff_info:
+                transcript = self._get_snpeff_transcripts(transcript_info)
+                variant.add_transcript(transcript)
+
+        variant['most_severe_consequence'] = get_most_severe_consequence(
+            variant['transcripts']
+        )
+
+        for gene in self._get_genes(variant):
+            variant.add_gene(gene)
+
+        self._add_compounds(variant=variant, info_dict=info_dict)
+
+        self._set_max_freq(variant)
+
+        return variant
 
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import atexit
+import multiprocessing
 import os
 import logging
+import threading
 
 from path import path
 
@@ -8,6 +11,7 @@ from puzzle.plugins import Plugin
 from puzzle.models import DotDict
 from puzzle.utils import get_case
 from . import VariantMixin, CaseMixin
+from .columns import np
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +21,7 @@ class VcfPlugin(VariantMixin, CaseMixin, Plugin):
 
     def __init__(self, root_path=None, case_lines=None,
                  case_type=None, pattern='*.vcf', vtype='snv',
-                 case_obj=None):
+                 case_obj=None, processes=1, column_cache=False):
         """Initialize a vcf adapter.
 
             When instansiating all cases are found.
@@ -29,6 +33,10 @@ class VcfPlugin(VariantMixin, CaseMixin, Plugin):
                 patter(str) : What pattern to search for in directory
                 vtype(str) : 'snv' or 'sv'
                 case_obj(puzzle.models.case) : If initialized with a case
+                processes(int) : Number of processes used to scan bgzipped
+                                 vcfs and to parse the vcfs in a directory
+                column_cache(bool) : Filter variants with a columnar cache,
+                                     requires numpy
         """
         super(VcfPlugin, self).__init__()
 
@@ -45,13 +53,24 @@ class VcfPlugin(VariantMixin, CaseMixin, Plugin):
         self.pattern = pattern
         logger.debug("Updating pattern to {0}".format(pattern))
 
+        self.processes = processes
+        logger.debug("Using {0} processes".format(processes))
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
+        if processes > 1:
+            # Fork the processes now, before a server starts its threads
+            self._get_process_pool()
+
+        self.column_cache = column_cache
+        if column_cache and np is None:
+            logger.warning("numpy is not installed, column cache is disabled")
+            self.column_cache = False
+
         if root_path:
             if os.path.isdir(root_path):
                 logger.info("Looking for vcf files in {0}".format(root_path))
-                for vcf_file in self._find_vcfs(pattern=pattern):
-                    logger.info("Found vcf {0}".format(vcf_file))
-                    case_obj = get_case(variant_source=vcf_file)
-                    self.case_objs.append(case_obj)
+                vcf_files = list(self._find_vcfs(pattern=pattern))
+                self.case_objs.extend(self._get_cases(vcf_files))
             else:
                 self.case_objs.append(get_case(
                     variant_source=self.root_path,
@@ -70,8 +89,11 @@ class VcfPlugin(VariantMixin, CaseMixin, Plugin):
             can_filter_consequence=True,
             can_filter_gene=True,
             can_filter_inheritance=True,
-            can_filter_sv=True
+            can_filter_sv=True,
+            can_filter_sv_len=vtype == 'sv',
+            can_filter_region=True
         )
+        self.sort_keys = ['rank_score', 'cadd_score']
 
     def check_setup(self, case_lines):
         """Make some small tests to see if setup is correct"""
@@ -99,6 +121,50 @@ class VcfPlugin(VariantMixin, CaseMixin, Plugin):
         """
         return path(self.root_path).walkfiles(pattern)
 
+    def _get_cases(self, vcf_files):
+        """Return a case for each vcf file, in the same order
+
+            The headers are parsed in self.processes processes.
+
+            Args:
+                vcf_files (list): Paths to vcf files
+
+            Returns:
+                case_objs (list): List of puzzle.models.Case
+        """
+        vcf_files = [str(vcf_file) for vcf_file in vcf_files]
+        for vcf_file in vcf_files:
+            logger.info("Found vcf {0}".format(vcf_file))
+
+        if self.processes > 1 and len(vcf_files) > 1:
+            return self._get_process_pool().map(get_case, vcf_files)
+
+        return [get_case(variant_source=vcf_file) for vcf_file in vcf_files]
+
+    def _get_process_pool(self):
+        """Return the pool of processes
+
+            The pool is started when the plugin is created. The same pool is
+            used for all scans of the plugin so that the processes are only
+            started once. The processes are stopped with close(), or when
+            the interpreter exits.
+        """
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                logger.debug("Starting {0} processes".format(self.processes))
+                self._process_pool = multiprocessing.Pool(self.processes)
+                atexit.register(self._process_pool.terminate)
+            return self._process_pool
+
+    def close(self):
+        """Stop the processes used to scan and parse vcfs"""
+        with self._process_pool_lock:
+            if self._process_pool is not None:
+                logger.debug("Stopping {0} processes".format(self.processes))
+                self._process_pool.terminate()
+                self._process_pool.join()
+                self._process_pool = None
+
     def init_app(self, app):
         """Initialize plugin via Flask."""
         pass
@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
 from .get_info import (get_most_severe_consequence, get_omim_number,
                       get_cytoband_coord, get_gene_info)
+from .headers import get_header
 from .ped import get_individuals, get_case
 from .phenomizer import hpo_genes
+from .bgzf import (BgzfReader, PlainReader, is_bgzf, get_seekable_handle,
+                   split_bgzf)
+from .tabix import TabixIndex, get_index_path, parse_region
+from .sort import sort_page, external_sort
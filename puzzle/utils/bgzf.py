@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import struct
+import zlib
+
+logger = logging.getLogger(__name__)
+
+BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+
+# Block offsets with the absolute path of the file as key and
+# (modification time, size, block_offsets) as value
+BLOCK_OFFSETS = {}
+
+
+def is_bgzf(file_path):
+    """Check if a file is compressed with bgzip
+
+        Args:
+            file_path (str): Path to a file
+
+        Returns:
+            bool: If the file starts with a BGZF block
+    """
+    with open(file_path, 'rb') as handle:
+        header = handle.read(16)
+
+    return header[:4] == BGZF_MAGIC and header[12:14] == b'BC'
+
+
+class BgzfReader(object):
+    """Read lines from a bgzipped file with random access
+
+        Positions are given as virtual offsets, that is the start of the
+        compressed block shifted 16 bits to the left combined with the
+        offset within the uncompressed block.
+
+        Args:
+            file_path (str): Path to a bgzipped file
+    """
+
+    def __init__(self, file_path):
+        super(BgzfReader, self).__init__()
+        self.file_path = file_path
+        self._handle = open(file_path, 'rb')
+        self._block_start = 0
+        self._block_size = 0
+        self._buffer = b''
+        self._within = 0
+        self._load_block(0)
+
+    def _load_block(self, block_start):
+        """Read and decompress the block that starts at block_start
+
+            Args:
+                block_start (int): File offset of a compressed block
+        """
+        self._handle.seek(block_start)
+        self._block_start = block_start
+        self._within = 0
+
+        header = self._handle.read(12)
+        if len(header) < 12:
+            # end of file
+            self._block_size = 0
+            self._buffer = b''
+            return
+
+        if header[:4] != BGZF_MAGIC:
+            raise IOError("Invalid BGZF block at offset {0} in {1}".format(
+                block_start, self.file_path))
+
+        extra_len = struct.unpack('<H', header[10:12])[0]
+        extra = self._handle.read(extra_len)
+
+        block_size = None
+        position = 0
+        while position < extra_len:
+            subfield_id = extra[position:position + 2]
+            subfield_len = struct.unpack(
+                '<H', extra[position + 2:position + 4])[0]
+            if subfield_id == b'BC':
+                block_size = struct.unpack(
+                    '<H', extra[position + 4:position + 6])[0] + 1
+            position += 4 + subfield_len
+
+        if block_size is None:
+            raise IOError("Missing BGZF block size at offset {0} in {1}".format(
+                block_start, self.file_path))
+
+        data = self._handle.read(block_size - extra_len - 20)
+        self._block_size = block_size
+        self._buffer = zlib.decompress(data, -15)
+
+    def tell(self):
+        """Return the virtual offset of the current position"""
+        return (self._block_start << 16) | self._within
+
+    def seek(self, virtual_offset):
+        """Move to a virtual offset
+
+            Args:
+                virtual_offset (int): A virtual offset
+        """
+        block_start = virtual_offset >> 16
+        if block_start != self._block_start or not self._block_size:
+            self._load_block(block_start)
+        self._within = virtual_offset & 0xFFFF
+
+    def readline(self):
+        """Read the next line, an empty string is returned at end of file"""
+        pieces = []
+        while True:
+            if self._within >= len(self._buffer):
+                if not self._block_size:
+                    break
+                self._load_block(self._block_start + self._block_size)
+                continue
+
+            newline = self._buffer.find(b'\n', self._within)
+            if newline == -1:
+                pieces.append(self._buffer[self._within:])
+                self._within = len(self._buffer)
+            else:
+                pieces.append(self._buffer[self._within:newline + 1])
+                self._within = newline + 1
+                # Point at the start of the next block when this one is done
+                # so that tell() gives the same offsets as tabix
+                if self._within >= len(self._buffer) and self._block_size:
+                    self._load_block(self._block_start + self._block_size)
+                break
+
+        return b''.join(pieces).decode('utf-8', 'replace')
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+    def close(self):
+        """Close the underlying file handle"""
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_block_offsets(file_path):
+    """Return the file offsets of all blocks in a bgzipped file
+
+        Only the block headers are read, the blocks are not decompressed.
+        The offsets are kept until the file changes.
+
+        Args:
+            file_path (str): Path to a bgzipped file
+
+        Returns:
+            block_offsets (list): Sorted list of block offsets
+    """
+    abs_path = os.path.abspath(file_path)
+    stat = os.stat(abs_path)
+    cached = BLOCK_OFFSETS.get(abs_path)
+    if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+
+    block_offsets = []
+    block_start = 0
+    with open(file_path, 'rb') as handle:
+        while True:
+            handle.seek(block_start)
+            header = handle.read(18)
+            if len(header) < 18:
+                break
+            if header[:4] != BGZF_MAGIC or header[12:14] != b'BC':
+                raise IOError("Invalid BGZF block at offset {0} in {1}".format(
+                    block_start, file_path))
+            block_offsets.append(block_start)
+            block_start += struct.unpack('<H', header[16:18])[0] + 1
+
+    BLOCK_OFFSETS[abs_path] = (stat.st_mtime, stat.st_size, block_offsets)
+    return block_offsets
+
+
+def split_bgzf(file_path, nr_ranges, start_offset=0):
+    """Split a bgzipped file in ranges that start at the beginning of a line
+
+        The ranges follow block boundaries so that every range can be read
+        independently. A line belongs to the range where it starts.
+
+        Args:
+            file_path (str): Path to a bgzipped file
+            nr_ranges (int): The preferred number of ranges
+            start_offset (int): Virtual offset of a line to start from
+
+        Returns:
+            ranges (list): List of (start, end) virtual offsets, end is None
+            for the last range
+    """
+    block_offsets = get_block_offsets(file_path)
+    step = max(len(block_offsets) // max(nr_ranges, 1), 1)
+
+    range_starts = [start_offset or 0]
+    with BgzfReader(file_path) as reader:
+        for block_number in range(step, len(block_offsets), step):
+            # Finish the line that runs into this block from the previous one
+            reader._load_block(block_offsets[block_number - 1])
+            if not reader._buffer:
+                continue
+            reader._within = len(reader._buffer) - 1
+            if not reader.readline():
+                continue
+            range_start = reader.tell()
+            if range_start > range_starts[-1]:
+                range_starts.append(range_start)
+
+    return list(zip(range_starts, range_starts[1:] + [None]))
+
+
+class PlainReader(object):
+    """Read lines from an uncompressed file with random access
+
+        Offsets are plain byte offsets so that they can be used in the
+        same way as the virtual offsets of a BgzfReader.
+
+        Args:
+            file_path (str): Path to an uncompressed file
+    """
+
+    def __init__(self, file_path):
+        super(PlainReader, self).__init__()
+        self.file_path = file_path
+        self._handle = open(file_path, 'rb')
+
+    def tell(self):
+        """Return the byte offset of the current position"""
+        return self._handle.tell()
+
+    def seek(self, offset):
+        """Move to a byte offset"""
+        self._handle.seek(offset)
+
+    def readline(self):
+        """Read the next line, an empty string is returned at end of file"""
+        return self._handle.readline().decode('utf-8', 'replace')
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+    def close(self):
+        """Close the underlying file handle"""
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_seekable_handle(file_path):
+    """Return a reader that supports tell and seek for a file
+
+        Files compressed with regular gzip can not be used with random
+        access and None is returned for them.
+
+        Args:
+            file_path (str): Path to a file
+
+        Returns:
+            reader (BgzfReader, PlainReader): A reader or None
+    """
+    if is_bgzf(file_path):
+        return BgzfReader(file_path)
+    if file_path.endswith('.gz'):
+        logger.info("{0} is not bgzipped, random access is not "
+                    "possible".format(file_path))
+        return None
+    return PlainReader(file_path)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from vcftoolbox import HeaderParser, get_vcf_handle
+
+logger = logging.getLogger(__name__)
+
+# Parsed headers with the absolute path as key and (signature, head) as
+# value, the least recently used header is first
+HEADER_CACHE = OrderedDict()
+HEADER_CACHE_LOCK = threading.Lock()
+MAX_CACHED_HEADERS = 128
+
+
+def get_header(vcf_file_path):
+    """Return the parsed header of a vcf
+
+        Headers are cached and only parsed again when the modification time
+        or the size of the file changes. The same HeaderParser is shared by
+        all callers so it should not be modified. When the cache is full the
+        least recently used header is dropped.
+
+        Args:
+            vcf_file_path (str): Path to a vcf file
+
+        Returns:
+            head (vcftoolbox.HeaderParser): The parsed header
+    """
+    abs_path = os.path.abspath(vcf_file_path)
+    stat = os.stat(abs_path)
+    signature = (stat.st_mtime, stat.st_size)
+
+    with HEADER_CACHE_LOCK:
+        cached = HEADER_CACHE.pop(abs_path, None)
+        if cached and cached[0] == signature:
+            HEADER_CACHE[abs_path] = cached
+            return cached[1]
+
+    head = parse_header(vcf_file_path)
+    with HEADER_CACHE_LOCK:
+        HEADER_CACHE[abs_path] = (signature, head)
+        while len(HEADER_CACHE) > MAX_CACHED_HEADERS:
+            HEADER_CACHE.popitem(last=False)
+    return head
+
+
+def parse_header(vcf_file_path):
+    """Parse the header of a vcf
+
+        Args:
+            vcf_file_path (str): Path to a vcf file
+
+        Returns:
+            head (vcftoolbox.HeaderParser): The parsed header
+    """
+    logger.info("Parsing header of {0}".format(vcf_file_path))
+    head = HeaderParser()
+    handle = get_vcf_handle(infile=vcf_file_path)
+    for line in handle:
+        line = line.rstrip()
+        if line.startswith('#'):
+            if line.startswith('##'):
+                head.parse_meta_data(line)
+            else:
+                head.parse_header_line(line)
+        else:
+            break
+
+    handle.close()
+    return head
@@ -3,10 +3,11 @@ import logging
 import os
 
 from ped_parser import FamilyParser
-from vcftoolbox import HeaderParser, get_vcf_handle
 
 from puzzle.models import Case, Individual
 
+from .headers import get_header
+
 logger = logging.getLogger(__name__)
 
 
@@ -92,17 +93,7 @@ def get_individuals(vcf=None, case_lines=None, case_type='ped'):
         elif vcf:
             # read individuals from vcf file
             case_id = os.path.basename(vcf)
-            head = HeaderParser()
-            handle = get_vcf_handle(infile=vcf)
-            for line in handle:
-                line = line.rstrip()
-                if line.startswith('#'):
-                    if line.startswith('##'):
-                        head.parse_meta_data(line)
-                    else:
-                        head.parse_header_line(line)
-                else:
-                    break
+            head = get_header(vcf)
 
             for index, ind in enumerate(head.individuals):
                 # If we only have a vcf file we can not get metadata about the
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import logging
+import pickle
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Pages that reach further than this are sorted with an external merge sort
+MAX_HEAP_SIZE = 10000
+
+
+def sort_page(items, key, skip=0, count=30, max_heap_size=MAX_HEAP_SIZE):
+    """Return a page of items sorted on a key, highest first
+
+        Items with the same value keep their order and items where the value
+        is None are placed last. Only skip + count items are kept in a heap
+        while the items are read. If the page reaches further than
+        max_heap_size the items are sorted with external_sort instead.
+
+        Args:
+            items (Iterable): The items to sort
+            key (function): Function that returns the value to sort on
+            skip (int): Skip first items
+            count (int): The number of items to return
+            max_heap_size (int): The largest number of items to keep in
+                                 memory
+
+        Returns:
+            page (list): The sorted items
+    """
+    limit = skip + count
+    if limit <= max_heap_size:
+        top_items = heapq.nsmallest(int(limit), _decorate(items, key))
+        return [item for _, item in top_items][skip:]
+
+    end = None if count == float('inf') else int(limit)
+    return list(itertools.islice(
+        external_sort(items, key, run_size=max_heap_size), skip, end))
+
+
+def external_sort(items, key, run_size=MAX_HEAP_SIZE):
+    """Sort items on a key, highest first, without holding all in memory
+
+        The items are sorted in runs of run_size items that are stored in
+        temporary files. The runs are then merged.
+
+        Args:
+            items (Iterable): The items to sort, they have to be picklable
+            key (function): Function that returns the value to sort on
+            run_size (int): The number of items in each run
+
+        Yields:
+            item: The items in sorted order
+    """
+    runs = []
+    decorated_items = _decorate(items, key)
+    try:
+        while True:
+            run = list(itertools.islice(decorated_items, run_size))
+            if not run:
+                break
+            run.sort()
+            run_handle = tempfile.TemporaryFile()
+            for entry in run:
+                pickle.dump(entry, run_handle, pickle.HIGHEST_PROTOCOL)
+            run_handle.seek(0)
+            runs.append(run_handle)
+
+        logger.debug("Merging {0} sorted runs".format(len(runs)))
+        for _, item in heapq.merge(*[_read_run(run) for run in runs]):
+            yield item
+    finally:
+        for run_handle in runs:
+            run_handle.close()
+
+
+def _decorate(items, key):
+    """Yield (sort_key, item) where sort_key orders items highest first
+
+        A running number is part of the sort key so that the items are
+        never compared and equal values keep their order.
+    """
+    for number, item in enumerate(items):
+        value = key(item)
+        if value is None:
+            yield (1, 0, number), item
+        else:
+            yield (0, -value, number), item
+
+
+def _read_run(run_handle):
+    """Yield the entries stored in a run file"""
+    while True:
+        try:
+            yield pickle.load(run_handle)
+        except EOFError:
+            break
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+import gzip
+import logging
+import os
+import struct
+
+from .bgzf import is_bgzf
+
+logger = logging.getLogger(__name__)
+
+TABIX_MAGIC = b'TBI\x01'
+CSI_MAGIC = b'CSI\x01'
+
+
+def parse_region(region):
+    """Parse a region string
+
+        Regions are given as 'chrom', 'chrom:start' or 'chrom:start-end'.
+        Coordinates are 1-based and inclusive.
+
+        Args:
+            region (str): A region string
+
+        Returns:
+            region (tuple): (chrom, start, end), end is None if open ended
+    """
+    region = region.strip().replace(',', '')
+    chrom, _, interval = region.partition(':')
+    chrom = chrom.lstrip('chrCHR')
+    if not chrom:
+        raise ValueError("Invalid region {0}".format(region))
+
+    start, end = 1, None
+    try:
+        if interval:
+            start_str, dash, end_str = interval.partition('-')
+            start = int(start_str)
+            if end_str:
+                end = int(end_str)
+            elif not dash:
+                end = start
+    except ValueError:
+        raise ValueError("Invalid region {0}".format(region))
+
+    if end is not None and end < start:
+        raise ValueError("Invalid region {0}".format(region))
+
+    return (chrom, start, end)
+
+
+def get_index_path(vcf_file_path):
+    """Return the path to a tabix or csi index for a vcf
+
+        Only bgzipped files can be indexed.
+
+        Args:
+            vcf_file_path (str): Path to a vcf file
+
+        Returns:
+            index_path (str): Path to the index or None
+    """
+    if not vcf_file_path.endswith('.gz'):
+        return None
+
+    for suffix in ('.tbi', '.csi'):
+        index_path = vcf_file_path + suffix
+        if os.path.isfile(index_path):
+            if is_bgzf(vcf_file_path):
+                return index_path
+            logger.warning("{0} is not bgzipped, ignoring index {1}".format(
+                vcf_file_path, index_path))
+    return None
+
+
+def reg2bins(beg, end, min_shift=14, depth=5):
+    """Return all bins that may overlap a 0-based, half open interval
+
+        Args:
+            beg (int): Start of interval
+            end (int): End of interval
+            min_shift (int): Size of the smallest bin as a power of 2
+            depth (int): Number of levels in the binning scheme
+
+        Returns:
+            bins (list): List of bin numbers
+    """
+    bins = []
+    end -= 1
+    shift = min_shift + depth * 3
+    offset = 0
+    for level in range(depth + 1):
+        first = offset + (beg >> shift)
+        last = offset + (end >> shift)
+        bins.extend(range(first, last + 1))
+        shift -= 3
+        offset += 1 << (level * 3)
+    return bins
+
+
+class TabixIndex(object):
+    """Parse a tabix (.tbi) or CSI (.csi) index
+
+        Args:
+            index_path (str): Path to the index file
+    """
+
+    def __init__(self, index_path):
+        super(TabixIndex, self).__init__()
+        self.index_path = index_path
+        self.min_shift = 14
+        self.depth = 5
+        self.names = []
+        # One dictionary per reference with bin number -> list of chunks
+        self._bins = []
+        # Linear index with the smallest offset per 16kb window (tbi only)
+        self._linear = []
+
+        with gzip.open(index_path, 'rb') as handle:
+            data = handle.read()
+
+        magic = data[:4]
+        if magic == TABIX_MAGIC:
+            self._parse_tabix(data)
+        elif magic == CSI_MAGIC:
+            self._parse_csi(data)
+        else:
+            raise IOError("{0} is not a tabix or csi index".format(index_path))
+
+        self._ref_ids = dict(
+            (name, ref_id) for ref_id, name in enumerate(self.names))
+
+    def _parse_names(self, data, position):
+        """Parse the tabix header and reference names
+
+            Returns:
+                position (int): Position after the names
+        """
+        name_len = struct.unpack('<7i', data[position:position + 28])[-1]
+        position += 28
+        raw_names = data[position:position + name_len]
+        self.names = [name.decode('utf-8') for name in
+                      raw_names.split(b'\x00') if name]
+        return position + name_len
+
+    def _parse_tabix(self, data):
+        """Parse the content of a .tbi index"""
+        nr_refs = struct.unpack('<i', data[4:8])[0]
+        position = self._parse_names(data, 8)
+
+        for _ in range(nr_refs):
+            bins = {}
+            nr_bins = struct.unpack('<i', data[position:position + 4])[0]
+            position += 4
+            for _ in range(nr_bins):
+                bin_id, nr_chunks = struct.unpack(
+                    '<Ii', data[position:position + 8])
+                position += 8
+                chunks = struct.unpack(
+                    '<{0}Q'.format(nr_chunks * 2),
+                    data[position:position + nr_chunks * 16])
+                position += nr_chunks * 16
+                bins[bin_id] = list(zip(chunks[::2], chunks[1::2]))
+
+            nr_intervals = struct.unpack('<i', data[position:position + 4])[0]
+            position += 4
+            linear = struct.unpack(
+                '<{0}Q'.format(nr_intervals),
+                data[position:position + nr_intervals * 8])
+            position += nr_intervals * 8
+
+            self._bins.append(bins)
+            self._linear.append(linear)
+
+    def _parse_csi(self, data):
+        """Parse the content of a .csi index"""
+        self.min_shift, self.depth, aux_len = struct.unpack('<3i', data[4:16])
+        if aux_len >= 28:
+            self._parse_names(data, 16)
+        position = 16 + aux_len
+
+        nr_refs = struct.unpack('<i', data[position:position + 4])[0]
+        position += 4
+        for _ in range(nr_refs):
+            bins = {}
+            nr_bins = struct.unpack('<i', data[position:position + 4])[0]
+            position += 4
+            for _ in range(nr_bins):
+                bin_id, _, nr_chunks = struct.unpack(
+                    '<IQi', data[position:position + 16])
+                position += 16
+                chunks = struct.unpack(
+                    '<{0}Q'.format(nr_chunks * 2),
+                    data[position:position + nr_chunks * 16])
+                position += nr_chunks * 16
+                bins[bin_id] = list(zip(chunks[::2], chunks[1::2]))
+
+            self._bins.append(bins)
+            self._linear.append(())
+
+    @property
+    def max_position(self):
+        """Return the largest position that the index can handle"""
+        return 1 << (self.min_shift + self.depth * 3)
+
+    def _ref_id(self, chrom):
+        """Find the reference id for a chromosome
+
+            Chromosomes may be named with or without 'chr' prefix in the vcf.
+        """
+        for name in (chrom, 'chr' + chrom, chrom.lstrip('chrCHR')):
+            if name in self._ref_ids:
+                return self._ref_ids[name]
+        return None
+
+    def chunks(self, chrom, start=1, end=None):
+        """Return the chunks of the file that may overlap a region
+
+            Args:
+                chrom (str): Chromosome name
+                start (int): 1-based start position
+                end (int): 1-based inclusive end position
+
+            Returns:
+                chunks (list): Sorted list of (start, end) virtual offsets
+        """
+        ref_id = self._ref_id(chrom)
+        if ref_id is None:
+            return []
+
+        beg = max(start - 1, 0)
+        end = min(end or self.max_position, self.max_position)
+
+        min_offset = 0
+        linear = self._linear[ref_id]
+        if linear:
+            min_offset = linear[min(beg >> self.min_shift, len(linear) - 1)]
+
+        bins = self._bins[ref_id]
+        chunks = []
+        for bin_id in reg2bins(beg, end, self.min_shift, self.depth):
+            for chunk_start, chunk_end in bins.get(bin_id, []):
+                if chunk_end > min_offset:
+                    chunks.append((chunk_start, chunk_end))
+
+        return merge_chunks(chunks)
+
+    def region_chunks(self, regions):
+        """Return the merged chunks for a list of regions
+
+            Args:
+                regions (list): List of (chrom, start, end) tuples
+
+            Returns:
+                chunks (list): Sorted list of (start, end) virtual offsets
+        """
+        chunks = []
+        for chrom, start, end in regions:
+            chunks.extend(self.chunks(chrom, start, end))
+        return merge_chunks(chunks)
+
+
+def merge_chunks(chunks):
+    """Sort and merge overlapping chunks
+
+        Args:
+            chunks (list): List of (start, end) virtual offsets
+
+        Returns:
+            merged (list): Sorted list of non overlapping chunks
+    """
+    merged = []
+    for chunk_start, chunk_end in sorted(chunks):
+        if merged and chunk_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], chunk_end))
+        else:
+            merged.append((chunk_start, chunk_end))
+    return merged
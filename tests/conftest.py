@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import pytest
 import logging
+import shutil
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -24,6 +25,27 @@ def vcf():
     return db
 
 
+@pytest.fixture
+def vcf_file(tmpdir):
+    """Return a copy of the hapmap vcf
+
+        Indexes and caches are written next to the vcf, the copy keeps them
+        out of tests/fixtures.
+    """
+    vcf_path = str(tmpdir.join('hapmap.vcf'))
+    shutil.copy('tests/fixtures/hapmap.vcf', vcf_path)
+    return vcf_path
+
+
+@pytest.fixture
+def bgzipped_vcf_file(tmpdir):
+    """Return a copy of the bgzipped hapmap vcf with its tabix index"""
+    vcf_path = str(tmpdir.join('hapmap.vcf.gz'))
+    shutil.copy('tests/fixtures/hapmap.vcf.gz', vcf_path)
+    shutil.copy('tests/fixtures/hapmap.vcf.gz.tbi', vcf_path + '.tbi')
+    return vcf_path
+
+
 @pytest.fixture
 def variant():
     """Return a variant dictionary"""
@@ -9,7 +9,7 @@ def test_delete_gene():
 
     gene_ids = ['ADK', 'SKD', 'EGFR']
     gene_list.gene_ids = gene_ids
-    assert gene_list._gene_ids == ','.join(gene_ids)
+    assert [member.gene_id for member in gene_list.members] == gene_ids
 
     # remove one gene
     gene_list.delete_gene('ADK')
@@ -18,3 +18,18 @@ def test_delete_gene():
     # remove multiple genes
     gene_list.delete_gene('SKD', 'EGFR')
     assert gene_list.gene_ids == []
+
+
+def test_duplicate_genes():
+    gene_list = GeneList(list_id='my cool list')
+    gene_list.gene_ids = ['ADK', 'SKD', 'ADK']
+    assert gene_list.gene_ids == ['ADK', 'SKD']
+
+
+def test_legacy_gene_ids():
+    gene_list = GeneList(list_id='my old list', _gene_ids='ADK,SKD')
+    assert gene_list.gene_ids == ['ADK', 'SKD']
+
+    gene_list.delete_gene('ADK')
+    assert gene_list.gene_ids == ['SKD']
+    assert gene_list._gene_ids is None
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import pickle
 
 
 def test_variant(variant):
@@ -83,3 +84,13 @@ def test_update_variant_id(variant):
     variant.update_variant_id(variant_id)
 
     assert variant['variant_id'] == variant_id
+
+
+def test_pickle_variant(variant):
+    """docstring for test_variant"""
+    variant.add_frequency(name='1000G', value=0.01)
+
+    unpickled_variant = pickle.loads(pickle.dumps(variant, 2))
+
+    assert unpickled_variant == variant
+    assert unpickled_variant.variant_id == variant['variant_id']
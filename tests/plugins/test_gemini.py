@@ -1,6 +1,7 @@
 ##TODO mock a gemini db
 
 from puzzle.plugins import GeminiPlugin
+from puzzle.plugins.gemini.pool import get_pool
 
 GEMINI_DB = "tests/fixtures/HapMapFew.db"
 
@@ -43,6 +44,46 @@ class TestGeminiAdapter(object):
 
         assert len(variants) == 5
 
+    def test_get_variants_skip(self):
+        """Test that the pages are read from checkpoints in the same way"""
+        all_variants = [(variant['variant_id'], variant['index']) for variant
+                        in self.adapter.variants('643594', count=1000)]
+
+        for _ in range(2):
+            # the second time the pages are resumed from checkpoints
+            for skip in (0, 2, 4):
+                page = [(variant['variant_id'], variant['index']) for variant
+                        in self.adapter.variants('643594', skip=skip,
+                                                 count=2)]
+                assert page == all_variants[skip:skip + 2]
+
+    def test_get_variants_region(self):
+        """Test that the region filter selects overlapping variants"""
+        all_variants = list(self.adapter.variants('643594', count=1000))
+        chrom = all_variants[0]['CHROM']
+        region_variants = list(self.adapter.variants(
+            '643594', count=1000, filters={'region': chrom}))
+
+        assert region_variants
+        assert ([variant['variant_id'] for variant in region_variants] ==
+                [variant['variant_id'] for variant in all_variants
+                 if variant['CHROM'] == chrom])
+        assert (self.adapter.count_variants('643594', {'region': chrom}) ==
+                len(region_variants))
+
+    def test_get_variants_carrier_index(self):
+        """Test that the carrier index gives the same variants"""
+        carrier_adapter = GeminiPlugin(GEMINI_DB, carrier_index=True)
+        variant_ids = set(variant['variant_id'] for variant in
+                          self.adapter.variants('643594', count=1000))
+        carried_ids = set(variant['variant_id'] for variant in
+                          carrier_adapter.variants('643594', count=1000))
+
+        assert carried_ids
+        assert carried_ids == variant_ids
+        assert (carrier_adapter.count_variants('643594') ==
+                len(carried_ids))
+
     def test_get_variant(self):
         """Test to get one variant"""
         variant = self.adapter.variant(
@@ -52,3 +93,15 @@ class TestGeminiAdapter(object):
 
         assert variant['CHROM'] == '6'
         assert variant['POS'] == '32487163'
+
+    def test_pool(self):
+        """Test that connections are shared and read only"""
+        pool = get_pool(GEMINI_DB)
+        assert get_pool(GEMINI_DB) is pool
+        assert set(pool.sample_to_idx) == set(['NA12877', 'NA12878',
+                                               'NA12882'])
+
+        with pool.connection() as connection:
+            nr_variants = connection.execute(
+                "SELECT COUNT(*) FROM variants").fetchone()[0]
+        assert nr_variants >= self.adapter.count_variants('643594')
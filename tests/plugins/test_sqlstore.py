@@ -1,4 +1,9 @@
 # -*- coding: utf-8 -*-
+from sqlalchemy import event
+
+from puzzle.models.sql import Variant
+from puzzle.plugins import SqlStore, VcfPlugin
+from puzzle.utils import get_case
 
 
 def test_set_up(sql_store):
@@ -58,3 +63,181 @@ def test_remove_phenotype(test_db):
     # test resetting the phenotypes for an individual
     test_db.remove_phenotype(ind_obj)
     assert len(ind_obj.phenotypes) == 0
+
+
+def test_count_variants(sql_store, vcf_file):
+    case_obj = get_case(vcf_file)
+    sql_store.add_case(case_obj)
+    sql_store.add_genelist('test', ['TECTA', 'AR'])
+    filters = {'gene_lists': ['test']}
+
+    variants = list(sql_store.variants(case_obj.case_id, count=1000,
+                                       filters=filters))
+    assert variants
+    assert sql_store.count_variants(case_obj.case_id,
+                                    filters=filters) == len(variants)
+    # the filters are not changed
+    assert filters == {'gene_lists': ['test']}
+
+
+def test_select_plugin_cache(sql_store):
+    case_obj = get_case('tests/fixtures/hapmap.vcf')
+    sql_store.add_case(case_obj)
+    sql_case = sql_store.case(case_obj.case_id)
+
+    plugin, case_id = sql_store.select_plugin(sql_case)
+    assert case_id == case_obj.case_id
+    assert plugin.case_objs == [sql_case]
+    assert len(sql_store.plugins) == 1
+
+    cached_plugin = list(sql_store.plugins.values())[0]
+    sql_store.select_plugin(sql_case)
+    assert list(sql_store.plugins.values()) == [cached_plugin]
+
+    sql_store.delete_case(sql_case)
+    assert len(sql_store.plugins) == 0
+
+
+def test_select_plugin_cache_size(sql_store):
+    sql_store.max_plugins = 1
+    for name in ('hapmap.vcf', 'minimal.vcf'):
+        case_obj = get_case('tests/fixtures/{0}'.format(name))
+        sql_store.add_case(case_obj)
+        sql_store.select_plugin(sql_store.case(case_obj.case_id))
+
+    assert len(sql_store.plugins) == 1
+    assert list(sql_store.plugins)[0][2].endswith('minimal.vcf')
+
+
+def test_add_genelist(sql_store):
+    gene_ids = ['GENE{0}'.format(number) for number in range(2000)]
+    gene_list = sql_store.add_genelist('panel', gene_ids + gene_ids[:10])
+    assert gene_list.gene_ids == gene_ids
+
+    sql_store.add_genelist('small', ['GENE1', 'AR'])
+    assert sql_store.genelist_gene_ids(['panel', 'small']) == \
+        set(gene_ids + ['AR'])
+    assert sql_store.genelist_gene_ids([]) == set()
+
+    sql_store.remove_genelist('panel')
+    assert sql_store.gene_list('panel') is None
+    assert sql_store.genelist_gene_ids(['small']) == set(['GENE1', 'AR'])
+
+
+def test_add_variants(sql_store, vcf_file):
+    case_obj = get_case(vcf_file)
+    vcf_case = sql_store.add_case(case_obj)
+
+    sql_case_obj = get_case(vcf_file)
+    sql_case_obj['case_id'] = 'stored'
+    sql_case = sql_store.add_case(sql_case_obj, mode='sql')
+    plugin = VcfPlugin(root_path=vcf_file)
+    nr_variants = sql_store.add_variants(
+        sql_case, plugin.all_variants(case_obj.case_id), batch_size=10)
+    assert nr_variants == 108
+
+    for filters in ({}, {'gene_ids': ['TECTA', 'AR']}, {'cadd': 10},
+                    {'frequency': 0.01, 'consequence': ['missense_variant']},
+                    {'region': '1:30000000-41000000'},
+                    {'regions': ['X', '11:121008681']},
+                    {'genetic_models': ['AR_hom', 'AD']}):
+        vcf_variants = list(sql_store.variants(vcf_case.case_id, count=1000,
+                                               filters=dict(filters)))
+        sql_variants = list(sql_store.variants('stored', count=1000,
+                                               filters=dict(filters)))
+        assert ([variant['variant_id'] for variant in sql_variants] ==
+                [variant['variant_id'] for variant in vcf_variants])
+        assert (sql_store.count_variants('stored', filters=dict(filters)) ==
+                len(vcf_variants))
+
+    sorted_ids = [variant['variant_id'] for variant in sql_store.variants(
+        vcf_case.case_id, skip=5, count=10, sort='cadd_score')]
+    assert sorted_ids == [variant['variant_id'] for variant in
+                          sql_store.variants('stored', skip=5, count=10,
+                                             sort='cadd_score')]
+
+    variant_id = sorted_ids[0]
+    vcf_variant = sql_store.variant(vcf_case.case_id, variant_id)
+    sql_variant = sql_store.variant('stored', variant_id)
+    assert sql_variant['transcripts'] == vcf_variant['transcripts']
+    assert sql_variant['individuals'] == vcf_variant['individuals']
+    assert sql_variant['genes'] == vcf_variant['genes']
+
+    # more genes than sqlite before 3.32 can bind in one statement
+    gene_ids = ['GENE{0}'.format(number) for number in range(2000)]
+    assert (sql_store.count_variants('stored', filters={
+        'gene_ids': gene_ids + ['TECTA', 'AR']}) ==
+        sql_store.count_variants('stored', filters={
+            'gene_ids': ['TECTA', 'AR']}))
+    # filter values are not used as LIKE wildcards
+    assert sql_store.count_variants('stored', filters={
+        'genetic_models': ['AR%']}) == 0
+    assert sql_store.count_variants('stored', filters={
+        'consequence': ['missense_varian_']}) == 0
+
+    sql_store.delete_case(sql_case)
+    assert sql_store.query(Variant).count() == 0
+
+
+def test_connect_sqlite_pragmas(tmpdir):
+    store = SqlStore(str(tmpdir.join('puzzle_db.sqlite3'))).set_up()
+    connection = store.engine.connect()
+    assert connection.execute("PRAGMA journal_mode").scalar() == 'wal'
+    assert connection.execute("PRAGMA synchronous").scalar() == 1
+    connection.close()
+
+    store = SqlStore(str(tmpdir.join('default_db.sqlite3')),
+                     sqlite_pragmas=None).set_up()
+    connection = store.engine.connect()
+    assert connection.execute("PRAGMA journal_mode").scalar() == 'delete'
+    connection.close()
+
+
+def test_cases_constant_queries(sql_store, ped_lines):
+    queries = []
+
+    def count_query(*args):
+        queries.append(args[2])
+
+    def list_cases():
+        del queries[:]
+        for case in sql_store.cases():
+            for individual in case.individuals:
+                list(individual.phenotypes)
+                list(individual.resources)
+            list(case.gene_lists)
+        return len(queries)
+
+    event.listen(sql_store.engine, 'before_cursor_execute', count_query)
+    for number in range(2):
+        case_obj = get_case('test.vcf', case_lines=ped_lines)
+        case_obj['case_id'] = "case{0}".format(number)
+        sql_store.add_case(case_obj)
+    few_cases = list_cases()
+
+    for number in range(2, 10):
+        case_obj = get_case('test.vcf', case_lines=ped_lines)
+        case_obj['case_id'] = "case{0}".format(number)
+        sql_store.add_case(case_obj)
+    assert list_cases() == few_cases
+
+
+def test_add_cases(sql_store, ped_lines):
+    sql_store.add_case(get_case('tests/fixtures/hapmap.vcf'))
+
+    case_objs = [get_case('tests/fixtures/hapmap.vcf')]
+    for number in range(3):
+        case_obj = get_case('test.vcf', case_lines=ped_lines)
+        case_obj['case_id'] = "case{0}".format(number)
+        case_objs.append(case_obj)
+    # the same case twice is only added once
+    case_objs.append(case_objs[-1])
+
+    new_ids = sql_store.add_cases(case_objs, vtype='sv')
+    assert new_ids == ['case0', 'case1', 'case2']
+    assert sql_store.cases().count() == 4
+
+    case = sql_store.case('case1')
+    assert case.variant_type == 'sv'
+    assert (set(ind.ind_id for ind in case.individuals) ==
+            set(ind['ind_id'] for ind in case_objs[2]['individuals']))
@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
+import shutil
+
+import pytest
+
 from puzzle.plugins import VcfPlugin
+from puzzle.plugins.vcf.index import VariantIndex, get_variant_index
+from puzzle.plugins.vcf.raw_variant import (AnnotationMatcher,
+                                            get_annotation_columns,
+                                            get_filter_values)
 
 # TODO: define a vcf in the test
 vcf = "tests/fixtures/hapmap.vcf"
+bgzipped_vcf = "tests/fixtures/hapmap.vcf.gz"
 family_file = "tests/fixtures/hapmap.ped"
 
 individuals = [
@@ -25,8 +34,8 @@ class MockApp(object):
             }
 
 
-def test_variants():
-    vcf_plugin = VcfPlugin(root_path=vcf)
+def test_variants(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
     variants = vcf_plugin.variants("hapmap.vcf")
     variant = next(variants)
     assert variant['CHROM'] == 'X'
@@ -38,8 +47,8 @@ def test_variants():
     assert int(variant['POS']) == 233349186
     assert variant['index'] == 2
 
-def test_variants_case_no_ped():
-    vcf_plugin = VcfPlugin(root_path=vcf)
+def test_variants_case_no_ped(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
     variants = vcf_plugin.variants(case_id='hapmap.vcf')
     variant = next(variants)
     assert variant['CHROM'] == 'X'
@@ -51,8 +60,8 @@ def test_variants_case_no_ped():
     assert int(variant['POS']) == 233349186
     assert variant['index'] == 2
 
-def test_variants_case_with_ped():
-    vcf_plugin = VcfPlugin(root_path=vcf, case_lines=individuals, case_type='ped')
+def test_variants_case_with_ped(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file, case_lines=individuals, case_type='ped')
     variants = vcf_plugin.variants(case_id='636808')
     variant = next(variants)
     assert variant['CHROM'] == 'X'
@@ -65,8 +74,8 @@ def test_variants_case_with_ped():
     assert variant['index'] == 2
 
 
-def test_variant():
-    vcf_plugin = VcfPlugin(root_path=vcf)
+def test_variant(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
     variant = vcf_plugin.variant('hapmap.vcf', 'X_155239821_G_A')
     assert variant['CHROM'] == 'X'
     assert variant['POS'] == '155239821'
@@ -91,3 +100,265 @@ def test_vcf_case_dir():
     adapter=VcfPlugin(root_path="tests/fixtures/")
     assert len(adapter.case_objs) == 3
 
+
+def test_variants_region(bgzipped_vcf_file):
+    vcf_plugin = VcfPlugin(root_path=bgzipped_vcf_file)
+    variants = vcf_plugin.variants(
+        'hapmap.vcf.gz',
+        count=100,
+        filters={'region': 'X:66765000-66766400'}
+    )
+    assert [variant['POS'] for variant in variants] == ['66765158', '66766356']
+
+def test_variants_regions_without_index(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    variants = vcf_plugin.variants(
+        'hapmap.vcf',
+        count=100,
+        filters={'regions': ['11:223832', '21']}
+    )
+    positions = set(variant['POS'] for variant in variants)
+    assert positions == set(['223832', '38320591', '30398882', '33975515'])
+
+def test_variant_bgzipped(bgzipped_vcf_file):
+    vcf_plugin = VcfPlugin(root_path=bgzipped_vcf_file)
+    variant = vcf_plugin.variant('hapmap.vcf.gz', 'X_155239821_G_A')
+    assert variant['CHROM'] == 'X'
+    assert variant['POS'] == '155239821'
+
+    assert vcf_plugin.variant('hapmap.vcf.gz', 'X_1_A_T') is None
+
+def test_variant_index(tmpdir):
+    index_path = str(tmpdir.join('hapmap.sqlite3'))
+    variant_index = VariantIndex(vcf, index_path=index_path)
+    assert not variant_index.is_built
+    assert variant_index.build()
+    file_offset, index = variant_index.lookup('3_124998098_C_A')
+    assert index == 10
+    with open(vcf) as handle:
+        handle.seek(file_offset)
+        assert handle.readline().startswith('3\t124998098\t')
+    variant_index.close()
+
+    # the index is kept between connections
+    assert VariantIndex(vcf, index_path=index_path).is_built
+
+def test_get_variant_index(tmpdir):
+    vcf_copy = str(tmpdir.join('hapmap.vcf'))
+    shutil.copy(vcf, vcf_copy)
+    variant_index = get_variant_index(vcf_copy)
+    assert variant_index.index_path == vcf_copy + '.puzzle.sqlite3'
+    assert get_variant_index(vcf_copy) is variant_index
+
+    # the index is reopened when the vcf changes
+    with open(vcf_copy, 'a') as handle:
+        handle.write('\n')
+    assert get_variant_index(vcf_copy) is not variant_index
+
+def test_variants_skip(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    all_ids = [variant['variant_id'] for variant in
+               vcf_plugin.variants('hapmap.vcf', count=1000)]
+    assert len(all_ids) == 108
+
+    for _ in range(2):
+        # the second time the pages are resumed from checkpoints
+        for skip in (0, 30, 60, 90):
+            page = list(vcf_plugin.variants('hapmap.vcf', skip=skip, count=30))
+            assert [variant['variant_id'] for variant in page] == \
+                all_ids[skip:skip + 30]
+            assert page[0]['index'] == skip + 1
+
+def test_variants_summary(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file, case_lines=individuals, case_type='ped')
+    summary_variant = next(vcf_plugin.variants(case_id='636808'))
+    assert summary_variant['individuals'] == []
+    assert summary_variant['transcripts'] == []
+
+    variant = vcf_plugin.variant('636808', summary_variant['variant_id'])
+    assert len(variant['individuals']) == 3
+    assert variant['transcripts']
+    assert variant['index'] == summary_variant['index']
+    assert (summary_variant['most_severe_consequence'] ==
+            variant['most_severe_consequence'])
+    assert (set(gene['symbol'] for gene in summary_variant['genes']) ==
+            set(transcript['hgnc_symbol'] for transcript in
+                variant['transcripts'] if transcript['hgnc_symbol']))
+
+
+def test_variants_parallel(bgzipped_vcf_file):
+    vcf_plugin = VcfPlugin(root_path=bgzipped_vcf_file)
+    parallel_plugin = VcfPlugin(root_path=bgzipped_vcf_file, processes=2)
+    filters = {'consequence': ['missense_variant']}
+    for skip in (0, 30):
+        variants = vcf_plugin.variants('hapmap.vcf.gz', skip=skip,
+                                       filters=filters)
+        parallel_variants = parallel_plugin.variants(
+            'hapmap.vcf.gz', skip=skip, filters=filters)
+        assert ([(variant['variant_id'], variant['index'])
+                 for variant in variants] ==
+                [(variant['variant_id'], variant['index'])
+                 for variant in parallel_variants])
+
+    # the processes are started once for all pages
+    assert (parallel_plugin._get_process_pool() is
+            parallel_plugin._get_process_pool())
+    parallel_plugin.close()
+    assert parallel_plugin._process_pool is None
+
+
+def test_variants_cadd_filter(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    variants = list(vcf_plugin.variants('hapmap.vcf', count=1000,
+                                        filters={'cadd': 20}))
+    assert variants
+    for variant in variants:
+        assert variant['cadd_score'] >= 20
+
+
+def test_variants_column_cache(vcf_file):
+    pytest.importorskip('numpy')
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    cached_plugin = VcfPlugin(root_path=vcf_file, column_cache=True)
+    for filters in ({}, {'cadd': 20, 'frequency': 0.01},
+                    {'consequence': ['missense_variant']},
+                    {'genetic_models': ['AR_comp'], 'region': 'X'}):
+        variants = vcf_plugin.variants('hapmap.vcf', skip=10, filters=filters)
+        cached_variants = cached_plugin.variants('hapmap.vcf', skip=10,
+                                                 filters=filters)
+        assert ([(variant['variant_id'], variant['index'])
+                 for variant in variants] ==
+                [(variant['variant_id'], variant['index'])
+                 for variant in cached_variants])
+
+
+def test_variants_column_cache_unknown_consequence(vcf_file):
+    pytest.importorskip('numpy')
+    with open(vcf_file) as handle:
+        vcf_lines = handle.readlines()
+    for line_number, line in enumerate(vcf_lines):
+        if not line.startswith('#') and 'missense_variant' in line:
+            vcf_lines[line_number] = line.replace('missense_variant',
+                                                  'made_up_variant')
+            break
+    with open(vcf_file, 'w') as handle:
+        handle.writelines(vcf_lines)
+
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    cached_plugin = VcfPlugin(root_path=vcf_file, column_cache=True)
+    # Terms that are not in the cache are filtered by scanning the vcf
+    filters = {'consequence': ['made_up_variant']}
+    variants = list(vcf_plugin.variants('hapmap.vcf', filters=filters))
+    assert variants
+    assert ([variant['variant_id'] for variant in variants] ==
+            [variant['variant_id'] for variant in
+             cached_plugin.variants('hapmap.vcf', filters=filters)])
+    assert (cached_plugin.count_variants('hapmap.vcf', filters=filters) ==
+            len(variants))
+
+def test_filter_values():
+    vcf_plugin = VcfPlugin(root_path=vcf)
+    case_obj = vcf_plugin.case('hapmap.vcf')
+    head = vcf_plugin._get_header(vcf)
+    annotation_columns = get_annotation_columns(head)
+    filters = {'frequency': 1, 'cadd': 1, 'genetic_models': ['AD'],
+               'sv_len': 1}
+    with open(vcf) as handle:
+        variant_lines = [line for line in handle if not line.startswith('#')]
+
+    for variant_line in variant_lines:
+        variant = vcf_plugin._format_variant(variant_line, case_obj, head, 1)
+        filter_values = get_filter_values(variant_line, annotation_columns,
+                                          filters)
+        for key in ('max_freq', 'cadd_score', 'genetic_models', 'sv_len'):
+            assert filter_values[key] == variant[key]
+
+
+def test_annotation_matcher():
+    annotation_columns = get_annotation_columns(
+        VcfPlugin(root_path=vcf)._get_header(vcf))
+    variant_line = ("1\t100\t.\tA\tT\t.\tPASS\t"
+                    "CSQ=T|missense_variant&splice_region_variant|MODERATE|"
+                    "ADK|ENSG00000156110|Transcript\n")
+
+    assert AnnotationMatcher(annotation_columns, genes=['ADK']).matches(
+        variant_line)
+    assert AnnotationMatcher(annotation_columns,
+                             genes=['ENSG00000156110']).matches(variant_line)
+    # Parts of other gene symbols or fields do not match
+    assert not AnnotationMatcher(annotation_columns, genes=['AD']).matches(
+        variant_line)
+    assert not AnnotationMatcher(annotation_columns,
+                                 genes=['MODERATE']).matches(variant_line)
+
+    assert AnnotationMatcher(
+        annotation_columns, consequences=['splice_region_variant']).matches(
+            variant_line)
+    assert not AnnotationMatcher(
+        annotation_columns, consequences=['splice_region']).matches(
+            variant_line)
+    assert not AnnotationMatcher(annotation_columns, sv_types=['DEL']).matches(
+        variant_line)
+
+
+def test_variants_sorted(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    assert vcf_plugin.sort_keys == ['rank_score', 'cadd_score']
+    rank_scores = sorted(
+        (variant['rank_score'] for variant in
+         vcf_plugin.variants('hapmap.vcf', count=1000)),
+        reverse=True
+    )
+    page = list(vcf_plugin.variants('hapmap.vcf', skip=10, count=20,
+                                    sort='rank_score'))
+    assert [variant['rank_score'] for variant in page] == rank_scores[10:30]
+
+
+def test_variants_sorted_column_cache(vcf_file):
+    pytest.importorskip('numpy')
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    cached_plugin = VcfPlugin(root_path=vcf_file, column_cache=True)
+    for sort in ('rank_score', 'cadd_score'):
+        variants = vcf_plugin.variants('hapmap.vcf', skip=5, sort=sort,
+                                       filters={'frequency': 0.05})
+        cached_variants = cached_plugin.variants(
+            'hapmap.vcf', skip=5, sort=sort, filters={'frequency': 0.05})
+        assert ([(variant['variant_id'], variant['index'])
+                 for variant in variants] ==
+                [(variant['variant_id'], variant['index'])
+                 for variant in cached_variants])
+
+
+def test_count_variants(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    assert vcf_plugin.count_variants('hapmap.vcf') == 108
+
+    for filters in ({'cadd': 20}, {'consequence': ['missense_variant']},
+                    {'gene_ids': ['TECTA', 'AR'], 'frequency': 0.01}):
+        variants = list(vcf_plugin.variants('hapmap.vcf', count=1000,
+                                            filters=filters))
+        for _ in range(2):
+            # the second time the count is read from the index
+            assert vcf_plugin.count_variants('hapmap.vcf',
+                                             filters=filters) == len(variants)
+
+
+def test_quick_count_variants(vcf_file):
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    filters = {'cadd': 20}
+    assert vcf_plugin.quick_count_variants('hapmap.vcf', filters) is None
+
+    # a scan that reaches the end of the vcf stores the count
+    variants = list(vcf_plugin.variants('hapmap.vcf', count=1000,
+                                        filters=filters))
+    assert (vcf_plugin.quick_count_variants('hapmap.vcf', filters) ==
+            len(variants))
+
+
+def test_count_variants_column_cache(vcf_file):
+    pytest.importorskip('numpy')
+    vcf_plugin = VcfPlugin(root_path=vcf_file)
+    cached_plugin = VcfPlugin(root_path=vcf_file, column_cache=True)
+    filters = {'consequence': ['missense_variant'], 'cadd': 10}
+    assert (cached_plugin.count_variants('hapmap.vcf', filters=filters) ==
+            vcf_plugin.count_variants('hapmap.vcf', filters=filters))
@@ -0,0 +1,45 @@
+import os
+import shutil
+
+from puzzle.utils import get_header
+from puzzle.utils import headers
+
+VCF = "tests/fixtures/hapmap.vcf"
+
+
+def test_get_header():
+    head = get_header(VCF)
+    assert head.individuals == ['ADM1059A1', 'ADM1059A2', 'ADM1059A3']
+    assert head.vep_columns
+    # The parsed header is reused while the file is unchanged
+    assert get_header(VCF) is head
+
+
+def test_get_header_changed_file(tmpdir):
+    vcf_path = str(tmpdir.join('hapmap.vcf'))
+    shutil.copy(VCF, vcf_path)
+    head = get_header(vcf_path)
+
+    with open(vcf_path, 'a') as handle:
+        handle.write('\n')
+    stat = os.stat(vcf_path)
+    os.utime(vcf_path, (stat.st_atime, stat.st_mtime + 10))
+
+    assert get_header(vcf_path) is not head
+
+
+def test_get_header_evicts_least_recently_used(tmpdir, monkeypatch):
+    monkeypatch.setattr(headers, 'MAX_CACHED_HEADERS', 2)
+    vcf_paths = []
+    for name in ('first.vcf', 'second.vcf', 'third.vcf'):
+        vcf_paths.append(str(tmpdir.join(name)))
+        shutil.copy(VCF, vcf_paths[-1])
+
+    first_head = get_header(vcf_paths[0])
+    second_head = get_header(vcf_paths[1])
+    # using the first header makes the second the least recently used
+    assert get_header(vcf_paths[0]) is first_head
+    get_header(vcf_paths[2])
+
+    assert get_header(vcf_paths[0]) is first_head
+    assert get_header(vcf_paths[1]) is not second_head
@@ -0,0 +1,20 @@
+from puzzle.utils import sort_page
+
+
+def test_sort_page():
+    items = [{'score': score} for score in (3, None, 5, 1, 5, 2)]
+    page = sort_page(items, key=lambda item: item['score'], skip=1, count=3)
+    assert page == [items[4], items[0], items[5]]
+
+
+def test_sort_page_external():
+    items = [(number % 7, number) for number in range(100)]
+    expected = sorted(items, key=lambda item: item[0], reverse=True)
+
+    page = sort_page(items, key=lambda item: item[0], skip=40, count=30,
+                     max_heap_size=10)
+    assert page == expected[40:70]
+
+    page = sort_page(items, key=lambda item: item[0], count=float('inf'),
+                     max_heap_size=10)
+    assert page == expected
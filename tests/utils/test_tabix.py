@@ -0,0 +1,70 @@
+import pytest
+
+from puzzle.utils import (BgzfReader, TabixIndex, is_bgzf, parse_region,
+                          split_bgzf)
+from puzzle.utils.bgzf import get_block_offsets
+from puzzle.utils.tabix import reg2bins
+
+BGZIPPED_VCF = "tests/fixtures/hapmap.vcf.gz"
+
+
+def test_parse_region():
+    assert parse_region('1:100-200') == ('1', 100, 200)
+    assert parse_region('chrX:1,000-2,000') == ('X', 1000, 2000)
+    assert parse_region('2:150') == ('2', 150, 150)
+    assert parse_region('2:150-') == ('2', 150, None)
+    assert parse_region('MT') == ('MT', 1, None)
+
+
+def test_parse_bad_region():
+    with pytest.raises(ValueError):
+        parse_region('1:200-100')
+    with pytest.raises(ValueError):
+        parse_region('1:start-end')
+
+
+def test_reg2bins():
+    # the first bin on every level overlaps the start of the chromosome
+    assert reg2bins(0, 1) == [0, 1, 9, 73, 585, 4681]
+
+
+def test_is_bgzf():
+    assert is_bgzf(BGZIPPED_VCF)
+    assert not is_bgzf("tests/fixtures/hapmap.vcf")
+
+
+def test_tabix_chunks():
+    index = TabixIndex(BGZIPPED_VCF + '.tbi')
+    assert 'X' in index.names
+    assert index.chunks('MT', 1, 100) == []
+
+    chunks = index.chunks('X', 66765000, 66766400)
+    assert chunks
+    with BgzfReader(BGZIPPED_VCF) as reader:
+        reader.seek(chunks[0][0])
+        variant_line = reader.readline()
+    assert variant_line.startswith('X\t')
+
+
+def test_split_bgzf():
+    with BgzfReader(BGZIPPED_VCF) as reader:
+        all_lines = list(reader)
+
+    file_ranges = split_bgzf(BGZIPPED_VCF, 4)
+    assert len(file_ranges) > 1
+    # the block offsets are read once
+    assert get_block_offsets(BGZIPPED_VCF) is get_block_offsets(BGZIPPED_VCF)
+    assert file_ranges[0][0] == 0
+    assert file_ranges[-1][1] is None
+
+    range_lines = []
+    with BgzfReader(BGZIPPED_VCF) as reader:
+        for range_start, range_end in file_ranges:
+            reader.seek(range_start)
+            while range_end is None or reader.tell() < range_end:
+                variant_line = reader.readline()
+                if not variant_line:
+                    break
+                range_lines.append(variant_line)
+
+    assert range_lines == all_lines